@@ -1,6 +1,22 @@
-from fastapi import APIRouter
-from ..schemas.test_schema import CodeRequest, TestResponse, CodeValidationResponse
-from ..services.test_generation_service import process_code
+import json
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from ..schemas.test_schema import (
+    BatchCodeRequest,
+    BatchTestResponse,
+    CodeRequest,
+    CodeValidationResponse,
+    JobStatusResponse,
+    JobSubmitResponse,
+    TestResponse,
+)
+from ..services.job_queue import QueueFullError, get_job_queue
+from ..services.test_generation_service import (
+    process_batch,
+    process_code,
+    process_code_stream,
+)
 from ..services.code_validator import get_safe_code_info
 
 router = APIRouter()
@@ -12,11 +28,91 @@ router = APIRouter()
     description="Generate pytest tests from the provided code and execute them in the sandbox.",
     tags=["tests"],
 )
-def generate_tests(request: CodeRequest):
+async def generate_tests(request: CodeRequest):
     """Generate and execute tests for provided code"""
-    result = process_code(request.code)
+    result = await process_code(
+        request.code,
+        bypass_cache=request.bypass_cache,
+        include_timings=request.include_timings,
+    )
     return result
 
+@router.post(
+    "/generate-tests/stream",
+    summary="Generate and execute tests with streamed progress",
+    description="Server-Sent Events stream of pipeline stages (validated, tests_generated, "
+    "container_started), pytest output lines as they are produced, and a final result "
+    "event carrying the TestResponse payload.",
+    tags=["tests"],
+)
+async def generate_tests_stream(request: CodeRequest):
+    """Stream generation and execution progress as Server-Sent Events"""
+    async def event_stream():
+        async for event, data in process_code_stream(
+            request.code, bypass_cache=request.bypass_cache
+        ):
+            if event == "result":
+                data = TestResponse(**data).model_dump(mode="json")
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post(
+    "/generate-tests/batch",
+    response_model=BatchTestResponse,
+    summary="Generate and execute tests for many snippets",
+    description="Generate and execute tests for a list of snippets concurrently, "
+    "sharing sandbox runs where it is safe.",
+    tags=["tests"],
+)
+async def generate_tests_batch(request: BatchCodeRequest):
+    """Generate and execute tests for several snippets in one call"""
+    codes = [item.code for item in request.items]
+    bypass_cache = request.bypass_cache or any(item.bypass_cache for item in request.items)
+    return await process_batch(codes, bypass_cache=bypass_cache)
+
+@router.post(
+    "/jobs",
+    response_model=JobSubmitResponse,
+    status_code=202,
+    summary="Submit a background test job",
+    description="Queue test generation and execution; poll GET /jobs/{job_id} for the result.",
+    tags=["jobs"],
+)
+async def submit_job(request: CodeRequest):
+    """Enqueue a job and return its id without waiting for the run"""
+    try:
+        job = get_job_queue().submit(request.code, bypass_cache=request.bypass_cache)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return JobSubmitResponse(job_id=job["id"], status=job["status"])
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    summary="Get background job status",
+    description="Return the job status and, once completed, its TestResponse.",
+    tags=["jobs"],
+)
+def get_job(job_id: str):
+    """Poll a background job"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        result=job["result"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+    )
+
 @router.post(
     "/validate-code",
     response_model=CodeValidationResponse,
@@ -1,16 +1,47 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .api.routes import router
+from .services.admission import AdmissionMiddleware, get_admission_controller
+from .services.job_queue import get_job_queue
+from .services.llm_providers import close_llm_provider
+from .services.llm_service import get_generation_cache
+from .services.metrics import render_metrics
+from .services.sandbox_backend import get_sandbox_discovery
+from .services.test_execution_service import (
+    get_execution_cache,
+    start_sandbox_prewarm,
+    stop_sandbox_pool,
+)
+from .services.workspace import reclaim_orphaned_workspaces
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prewarm the sandbox image and warm up the container pool in the background"""
+    reclaim_orphaned_workspaces()
+    start_sandbox_prewarm()
+    yield
+    await get_job_queue().stop()
+    await close_llm_provider()
+    stop_sandbox_pool()
+
+
 app = FastAPI(
     title="AI Test Generator",
     description="AI-powered test generation with a hardened Docker sandbox.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Admission control (added first so CORS headers also wrap its 429/503 responses)
+app.add_middleware(AdmissionMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -25,4 +56,18 @@ app.include_router(router, prefix="/api")
 @app.get("/health", tags=["health"])
 def health_check():
     """Health check endpoint for deployment services"""
-    return {"status": "healthy"}
+    discovery = get_sandbox_discovery()
+    return {
+        "status": "healthy",
+        "sandbox": discovery.get(),
+        "sandbox_prewarm": discovery.prewarm_status,
+        "generation_cache": get_generation_cache().stats(),
+        "execution_cache": get_execution_cache().stats(),
+        "admission": get_admission_controller().stats(),
+    }
+
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of request, stage, sandbox and cache metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
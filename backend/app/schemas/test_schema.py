@@ -1,9 +1,11 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from enum import Enum
 
 class CodeRequest(BaseModel):
     code: str
+    bypass_cache: bool = False  # Re-run tests even if an identical run is cached
+    include_timings: bool = False  # Add a per-stage timing breakdown to the response
 
 class StatusEnum(str, Enum):
     """Response status types"""
@@ -22,6 +24,28 @@ class ErrorTypeEnum(str, Enum):
     docker_error = "DockerError"
     unknown = "Unknown"
 
+class TestOutcomeEnum(str, Enum):
+    """Outcome of a single test"""
+    passed = "passed"
+    failed = "failed"
+    error = "error"
+    skipped = "skipped"
+
+class TestCaseResult(BaseModel):
+    name: str  # pytest node id, e.g. test_generated.py::test_add
+    outcome: TestOutcomeEnum
+    duration: float  # Seconds
+    message: Optional[str] = None  # Failure, error or skip reason
+
+class TestResults(BaseModel):
+    total: int
+    passed: int
+    failed: int
+    errors: int
+    skipped: int
+    duration: float  # Seconds spent in tests, as reported by pytest
+    tests: List[TestCaseResult]
+
 class TestResponse(BaseModel):
     status: StatusEnum  # success, failed, validation_error, execution_error, timeout
     generated_tests: str
@@ -30,6 +54,39 @@ class TestResponse(BaseModel):
     execution_time: float  # Time in seconds
     error: Optional[str] = None
     error_type: Optional[ErrorTypeEnum] = None
+    timings: Optional[Dict[str, float]] = None  # Seconds per stage, when requested
+    test_results: Optional[TestResults] = None  # Per-test results parsed from pytest
+
+class BatchCodeRequest(BaseModel):
+    items: List[CodeRequest] = Field(..., min_length=1, max_length=50)
+    bypass_cache: bool = False
+
+class BatchTestResponse(BaseModel):
+    results: List[TestResponse]
+    total_time: float  # Wall-clock time for the whole batch in seconds
+    passed_count: int
+    failed_count: int
+
+class JobStatusEnum(str, Enum):
+    """Background job states"""
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+    timeout = "timeout"
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: JobStatusEnum
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: JobStatusEnum
+    result: Optional[TestResponse] = None  # Set once the job completed
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 class CodeValidationResponse(BaseModel):
     is_safe: bool
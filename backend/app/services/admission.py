@@ -0,0 +1,412 @@
+"""
+Admission control for the API.
+
+Every `/api` request is assigned to a lane. The `generate` lane (the
+`/api/generate-tests` endpoints, which call the LLM and start sandboxes) is
+gated by a global concurrency limit with a short bounded wait; requests that
+cannot get in are rejected at once with 503 instead of piling up until they
+all time out. A batch is charged per item: one token per snippet (up to the
+bucket size) and one gate slot per generation it runs concurrently. Cheap
+lanes (`/api/validate-code`, job polling) are never gated, so they are not
+queued behind generation. Each lane also has a
+per-client token bucket (client = API key if sent, otherwise IP); an empty
+bucket answers 429. Both rejections carry `Retry-After`.
+
+Buckets go through the `RateLimitStore` interface, with an in-memory
+implementation and one for any Redis-like client (`eval`) so several
+instances can share limits.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import record_admission
+
+API_KEY_HEADER = b"x-api-key"
+
+
+class RateLimitStore:
+    """Token-bucket storage interface."""
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens from the bucket `key` (refilled at `rate` tokens per
+        second up to `burst`). Returns 0 if allowed, otherwise the seconds
+        until enough tokens are available.
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Process-local buckets; idle full buckets are dropped past `max_keys`."""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (cost - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._evict(now, rate, burst)
+        return wait
+
+    def _evict(self, now: float, rate: float, burst: float) -> None:
+        full_after = burst / rate
+        idle = [key for key, (_, updated) in self._buckets.items() if now - updated > full_after]
+        for key in idle:
+            del self._buckets[key]
+
+
+# Atomic refill-and-take; KEYS[1] = bucket, ARGV = rate, burst, cost, now
+_TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('GET', KEYS[1])
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]),
+    tonumber(ARGV[4])
+local tokens, updated = burst, now
+if state then
+    local decoded = cjson.decode(state)
+    tokens, updated = decoded[1], decoded[2]
+end
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('SET', KEYS[1], cjson.encode({tokens, now}), 'EX', math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared across instances through a Redis-like client exposing `eval`."""
+
+    def __init__(self, client, prefix: str = "ai-test-generator:rate:"):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        wait = self.client.eval(
+            _TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, rate, burst, cost, time.time()
+        )
+        if isinstance(wait, bytes):
+            wait = wait.decode("utf-8")
+        return float(wait)
+
+
+class Lane:
+    """
+    A class of requests: its token bucket (`rate_per_minute`, `burst`; a
+    rate of 0 disables rate limiting) and whether it takes a slot of the
+    concurrency gate. `per_item` lanes charge the number of `items` in the
+    JSON body and hold up to `max_slots` gate slots.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, burst: float,
+                 gated: bool = False, bucket: Optional[str] = None,
+                 per_item: bool = False, max_slots: int = 1):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.gated = gated
+        self.bucket = bucket or name
+        self.per_item = per_item
+        self.max_slots = max_slots
+
+
+class ConcurrencyGate:
+    """
+    Global limit on gated requests in flight. At most `max_waiting` requests
+    wait, each for up to `wait_timeout` seconds; the rest are rejected.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, wait_timeout: float):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            # Semaphores belong to the loop that first waits on them
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self, slots: int = 1) -> bool:
+        """Take `slots` slots (capped at the limit); False if not free in time."""
+        semaphore = self._get_semaphore()
+        slots = max(1, min(slots, self.limit))
+        held = 0
+
+        async def take(count: int) -> None:
+            nonlocal held
+            for _ in range(count):
+                await semaphore.acquire()
+                held += 1
+
+        # Free slots are taken without suspending
+        while held < slots and not semaphore.locked():
+            await semaphore.acquire()
+            held += 1
+        if held < slots:
+            admitted = self.waiting < self.max_waiting
+            if admitted:
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(take(slots - held), self.wait_timeout)
+                except asyncio.TimeoutError:
+                    admitted = False
+                finally:
+                    self.waiting -= 1
+            if not admitted:
+                for _ in range(held):
+                    semaphore.release()
+                return False
+        self.active += slots
+        return True
+
+    def release(self, slots: int = 1) -> None:
+        slots = max(1, min(slots, self.limit))
+        self.active -= slots
+        semaphore = self._get_semaphore()
+        for _ in range(slots):
+            semaphore.release()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.wait_timeout))
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting}
+
+
+class AdmissionController:
+    """Lane routing, per-client rate limits and the concurrency gate."""
+
+    def __init__(self, store: RateLimitStore, lanes: Dict[str, Lane], gate: ConcurrencyGate,
+                 routes: List[Tuple[str, str, str]], trust_forwarded: bool = False):
+        self.store = store
+        self.lanes = lanes
+        self.gate = gate
+        self.routes = routes
+        self.trust_forwarded = trust_forwarded
+
+    def lane_for(self, method: str, path: str) -> Optional[Lane]:
+        """First matching (method, path prefix, lane) route; None = not controlled."""
+        for route_method, prefix, lane in self.routes:
+            if (route_method == "*" or route_method == method) and path.startswith(prefix):
+                return self.lanes[lane]
+        return None
+
+    def client_id(self, scope: dict) -> str:
+        headers = dict(scope.get("headers") or [])
+        api_key = headers.get(API_KEY_HEADER)
+        if api_key:
+            return "key:" + hashlib.sha256(api_key).hexdigest()[:16]
+        forwarded = headers.get(b"x-forwarded-for") if self.trust_forwarded else None
+        if forwarded:
+            return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def rate_limit(self, lane: Lane, client: str, cost: float = 1.0) -> float:
+        """
+        Seconds to wait before `client` may use `lane` again (0 = allowed).
+        `cost` is clamped to the bucket size so a large request stays possible.
+        """
+        if lane.rate <= 0:
+            return 0.0
+        cost = max(1.0, min(cost, lane.burst))
+        return self.store.take(f"{lane.bucket}:{client}", lane.rate, lane.burst, cost)
+
+    def stats(self) -> dict:
+        return {"gate": self.gate.stats(), "lanes": sorted(self.lanes)}
+
+
+async def _buffer_items(receive) -> Tuple[Callable, int]:
+    """
+    Read the whole request body and count its JSON `items`. Returns a
+    `receive` replaying the body for the application, and the count (1 if
+    the body is not a JSON object with an `items` list; validation rejects it).
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    try:
+        items = json.loads(body).get("items")
+        count = len(items) if isinstance(items, list) else 1
+    except (ValueError, AttributeError):
+        count = 1
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay, max(1, count)
+
+
+def _json_response(status: int, detail: str, retry_after: int):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(retry_after).encode()),
+    ]
+    return status, headers, body
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying the controller. Plain ASGI (not
+    `BaseHTTPMiddleware`) so a gated slot is held until the response,
+    including a streamed one, has been fully sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        controller = get_admission_controller()
+        lane = controller.lane_for(scope["method"], scope["path"])
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        items = 1
+        if lane.per_item:
+            receive, items = await _buffer_items(receive)
+        wait = controller.rate_limit(lane, controller.client_id(scope), cost=items)
+        if wait > 0:
+            record_admission(lane.name, "rate_limited")
+            await self._reject(send, 429, "Rate limit exceeded", max(1, math.ceil(wait)))
+            return
+
+        if not lane.gated:
+            record_admission(lane.name, "admitted")
+            await self.app(scope, receive, send)
+            return
+
+        slots = min(items, lane.max_slots)
+        if not await controller.gate.acquire(slots):
+            record_admission(lane.name, "overloaded")
+            await self._reject(
+                send, 503, "Server busy, too many generations in progress",
+                controller.gate.retry_after(),
+            )
+            return
+        record_admission(lane.name, "admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.gate.release(slots)
+
+    @staticmethod
+    async def _reject(send, status: int, detail: str, retry_after: int) -> None:
+        status, headers, body = _json_response(status, detail, retry_after)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _build_store() -> RateLimitStore:
+    redis_url = os.getenv("ADMISSION_STORE_REDIS_URL")
+    if redis_url:
+        # Optional dependency, only needed when limits are shared across instances
+        import redis
+
+        return RedisRateLimitStore(redis.Redis.from_url(redis_url))
+    return InMemoryRateLimitStore()
+
+
+def build_admission_controller(store: Optional[RateLimitStore] = None) -> AdmissionController:
+    max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+    lanes = {
+        # A batch runs up to BATCH_CONCURRENCY generations at once
+        "batch": Lane(
+            "batch",
+            rate_per_minute=float(os.getenv("ADMISSION_RATE_PER_MINUTE", "60")),
+            burst=float(os.getenv("ADMISSION_BURST", "20")),
+            gated=True,
+            bucket="generate",
+            per_item=True,
+            max_slots=int(os.getenv("BATCH_CONCURRENCY", "4")),
+        ),
+        "generate": Lane(
+            "generate",
+            rate_per_minute=float(os.getenv("ADMISSION_RATE_PER_MINUTE", "60")),
+            burst=float(os.getenv("ADMISSION_BURST", "20")),
+            gated=True,
+        ),
+        # Background jobs are bounded by the job queue; they share the generate budget
+        "jobs": Lane(
+            "jobs",
+            rate_per_minute=float(os.getenv("ADMISSION_RATE_PER_MINUTE", "60")),
+            burst=float(os.getenv("ADMISSION_BURST", "20")),
+            bucket="generate",
+        ),
+        "cheap": Lane(
+            "cheap",
+            rate_per_minute=float(os.getenv("ADMISSION_CHEAP_RATE_PER_MINUTE", "600")),
+            burst=float(os.getenv("ADMISSION_CHEAP_BURST", "100")),
+        ),
+    }
+    routes = [
+        ("POST", "/api/generate-tests/batch", "batch"),
+        ("POST", "/api/generate-tests", "generate"),
+        ("POST", "/api/jobs", "jobs"),
+        ("*", "/api/", "cheap"),
+    ]
+    return AdmissionController(
+        store=store or _build_store(),
+        lanes=lanes,
+        gate=ConcurrencyGate(
+            limit=max_concurrent,
+            max_waiting=int(os.getenv("ADMISSION_MAX_WAITING", str(max_concurrent))),
+            wait_timeout=float(os.getenv("ADMISSION_WAIT_TIMEOUT", "2")),
+        ),
+        routes=routes,
+        trust_forwarded=os.getenv("ADMISSION_TRUST_FORWARDED", "0") == "1",
+    )
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Process-wide controller configured from the environment."""
+    global _controller
+    if _controller is None:
+        _controller = build_admission_controller()
+    return _controller
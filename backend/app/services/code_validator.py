@@ -1,6 +1,8 @@
 import ast
 import re
-from typing import Tuple, List
+from typing import List, Optional, Tuple
+
+from .cache import normalized_code_hash, stable_hash
 
 # Módulos y funciones peligrosas
 DANGEROUS_MODULES = {
@@ -34,6 +36,153 @@ DANGEROUS_PATTERNS = [
     r'\.run\(',
 ]
 
+# Una sola regex compilada con todos los patrones. Sólo se aplica a los
+# literales de texto, que es lo único que el AST no puede responder
+# (p.ej. getattr(obj, "__class__")).
+DANGEROUS_REGEX = re.compile("|".join(DANGEROUS_PATTERNS))
+
+DANGEROUS_BUILTINS = {'eval', 'exec', 'compile', 'open', '__import__'}
+DANGEROUS_METHODS = {'system', 'popen', 'call', 'run'}
+DUNDER = re.compile(r'^__\w+__$')
+
+
+class CodeAnalysis:
+    """
+    Resultado de analizar el código una sola vez: árbol AST, imports,
+    operaciones peligrosas, funciones y clases. Se reutiliza en la
+    validación, `/validate-code` y las claves de caché de generación.
+    """
+
+    def __init__(self, code: str):
+        self.code = code
+        self.tree: Optional[ast.Module] = None
+        self.syntax_error: Optional[str] = None
+        self.imports: List[str] = []
+        self.dangerous_items: List[str] = []
+        self.functions: List[str] = []
+        self.classes: List[str] = []
+        self._normalized_hash: Optional[str] = None
+
+    @property
+    def is_safe(self) -> bool:
+        return not self.dangerous_items
+
+    @property
+    def message(self) -> str:
+        if self.is_safe:
+            return ""
+        items_str = ", ".join(f"'{item}'" for item in self.dangerous_items)
+        message = f"Código contiene operaciones peligrosas: {items_str}. "
+        message += "No se permite: os, subprocess, sys, open(), eval(), exec(), compiling code, network access."
+        return message
+
+    @property
+    def normalized_hash(self) -> str:
+        """Hash del AST normalizado (ignora espacios y comentarios)."""
+        if self._normalized_hash is None:
+            if self.tree is not None:
+                self._normalized_hash = stable_hash(ast.dump(self.tree))
+            else:
+                self._normalized_hash = normalized_code_hash(self.code)
+        return self._normalized_hash
+
+
+class _AnalysisVisitor(ast.NodeVisitor):
+    """Recorre el árbol una sola vez rellenando un `CodeAnalysis`."""
+
+    def __init__(self, analysis: CodeAnalysis):
+        self.analysis = analysis
+        self._seen = set()
+
+    def _flag(self, item: str) -> None:
+        if item not in self._seen:
+            self._seen.add(item)
+            self.analysis.dangerous_items.append(item)
+
+    def _check_identifier(self, name: Optional[str]) -> None:
+        if name and DUNDER.match(name):
+            self._flag(name)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            module_name = alias.name.split('.')[0]
+            self.analysis.imports.append(alias.name)
+            if module_name in DANGEROUS_MODULES:
+                self._flag(f"import {module_name}")
+            self._check_identifier(alias.asname)
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        module_name = node.module.split('.')[0] if node.module else ""
+        self.analysis.imports.append(node.module or "")
+        if module_name in DANGEROUS_MODULES:
+            self._flag(f"from {module_name} import ...")
+        for alias in node.names:
+            self._check_identifier(alias.name)
+            self._check_identifier(alias.asname)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node) -> None:
+        self.analysis.functions.append(node.name)
+        self._check_identifier(node.name)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self.analysis.classes.append(node.name)
+        self._check_identifier(node.name)
+        self.generic_visit(node)
+
+    def visit_arg(self, node: ast.arg) -> None:
+        self._check_identifier(node.arg)
+        self.generic_visit(node)
+
+    def visit_keyword(self, node: ast.keyword) -> None:
+        self._check_identifier(node.arg)
+        self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if node.id in DANGEROUS_BUILTINS:
+            self._flag(node.id if node.id == '__import__' else f"{node.id}(")
+        else:
+            self._check_identifier(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        self._check_identifier(node.attr)
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        func = node.func
+        if isinstance(func, ast.Attribute):
+            if func.attr in DANGEROUS_METHODS:
+                self._flag(f".{func.attr}(")
+            elif func.attr in DANGEROUS_BUILTINS:
+                self._flag(f"{func.attr}(")
+        self.generic_visit(node)
+
+    def visit_Constant(self, node: ast.Constant) -> None:
+        if isinstance(node.value, str):
+            for match in DANGEROUS_REGEX.finditer(node.value):
+                self._flag(match.group(0))
+
+
+def analyze_code(code: str) -> CodeAnalysis:
+    """
+    Parsea el código una vez y recoge en un solo recorrido imports,
+    operaciones peligrosas, acceso a atributos mágicos, funciones y clases.
+    """
+    analysis = CodeAnalysis(code)
+    try:
+        analysis.tree = ast.parse(code)
+    except SyntaxError as e:
+        # Dejar que pytest reporte errores de sintaxis
+        analysis.syntax_error = str(e)
+        return analysis
+    _AnalysisVisitor(analysis).visit(analysis.tree)
+    return analysis
+
+
 def validate_code_safety(code: str) -> Tuple[bool, str, List[str]]:
     """
     Valida que el código no contenga operaciones peligrosas.
@@ -44,61 +193,21 @@ def validate_code_safety(code: str) -> Tuple[bool, str, List[str]]:
             - message: Mensaje de error si no es seguro
             - dangerous_items: Lista de items peligrosos encontrados
     """
-    dangerous_items = []
-    
-    try:
-        tree = ast.parse(code)
-    except SyntaxError as e:
-        return True, "", []  # Dejar que pytest reporte errores de sintaxis
-    
-    # 1. Verificar imports peligrosos
-    for node in ast.walk(tree):
-        if isinstance(node, ast.Import):
-            for alias in node.names:
-                module_name = alias.name.split('.')[0]
-                if module_name in DANGEROUS_MODULES:
-                    dangerous_items.append(f"import {module_name}")
-        
-        elif isinstance(node, ast.ImportFrom):
-            module_name = node.module.split('.')[0] if node.module else ""
-            if module_name in DANGEROUS_MODULES:
-                dangerous_items.append(f"from {module_name} import ...")
-    
-    # 2. Verificar patrones peligrosos en el código fuente
-    for pattern in DANGEROUS_PATTERNS:
-        matches = re.findall(pattern, code)
-        if matches:
-            for match in matches:
-                dangerous_items.append(match)
-    
-    if dangerous_items:
-        items_str = ", ".join(f"'{item}'" for item in dangerous_items)
-        message = f"Código contiene operaciones peligrosas: {items_str}. "
-        message += "No se permite: os, subprocess, sys, open(), eval(), exec(), compiling code, network access."
-        return False, message, dangerous_items
-    
-    return True, "", []
+    analysis = analyze_code(code)
+    return analysis.is_safe, analysis.message, list(analysis.dangerous_items)
 
 
-def get_safe_code_info(code: str) -> dict:
+def get_safe_code_info(code: str, analysis: Optional[CodeAnalysis] = None) -> dict:
     """
     Analiza el código y devuelve información sobre su seguridad.
     """
-    is_safe, message, dangerous_items = validate_code_safety(code)
-    
-    try:
-        tree = ast.parse(code)
-        functions = [node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
-        classes = [node.name for node in ast.walk(tree) if isinstance(node, ast.ClassDef)]
-    except:
-        functions = []
-        classes = []
+    analysis = analysis or analyze_code(code)
     
     return {
-        "is_safe": is_safe,
-        "error_message": message,
-        "dangerous_items": dangerous_items,
-        "functions": functions,
-        "classes": classes,
+        "is_safe": analysis.is_safe,
+        "error_message": analysis.message,
+        "dangerous_items": list(analysis.dangerous_items),
+        "functions": list(analysis.functions),
+        "classes": list(analysis.classes),
         "code_length": len(code)
     }
@@ -0,0 +1,263 @@
+"""
+Per-definition test fragments for incremental regeneration.
+
+A submitted module is split into its top-level functions and classes. Each
+definition is fingerprinted by its own AST, the ASTs of the definitions it
+references (transitively) and the module-level context (imports, constants).
+Generated tests are split back into one fragment per definition, so when a
+file is resubmitted with one function changed only that function is sent to
+the LLM, and the final test module is assembled from cached and fresh
+fragments.
+"""
+import ast
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from .cache import stable_hash
+
+DEFINITION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+IMPORT_NODES = (ast.Import, ast.ImportFrom)
+USER_MODULE = "user_code"
+
+
+def _node_lines(lines: List[str], node: ast.stmt) -> str:
+    """Whole source lines of a top-level statement, decorators included."""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+
+def _referenced_names(node: ast.AST) -> Set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+class Definition:
+    """A top-level function or class of the submitted module."""
+
+    def __init__(self, node: ast.stmt, source: str, names: Iterable[str]):
+        self.name = node.name
+        self.node = node
+        self.source = source
+        self.ast_hash = stable_hash(ast.dump(node))
+        # Other top-level definitions this one uses
+        self.dependencies = (_referenced_names(node) & set(names)) - {self.name}
+
+
+class ModuleDefinitions:
+    """Top-level definitions of a module plus the statements around them."""
+
+    def __init__(self, code: str, tree: ast.Module):
+        self.lines = code.splitlines()
+        names = [node.name for node in tree.body if isinstance(node, DEFINITION_NODES)]
+        self.nodes = tree.body
+        self.definitions = [
+            Definition(node, _node_lines(self.lines, node), names)
+            for node in tree.body if isinstance(node, DEFINITION_NODES)
+        ]
+        self.by_name = {d.name: d for d in self.definitions}
+        context = [ast.dump(node) for node in tree.body if not isinstance(node, DEFINITION_NODES)]
+        self.context_hash = stable_hash(*context)
+
+    @property
+    def names(self) -> List[str]:
+        return [d.name for d in self.definitions]
+
+    @property
+    def exports(self) -> List[str]:
+        """Every name the module binds at top level: definitions, constants, imports."""
+        exports: List[str] = []
+        for node in self.nodes:
+            if isinstance(node, DEFINITION_NODES):
+                bound = [node.name]
+            elif isinstance(node, IMPORT_NODES):
+                bound = [
+                    (alias.asname or alias.name).split(".")[0]
+                    for alias in node.names if alias.name != "*"
+                ]
+            elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                bound = [
+                    n.id for target in targets for n in ast.walk(target)
+                    if isinstance(n, ast.Name)
+                ]
+            else:
+                bound = []
+            exports.extend(name for name in bound if name not in exports)
+        return exports
+
+    def closure(self, names: Iterable[str]) -> Set[str]:
+        """`names` plus every definition they depend on, transitively."""
+        pending, seen = list(names), set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            pending.extend(self.by_name[name].dependencies)
+        return seen
+
+    def fingerprint(self, definition: Definition) -> str:
+        """Changes when the definition, a dependency or the module context changes."""
+        dependencies = sorted(self.closure([definition.name]) - {definition.name})
+        return stable_hash(
+            definition.ast_hash,
+            self.context_hash,
+            *(f"{name}:{self.by_name[name].ast_hash}" for name in dependencies),
+        )
+
+    def prompt_source(self, changed: Iterable[str]) -> str:
+        """Module context plus the changed definitions and what they depend on."""
+        keep = self.closure(changed)
+        return "\n\n".join(
+            _node_lines(self.lines, node) for node in self.nodes
+            if not isinstance(node, DEFINITION_NODES) or node.name in keep
+        )
+
+
+class _UserImports:
+    """How a test module refers to user_code definitions."""
+
+    def __init__(self, tree: ast.Module):
+        self.aliases: Dict[str, str] = {}  # Local name -> definition (`from user_code import`)
+        self.modules: Set[str] = set()  # Local names bound to the module (`import user_code`)
+        for node in tree.body:
+            if isinstance(node, ast.ImportFrom) and node.module == USER_MODULE:
+                for alias in node.names:
+                    self.aliases[alias.asname or alias.name] = alias.name
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name == USER_MODULE:
+                        self.modules.add(alias.asname or alias.name)
+
+    def used(self, node: ast.AST) -> Set[str]:
+        """Definitions `node` uses, directly or as `<module alias>.<name>`."""
+        used = {self.aliases.get(name, name) for name in _referenced_names(node)}
+        used |= {
+            n.attr for n in ast.walk(node)
+            if isinstance(n, ast.Attribute)
+            and isinstance(n.value, ast.Name) and n.value.id in self.modules
+        }
+        return used
+
+
+def _is_test(node: ast.stmt) -> bool:
+    name = getattr(node, "name", "")
+    return name.startswith("test") or name.startswith("Test")
+
+
+def _owner(node: ast.stmt, imports: _UserImports, targets: List[str]) -> Optional[str]:
+    """
+    Target a test belongs to: the longest target named in the test's name,
+    otherwise the last target it references (dependents usually come after
+    their dependencies, and their tests also call the dependencies).
+    """
+    used = imports.used(node)
+    owners = [name for name in targets if name in used]
+    test_name = getattr(node, "name", "").lower()
+    named = [name for name in owners if name.lower() in test_name]
+    if named:
+        return max(named, key=len)
+    return owners[-1] if owners else None
+
+
+def split_tests(tests: str, targets: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Split a generated test module into one fragment per target definition.
+
+    Each test (or other top-level statement) goes to the target it exercises;
+    statements referencing none of them (fixtures, helpers) and imports go
+    to every fragment. Returns None if the tests do not parse or a test
+    cannot be attributed to a target: copied into every fragment, it would
+    outlive the definition it actually covers.
+    """
+    try:
+        tree = ast.parse(tests)
+    except SyntaxError:
+        return None
+    lines = tests.splitlines()
+    imports = _UserImports(tree)
+    fragments: Dict[str, List[str]] = {name: [] for name in targets}
+    for node in tree.body:
+        source = _node_lines(lines, node)
+        owner = None if isinstance(node, IMPORT_NODES) else _owner(node, imports, targets)
+        if owner is None:
+            if _is_test(node):
+                return None
+            for parts in fragments.values():
+                parts.append(source)
+        else:
+            fragments[owner].append(source)
+    return {
+        name: "\n\n\n".join(parts) if any(_has_code(p) for p in parts) else ""
+        for name, parts in fragments.items()
+    }
+
+
+def _has_code(source: str) -> bool:
+    # A fragment made only of imports carries no tests
+    return not re.match(r"^(from|import)\s", source)
+
+
+def _rename(source: str, old: str, new: str) -> str:
+    return re.sub(
+        rf"^((?:async\s+)?(?:def|class)\s+){re.escape(old)}\b", rf"\g<1>{new}",
+        source, count=1, flags=re.MULTILINE,
+    )
+
+
+def assemble_tests(
+    fragments: List[str], definitions: List[str], exports: Optional[List[str]] = None
+) -> str:
+    """
+    Join fragments into one test module: imports deduplicated, a single
+    `from user_code import ...` for the definitions that still exist (plus
+    any other name the tests import from user_code and it still `exports`,
+    such as constants), shared helpers emitted once and colliding test
+    names renamed.
+    """
+    imports: List[str] = []
+    imported: Set[str] = set()  # Names the fragments import from user_code
+    referenced: Set[str] = set()
+    body: List[str] = []
+    seen: Set[str] = set()
+    taken: Set[str] = set()
+    names = definitions if exports is None else exports
+    exported = set(names)
+
+    for fragment in filter(None, fragments):
+        tree = ast.parse(fragment)
+        lines = fragment.splitlines()
+        for node in tree.body:
+            source = _node_lines(lines, node)
+            if isinstance(node, ast.ImportFrom) and node.module == USER_MODULE:
+                for alias in node.names:
+                    if not alias.asname:
+                        imported.add(alias.name)
+                    elif alias.name in exported:
+                        line = f"from {USER_MODULE} import {alias.name} as {alias.asname}"
+                        if line not in seen:
+                            seen.add(line)
+                            imports.append(line)
+                continue
+            if source in seen:
+                continue  # Import or helper shared by several fragments
+            seen.add(source)
+            if isinstance(node, IMPORT_NODES):
+                imports.append(source)
+                continue
+            referenced |= _referenced_names(node)
+            name = getattr(node, "name", None)
+            if name is not None:
+                if name in taken:
+                    suffix = 2
+                    while f"{name}_{suffix}" in taken:
+                        suffix += 1
+                    source = _rename(source, name, f"{name}_{suffix}")
+                    name = f"{name}_{suffix}"
+                taken.add(name)
+            body.append(source)
+
+    user_names = referenced & (set(definitions) | (imported & exported))
+    if user_names:
+        ordered = [name for name in names if name in user_names]
+        imports.insert(0, f"from {USER_MODULE} import {', '.join(ordered)}")
+    return "\n".join(imports) + "\n\n\n" + "\n\n\n".join(body) if body else "\n".join(imports)
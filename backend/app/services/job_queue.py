@@ -0,0 +1,216 @@
+"""
+Background job subsystem for long test runs.
+
+`POST /api/jobs` enqueues a job and returns its id immediately; a pool of
+asyncio workers runs `process_code` for each job and stores the outcome in a
+`JobStore`. The queue lives in-process and is bounded, so a full queue
+surfaces as `QueueFullError` (HTTP 429) instead of unbounded buffering. Job
+state goes through the store interface, which has an in-memory
+implementation and one for any Redis-like client (`get`/`set` with `ex`).
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+from .test_generation_service import process_code
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_TIMEOUT = "timeout"
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue reached its maximum depth."""
+
+
+class JobStore:
+    """Storage interface for job records (plain JSON-serializable dicts)."""
+
+    def save(self, job: dict) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        self.save(job)
+        return job
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local store; finished jobs expire after `ttl` seconds."""
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+            self._expire()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.get("finished_at") and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class RedisJobStore(JobStore):
+    """Store backed by a Redis-like client exposing `get(key)` and `set(key, value, ex=)`."""
+
+    def __init__(self, client, prefix: str = "ai-test-generator:job:", ttl: float = 3600.0):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def save(self, job: dict) -> None:
+        self.client.set(self.prefix + job["id"], json.dumps(job), ex=int(self.ttl))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raw = self.client.get(self.prefix + job_id)
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        return json.loads(raw)
+
+
+Processor = Callable[..., Awaitable[dict]]
+
+
+class JobQueue:
+    """Bounded in-process queue drained by `workers` asyncio tasks."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        processor: Processor = process_code,
+        workers: int = 2,
+        max_depth: int = 100,
+        job_timeout: float = 120.0,
+    ):
+        self.store = store
+        self.processor = processor
+        self.workers = workers
+        self.max_depth = max_depth
+        self.job_timeout = job_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._loop = None
+
+    def submit(self, code: str, bypass_cache: bool = False) -> dict:
+        """Enqueue a job; raises `QueueFullError` when the queue is at capacity."""
+        self._ensure_workers()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": JOB_QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        try:
+            self._queue.put_nowait((job["id"], code, bypass_cache))
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_depth} pending jobs)")
+        self.store.save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    def _ensure_workers(self) -> None:
+        # Workers are bound to the running loop; recreate them if it changed
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            job_id, code, bypass_cache = await queue.get()
+            try:
+                await self._run(job_id, code, bypass_cache)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: str, code: str, bypass_cache: bool) -> None:
+        self.store.update(job_id, status=JOB_RUNNING, started_at=time.time())
+        try:
+            result = await asyncio.wait_for(
+                self.processor(code, bypass_cache=bypass_cache), self.job_timeout
+            )
+            self.store.update(
+                job_id, status=JOB_COMPLETED, result=result, finished_at=time.time()
+            )
+        except asyncio.TimeoutError:
+            self.store.update(
+                job_id,
+                status=JOB_TIMEOUT,
+                error=f"Job exceeded {self.job_timeout:g} seconds",
+                finished_at=time.time(),
+            )
+        except Exception as e:
+            self.store.update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+
+
+def _build_store() -> JobStore:
+    ttl = float(os.getenv("JOB_RESULT_TTL", "3600"))
+    redis_url = os.getenv("JOB_STORE_REDIS_URL")
+    if redis_url:
+        # Optional dependency, only needed when jobs are shared across instances
+        import redis
+
+        return RedisJobStore(redis.Redis.from_url(redis_url), ttl=ttl)
+    return InMemoryJobStore(ttl=ttl)
+
+
+_job_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue configured from the environment."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(
+            store=_build_store(),
+            workers=int(os.getenv("JOB_WORKERS", "2")),
+            max_depth=int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100")),
+            job_timeout=float(os.getenv("JOB_TIMEOUT", "120")),
+        )
+    return _job_queue
@@ -0,0 +1,274 @@
+"""
+Chat-completion backends used to generate tests.
+
+`LLM_PROVIDER` selects the backend: `groq` (default) talks to the Groq API,
+`openai` to any OpenAI-compatible `/chat/completions` endpoint (vLLM,
+llama.cpp, Ollama, LM Studio...) at `LLM_BASE_URL`, and `offline` disables
+remote generation entirely in favour of `offline_generator`. Every provider
+keeps one long-lived, per-event-loop HTTP connection pool and retries 429,
+5xx and connection errors with jittered exponential backoff. `stream`
+yields the completion in chunks as the server produces them; only opening
+the stream is retried, never a partly consumed one.
+"""
+import asyncio
+import json
+import os
+import random
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import groq
+import httpx
+from groq import AsyncGroq
+
+DEFAULT_GROQ_MODEL = "llama-3.1-8b-instant"
+
+# Shared client settings (connection pool, keep-alive, per-call timeout, retries)
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+
+def _http_client(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_POOL_SIZE,
+            max_keepalive_connections=LLM_POOL_SIZE,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+        ),
+        timeout=LLM_TIMEOUT,
+        **kwargs,
+    )
+
+
+def _is_retryable(error: Exception) -> bool:
+    # APITimeoutError is a subclass of APIConnectionError
+    if isinstance(error, (groq.APIConnectionError, httpx.TransportError)):
+        return True
+    response = getattr(error, "response", None)
+    if not isinstance(error, (groq.APIStatusError, httpx.HTTPStatusError)) or response is None:
+        return False
+    return response.status_code == 429 or response.status_code >= 500
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Server-provided Retry-After if any, otherwise jittered exponential backoff."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    backoff = min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt)
+    return backoff * random.uniform(0.5, 1.0)
+
+
+async def with_retries(call: Callable[[], Awaitable], max_retries: int = LLM_MAX_RETRIES):
+    """Await `call()`, retrying on 429, 5xx and connection errors."""
+    attempt = 0
+    while True:
+        try:
+            return await call()
+        except (groq.APIError, httpx.HTTPError) as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt))
+            attempt += 1
+
+
+class LLMProvider:
+    """Interface of a chat-completion backend."""
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def cache_id(self) -> str:
+        """Identifies the backend in generation cache keys."""
+        return f"{self.name}:{self.model}"
+
+    async def complete(self, prompt: str, temperature: float = 0.2) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, temperature: float = 0.2) -> AsyncIterator[str]:
+        """Completion in chunks; backends without streaming yield it whole."""
+        yield await self.complete(prompt, temperature=temperature)
+
+    async def close(self) -> None:
+        pass
+
+
+class GroqProvider(LLMProvider):
+    """Groq API through a shared `AsyncGroq` client."""
+
+    name = "groq"
+
+    def __init__(self, model: str, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        super().__init__(model)
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client: Optional[AsyncGroq] = None
+        self._client_loop = None
+
+    def client(self) -> AsyncGroq:
+        """Long-lived client created on first use; keeps connections and TLS sessions alive."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # httpx connections belong to the loop that opened them
+            self._client = AsyncGroq(
+                api_key=self.api_key or ("local-stub" if self.base_url else None),
+                base_url=self.base_url,
+                http_client=_http_client(),
+                timeout=LLM_TIMEOUT,
+                max_retries=0,  # Retries are handled by with_retries
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def complete(self, prompt: str, temperature: float = 0.2) -> str:
+        client = self.client()
+        response = await with_retries(lambda: client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+        ))
+        return response.choices[0].message.content
+
+    async def stream(self, prompt: str, temperature: float = 0.2) -> AsyncIterator[str]:
+        client = self.client()
+        chunks = await with_retries(lambda: client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            stream=True,
+        ))
+        try:
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await chunks.close()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+        self._client_loop = None
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any server implementing the OpenAI `POST /chat/completions` API."""
+
+    name = "openai"
+
+    def __init__(self, model: str, base_url: str, api_key: Optional[str] = None):
+        super().__init__(model)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = _http_client(base_url=self.base_url, headers=headers)
+            self._client_loop = loop
+        return self._client
+
+    async def complete(self, prompt: str, temperature: float = 0.2) -> str:
+        client = self.client()
+
+        async def call():
+            response = await client.post("/chat/completions", json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+            })
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+
+        return await with_retries(call)
+
+    async def stream(self, prompt: str, temperature: float = 0.2) -> AsyncIterator[str]:
+        client = self.client()
+
+        async def open_stream():
+            request = client.build_request("POST", "/chat/completions", json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "stream": True,
+            })
+            response = await client.send(request, stream=True)
+            if response.status_code >= 400:
+                await response.aread()
+                await response.aclose()
+                response.raise_for_status()
+            return response
+
+        response = await with_retries(open_stream)
+        try:
+            # Server-sent events: `data: {chunk}` lines, terminated by `data: [DONE]`
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+        finally:
+            await response.aclose()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+
+def build_provider(name: str) -> Optional[LLMProvider]:
+    """Provider for `name` configured from the environment; None for `offline`."""
+    name = name.strip().lower()
+    if name == "offline":
+        return None
+    if name == "groq":
+        return GroqProvider(
+            model=os.getenv("LLM_MODEL") or DEFAULT_GROQ_MODEL,
+            api_key=os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("GROQ_BASE_URL") or None,
+        )
+    if name == "openai":
+        return OpenAICompatibleProvider(
+            model=os.getenv("LLM_MODEL") or "local-model",
+            base_url=os.getenv("LLM_BASE_URL") or "http://localhost:11434/v1",
+            api_key=os.getenv("LLM_API_KEY") or None,
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER '{name}' (expected groq, openai or offline)")
+
+
+_provider: Optional[LLMProvider] = None
+_provider_loaded = False
+
+
+def get_llm_provider() -> Optional[LLMProvider]:
+    """Process-wide provider selected by `LLM_PROVIDER`; None means offline-only."""
+    global _provider, _provider_loaded
+    if not _provider_loaded:
+        _provider = build_provider(os.getenv("LLM_PROVIDER", "groq"))
+        _provider_loaded = True
+    return _provider
+
+
+async def close_llm_provider() -> None:
+    """Close the provider's connection pool (application shutdown)."""
+    if _provider is not None:
+        await _provider.close()
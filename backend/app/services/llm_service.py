@@ -1,10 +1,156 @@
+import asyncio
 import os
-from groq import Groq
+from typing import Dict, List, Optional
 
-def generate_tests_from_code(code: str) -> str:
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    
-    prompt = f"""You are a senior Python test engineer. Your task is to generate pytest unit tests for the following Python code.
+from .cache import (
+    SingleFlight,
+    TieredCache,
+    build_cache,
+    normalized_code_hash,
+    stable_hash,
+)
+from .code_validator import CodeAnalysis, analyze_code
+from .fragments import ModuleDefinitions, assemble_tests, split_tests
+from .llm_providers import get_llm_provider
+from .metrics import record_cache_lookup, record_generation, stage_timer
+from .offline_generator import OFFLINE_GENERATOR_VERSION, generate_offline_tests, is_trivial
+from .output_sanitizer import StreamingSanitizer, sanitize_tests
+from .prompt_builder import PROMPT_TOKEN_BUDGET, compact_source, estimate_tokens, plan_chunks
+
+# Bump whenever the prompt or the cleanup changes so cached tests are not reused
+PROMPT_VERSION = "4"
+# Answer trivial, fully type-hinted snippets with the offline generator
+OFFLINE_TRIVIAL = os.getenv("LLM_OFFLINE_TRIVIAL", "1") == "1"
+
+_generation_cache: Optional[TieredCache] = None
+# Concurrent misses for the same key share one LLM call
+_generation_flight = SingleFlight("generation")
+
+
+def get_generation_cache() -> TieredCache:
+    """Cache of generated tests, configured from the environment"""
+    global _generation_cache
+    if _generation_cache is None:
+        _generation_cache = build_cache(
+            max_entries=int(os.getenv("GENERATION_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("GENERATION_CACHE_TTL", "3600")),
+            db_path=os.getenv("GENERATION_CACHE_DB") or None,
+        )
+    return _generation_cache
+
+
+def generation_cache_key(code: str, analysis: Optional[CodeAnalysis] = None) -> str:
+    """Key on the AST-normalized code so whitespace/comment-only edits still hit"""
+    code_hash = analysis.normalized_hash if analysis is not None else normalized_code_hash(code)
+    provider = get_llm_provider()
+    return stable_hash(code_hash, provider.cache_id if provider else "offline", PROMPT_VERSION)
+
+
+async def generate_tests_from_code(code: str, analysis: Optional[CodeAnalysis] = None) -> str:
+    provider = get_llm_provider()
+    if provider is None or OFFLINE_TRIVIAL:
+        analysis = analysis if analysis is not None else analyze_code(code)
+        if provider is None or is_trivial(analysis):
+            # Deterministic and cheap: no cache, no network round trip
+            with stage_timer("offline_generation"):
+                tests = generate_offline_tests(analysis)
+            record_generation(f"offline-v{OFFLINE_GENERATOR_VERSION}")
+            return tests
+
+    cache = get_generation_cache()
+    key = generation_cache_key(code, analysis)
+    cached = cache.get(key)
+    record_cache_lookup("generation", cached is not None)
+    if cached is not None:
+        return cached
+
+    async def generate() -> str:
+        tree = (analysis if analysis is not None else analyze_code(code)).tree
+        if tree is not None:
+            tests = await _generate_incremental(code, ModuleDefinitions(code, tree))
+        else:
+            tests = await _generate_with_llm(code)
+        cache.set(key, tests)
+        return tests
+
+    return await _generation_flight.do(key, generate)
+
+
+def fragment_cache_key(module: ModuleDefinitions, name: str) -> str:
+    provider = get_llm_provider()
+    fingerprint = module.fingerprint(module.by_name[name])
+    return stable_hash("fragment", fingerprint, provider.cache_id, PROMPT_VERSION)
+
+
+async def _generate_incremental(code: str, module: ModuleDefinitions) -> str:
+    """
+    Reuse cached per-definition test fragments and prompt the LLM only with
+    the definitions whose fingerprint changed (plus the context they need).
+    """
+    if not module.definitions:
+        return await _generate_with_llm(code)
+
+    cache = get_generation_cache()
+    keys = {name: fragment_cache_key(module, name) for name in module.names}
+    fragments = {}
+    for name, key in keys.items():
+        fragments[name] = cache.get(key)
+        record_cache_lookup("fragment", fragments[name] is not None)
+    changed = [name for name in module.names if fragments[name] is None]
+
+    if changed:
+        partial = len(changed) < len(module.names)
+        if not partial and estimate_tokens(code) <= PROMPT_TOKEN_BUDGET:
+            # Small module: one prompt with the code exactly as submitted
+            tests = await _generate_with_llm(code)
+            fresh = split_tests(tests, changed)
+            if fresh is None:
+                return tests  # Unsplittable output is still usable as a whole
+        else:
+            fresh = await _generate_chunked(module, changed)
+            if None in fresh.values() and estimate_tokens(code) <= PROMPT_TOKEN_BUDGET:
+                # Unsplittable output: fall back to one full generation while it fits
+                return await _generate_with_llm(code)
+        for name in changed:
+            if fresh[name] is not None:
+                cache.set(keys[name], fresh[name])
+            fragments[name] = fresh[name] or ""
+
+    return assemble_tests(
+        [fragments[name] for name in module.names], module.names, module.exports
+    )
+
+
+async def _generate_chunked(
+    module: ModuleDefinitions, names: List[str]
+) -> Dict[str, Optional[str]]:
+    """
+    Generate tests for `names` in token-budgeted chunks run concurrently.
+    Fragments of a chunk whose output does not parse come back as None
+    (not cached, so the next request retries them).
+    """
+    chunks = plan_chunks(module, names)
+    results = await asyncio.gather(*(
+        _generate_with_llm(compact_source(module, chunk), targets=chunk) for chunk in chunks
+    ))
+    fresh: Dict[str, Optional[str]] = {}
+    for chunk, tests in zip(chunks, results):
+        split = split_tests(tests, chunk)
+        for name in chunk:
+            fresh[name] = split[name] if split is not None else None
+    return fresh
+
+
+def build_prompt(code: str, targets: Optional[List[str]] = None) -> str:
+    """Test generation prompt; with `targets`, the rest of `code` is context only."""
+    if targets:
+        scope = (
+            f"Write tests ONLY for these definitions: {', '.join(targets)}. "
+            "The rest of the code is context; do not test it.\n\n"
+        )
+    else:
+        scope = ""
+    return f"""You are a senior Python test engineer. Your task is to generate pytest unit tests for the following Python code.
 
 CRITICAL INSTRUCTIONS FOR TESTS THAT WILL ALL PASS:
 1. Return ONLY valid Python test code - NO markdown, NO code blocks (```), NO explanatory text
@@ -16,77 +162,26 @@ CRITICAL INSTRUCTIONS FOR TESTS THAT WILL ALL PASS:
 7. Only test with inputs that the code can handle without raising exceptions
 8. Start with imports, followed by test functions - NO introductory explanations
 
-Python Code to Test:
+{scope}Python Code to Test:
 {code}
 
 REMEMBER: Generate tests that will ALL PASS. Avoid edge cases that cause unhandled exceptions.
 Generate ONLY the test code (Python syntax only, import from user_code):"""
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-    )
 
-    tests = response.choices[0].message.content.strip()
-    
-    # Clean up markdown code blocks and non-code lines
-    lines = tests.split("\n")
-    cleaned_lines = []
-    in_code_block = False
-    
-    for line in lines:
-        stripped = line.strip()
-        
-        # Skip markdown markers
-        if stripped.startswith("```"):
-            in_code_block = not in_code_block
-            continue
-        
-        # Skip completely empty lines or lines with only whitespace
-        if not stripped:
-            cleaned_lines.append("")
-            continue
-        
-        # Skip lines that are clearly explanatory text (not Python code)
-        # These typically start with capital letters and contain certain keywords
-        if stripped and not any(stripped.startswith(prefix) for prefix in [
-            "import", "from", "def ", "class ", "@", "assert", "if ", "for ", 
-            "while ", "try", "except", "finally", "with ", "return", "#", "'", '"',
-            ".", "[", "(", "+", "-", "*", "/", "="
-        ]):
-            # This line doesn't look like Python code
-            # Only include it if it's a comment (convert if needed)
-            if stripped[0] not in ["#"]:
-                # Skip it if it looks like English text
-                if stripped[0].isupper() and "." in stripped and len(stripped) > 20:
-                    continue
-        
-        cleaned_lines.append(line)
-    
-    tests = "\n".join(cleaned_lines).strip()
-    
-    # Remove any trailing non-code text after the last def/assert block
-    # Find the last occurrence of 'def ' or 'assert'
-    parts = tests.rsplit("assert", 1)
-    if len(parts) > 1:
-        # Check if there's explanatory text after the last assert
-        after_last = parts[1]
-        lines_after = after_last.split("\n")
-        # Keep only lines that are still part of the test function
-        valid_lines = []
-        for line in lines_after:
-            s = line.strip()
-            if s and not s[0].isupper():  # Keep short or code lines
-                valid_lines.append(line)
-            elif not s:  # Keep empty lines
-                valid_lines.append(line)
-        tests = parts[0] + "assert" + "\n".join(valid_lines)
-    
-    tests = tests.strip()
-    
-    # Replace any remaining references to 'from code' with 'from user_code'
-    tests = tests.replace("from code import", "from user_code import")
-    tests = tests.replace("import code", "import user_code")
-    
-    return tests
+async def _generate_with_llm(code: str, targets: Optional[List[str]] = None) -> str:
+    provider = get_llm_provider()
+    sanitizer = StreamingSanitizer()
+    # Chunks are cleaned as they arrive; finishing only validates and rewrites imports
+    with stage_timer("llm_call"):
+        async for chunk in provider.stream(build_prompt(code, targets), temperature=0.2):
+            sanitizer.feed(chunk)
+    record_generation(provider.name)
+
+    with stage_timer("llm_cleanup"):
+        return sanitizer.finish()
+
+
+def clean_generated_tests(raw: str) -> str:
+    """Strip markdown fences and prose from an LLM response, keeping test code"""
+    return sanitize_tests(raw)
@@ -0,0 +1,182 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters and histograms are kept in a module-level registry and rendered by
+`GET /metrics`. `stage_timer` records a stage duration into the
+`ai_test_generator_stage_seconds` histogram and, when a request collects
+timings (`collect_timings`), into that request's per-stage breakdown.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [bucket counts..., sum, count]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return series[-1] if series else 0
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, series):
+                    labels = _format_labels(key, ("le", f"{bound:g}"))
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                inf_labels = _format_labels(key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return "\n".join(lines)
+
+
+REQUESTS = Counter(
+    "ai_test_generator_requests_total",
+    "Generation requests by response status and error type.",
+)
+STAGE_SECONDS = Histogram(
+    "ai_test_generator_stage_seconds",
+    "Duration of pipeline stages in seconds.",
+)
+EXECUTIONS = Counter(
+    "ai_test_generator_sandbox_executions_total",
+    "Sandbox executions by sandbox kind (docker/local) and whether a pooled container was used.",
+)
+CACHE_LOOKUPS = Counter(
+    "ai_test_generator_cache_lookups_total",
+    "Cache lookups by cache name and result (hit/miss).",
+)
+
+GENERATIONS = Counter(
+    "ai_test_generator_generations_total",
+    "Test generations that missed the cache, by backend (groq/openai/offline-vN).",
+)
+COALESCED = Counter(
+    "ai_test_generator_coalesced_calls_total",
+    "Calls that joined an identical in-flight generation or execution instead of repeating it.",
+)
+ADMISSIONS = Counter(
+    "ai_test_generator_admissions_total",
+    "API requests by admission lane and outcome (admitted/rate_limited/overloaded).",
+)
+
+REGISTRY = [
+    REQUESTS, STAGE_SECONDS, EXECUTIONS, CACHE_LOOKUPS, GENERATIONS, COALESCED, ADMISSIONS,
+]
+
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "ai_test_generator_timings", default=None
+)
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = round(timings.get(stage, 0.0) + seconds, 4)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect the stage timings recorded by the current request (and tasks it spawns)."""
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_coalesced(stage: str) -> None:
+    COALESCED.inc(stage=stage)
+
+
+def record_admission(lane: str, outcome: str) -> None:
+    ADMISSIONS.inc(lane=lane, outcome=outcome)
+
+
+def record_generation(backend: str) -> None:
+    GENERATIONS.inc(backend=backend)
+
+
+def record_request(response: dict) -> None:
+    REQUESTS.inc(status=response["status"], error_type=response.get("error_type") or "none")
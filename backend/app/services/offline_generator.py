@@ -0,0 +1,167 @@
+"""
+Deterministic, LLM-free test generation from the AST.
+
+For every public top-level function whose required parameters can be filled
+from their type hints (or defaults), emits a smoke test that calls it with
+representative inputs and checks the type of the result against the return
+annotation. Snippets made only of such functions are "trivial": they are
+answered here without a network round trip even when an LLM is configured.
+With `LLM_PROVIDER=offline` every snippet is answered here.
+"""
+import ast
+from typing import Dict, List, Optional
+
+from .code_validator import CodeAnalysis
+
+# Bump whenever the generated tests change so cached results are not reused
+OFFLINE_GENERATOR_VERSION = "1"
+
+# Representative inputs per positional parameter; values are distinct per
+# position so that `a - b` or `a / (a - b)` do not collapse to zero.
+SAMPLES: Dict[str, List[str]] = {
+    "int": ["7", "3", "5", "2"],
+    "float": ["7.5", "2.5", "4.0", "1.5"],
+    "str": ['"hello world"', '"python"', '"abc"', '"xyz"'],
+    "bool": ["True", "False", "True", "False"],
+    "list": ["[3, 1, 2, 5, 4]", "[2, 4, 6]"],
+    "dict": ['{"a": 1, "b": 2}', '{"c": 3}'],
+    "tuple": ["(3, 1, 2)", "(5, 4)"],
+    "set": ["{3, 1, 2}", "{5, 4}"],
+}
+ELEMENT_SAMPLES = {
+    "int": "[3, 1, 2, 5, 4]",
+    "float": "[3.5, 1.0, 2.25]",
+    "str": '["banana", "apple", "cherry"]',
+    "bool": "[True, False, True]",
+}
+TYPING_ALIASES = {"List": "list", "Dict": "dict", "Tuple": "tuple", "Set": "set"}
+# isinstance() targets per return annotation
+RESULT_TYPES = {
+    "int": "int",
+    "float": "(int, float)",
+    "str": "str",
+    "bool": "bool",
+    "list": "list",
+    "dict": "dict",
+    "tuple": "tuple",
+    "set": "set",
+}
+IMPORT_ONLY_TESTS = (
+    "import user_code\n\n\ndef test_module_imports():\n    assert user_code is not None\n"
+)
+# Statements that make a function's behaviour on arbitrary inputs hard to predict
+UNPREDICTABLE = (ast.Raise, ast.While, ast.Assert, ast.Try, ast.Global, ast.Nonlocal)
+
+
+def _type_name(annotation: Optional[ast.expr]) -> Optional[str]:
+    if isinstance(annotation, ast.Name):
+        return TYPING_ALIASES.get(annotation.id, annotation.id)
+    if isinstance(annotation, ast.Attribute):  # typing.List
+        return TYPING_ALIASES.get(annotation.attr, annotation.attr)
+    if isinstance(annotation, ast.Subscript):
+        return _type_name(annotation.value)
+    if isinstance(annotation, ast.Constant) and annotation.value is None:
+        return "None"
+    return None
+
+
+def _sample(annotation: Optional[ast.expr], position: int) -> Optional[str]:
+    if isinstance(annotation, ast.Subscript):
+        outer = _type_name(annotation.value)
+        inner = annotation.slice
+        if outer == "Optional":
+            return _sample(inner, position)
+        if outer == "list" and not isinstance(inner, ast.Tuple):
+            return ELEMENT_SAMPLES.get(_type_name(inner))
+    options = SAMPLES.get(_type_name(annotation))
+    return options[position % len(options)] if options else None
+
+
+def _call_arguments(func: ast.FunctionDef) -> Optional[List[str]]:
+    """Source of the positional arguments to call `func` with, or None if unknown."""
+    args = func.args
+    if any(default is None for default in args.kw_defaults):
+        return None  # Required keyword-only parameter
+    params = args.posonlyargs + args.args
+    required = params[: len(params) - len(args.defaults)]
+    values = []
+    for position, param in enumerate(required):
+        value = _sample(param.annotation, position)
+        if value is None:
+            return None
+        values.append(value)
+    return values
+
+
+def _public_functions(tree: ast.Module) -> List[ast.FunctionDef]:
+    return [
+        node for node in tree.body
+        if isinstance(node, ast.FunctionDef) and not node.name.startswith("_")
+    ]
+
+
+def _result_type(returns: Optional[ast.expr]) -> Optional[str]:
+    """isinstance() target for a return annotation, or None if it cannot be checked."""
+    name = _type_name(returns)
+    if name == "None":
+        return "type(None)"
+    if name == "Optional" and isinstance(returns, ast.Subscript):
+        inner = _result_type(returns.slice)
+        return f"({inner.strip('()')}, type(None))" if inner else None
+    return RESULT_TYPES.get(name)
+
+
+def _is_predictable(func: ast.FunctionDef) -> bool:
+    return (
+        _result_type(func.returns) is not None
+        and not any(isinstance(node, UNPREDICTABLE) for node in ast.walk(func))
+    )
+
+
+def is_trivial(analysis: CodeAnalysis) -> bool:
+    """
+    True when the snippet is only imports and fully type-hinted functions
+    without raises, loops of unknown length or exception handling, so the
+    offline tests cover it as well as an LLM would.
+    """
+    if analysis.tree is None or not analysis.is_safe or analysis.classes:
+        return False
+    for node in analysis.tree.body:
+        is_docstring = isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+        if not isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef)) and not is_docstring:
+            return False
+    functions = _public_functions(analysis.tree)
+    return bool(functions) and all(
+        _call_arguments(func) is not None and _is_predictable(func) for func in functions
+    )
+
+
+def _function_test(func: ast.FunctionDef, arguments: List[str]) -> List[str]:
+    call = f"{func.name}({', '.join(arguments)})"
+    result_type = _result_type(func.returns)
+    lines = [f"def test_{func.name}_with_typical_inputs():"]
+    if result_type == "type(None)":
+        lines += [f"    assert {call} is None"]
+    elif result_type is not None:
+        lines += [f"    result = {call}", f"    assert isinstance(result, {result_type})"]
+    else:
+        lines += [f"    {call}"]  # Smoke test: the call completes without raising
+    return lines
+
+
+def generate_offline_tests(analysis: CodeAnalysis) -> str:
+    """Pytest module for the functions in `analysis` (import smoke test as a fallback)."""
+    functions = []
+    if analysis.tree is not None:
+        functions = [
+            (func, arguments) for func in _public_functions(analysis.tree)
+            if (arguments := _call_arguments(func)) is not None
+        ]
+    if not functions:
+        return IMPORT_ONLY_TESTS
+
+    names = ", ".join(func.name for func, _ in functions)
+    blocks = [f"from user_code import {names}"]
+    for func, arguments in functions:
+        blocks.append("\n".join(_function_test(func, arguments)))
+    return "\n\n\n".join(blocks) + "\n"
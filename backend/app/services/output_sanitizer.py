@@ -0,0 +1,215 @@
+"""
+Incremental cleanup of LLM-generated test modules.
+
+`StreamingSanitizer` consumes the completion chunk by chunk as the provider
+streams it. Each line is classified exactly once, when it completes:
+markdown fences and column-0 prose are dropped, code is kept, and a small
+scanner tracks open brackets and triple-quoted strings so docstrings and
+continuation lines are never mistaken for prose. Indented lines are never
+prose: they belong to a compound statement. `feed` returns the top-level
+statements completed so far, so callers can act on the module before the
+completion ends.
+
+`finish` validates the result with `ast.parse`. Output cut off mid-statement
+(or with trailing text) is truncated to the last top-level statement that
+parses. Imports of `code` are then rewritten to `user_code` on the AST, so
+only real import statements change.
+"""
+import ast
+import keyword
+import re
+from typing import List, Optional
+
+USER_MODULE = "user_code"
+PROMPT_MODULE = "code"
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+# Three or more plain words ("Here are the tests:"), list markers, bold text
+_PROSE = re.compile(
+    r"^(?:[A-Za-z][\w'’-]*[,:]?(?: [A-Za-z][\w'’-]*[,:;.!?]?){2,}"
+    r"|\d+[.)] +\S|[-*] +[A-Za-z]|\*\*)"
+)
+_ASSIGNMENT = re.compile(r"[^=!<>]=[^=]")
+_KEYWORDS = set(keyword.kwlist) | set(keyword.softkwlist)
+
+
+class StreamingSanitizer:
+    """One-pass fence/prose filter over a streamed completion."""
+
+    def __init__(self):
+        self._pending = ""
+        self._lines: List[str] = []
+        # Index in `_lines` where each top-level statement starts
+        self._starts: List[int] = []
+        self._emitted = 0
+        self._depth = 0
+        self._string: Optional[str] = None  # Open triple quote, if any
+        self._continued = False  # Previous line ended with a backslash
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Consume a chunk; returns the top-level statements it completed, with
+        `code` imports already rewritten.
+        """
+        text = self._pending + chunk
+        *complete, self._pending = text.split("\n")
+        for line in complete:
+            self._line(line)
+        return self._completed(len(self._starts) - 1)
+
+    def finish(self) -> str:
+        """Sanitized module: valid Python, `code` imports pointing at `user_code`."""
+        if self._pending:
+            self._line(self._pending)
+            self._pending = ""
+        source, tree = self._parseable()
+        if tree is None:
+            return source
+        return _rewrite_imports(source, tree)
+
+    def _completed(self, upto: int) -> List[str]:
+        statements = []
+        while self._emitted < upto:
+            start, end = self._starts[self._emitted], self._starts[self._emitted + 1]
+            statements.append(_rewrite_statement("\n".join(self._lines[start:end]).rstrip()))
+            self._emitted += 1
+        return statements
+
+    def _line(self, line: str) -> None:
+        stripped = line.strip()
+        if self._string is None and _FENCE.match(line):
+            # A fence closes the block even if the model left brackets open
+            self._depth, self._continued = 0, False
+            return
+        inside = self._string is not None or self._depth > 0 or self._continued
+        if not inside and stripped:
+            top_level = line[0] not in " \t"
+            # Prose is only recognised at column 0: an indented line belongs to
+            # a compound statement, where `first, second = f(x)` or
+            # `assert a and b and c` would look like words
+            if top_level and _is_prose(stripped):
+                return
+            if top_level and line[0] not in "#)]}" and not _continues(stripped):
+                self._starts.append(len(self._lines))
+        self._lines.append(line)
+        self._scan(line)
+        self._continued = self._string is None and line.endswith("\\")
+
+    def _scan(self, line: str) -> None:
+        """Track bracket depth and open triple-quoted strings across lines."""
+        i, n = 0, len(line)
+        while i < n:
+            if self._string is not None:
+                end = line.find(self._string, i)
+                if end < 0:
+                    return
+                i, self._string = end + 3, None
+                continue
+            char = line[i]
+            if char == "#":
+                return
+            if char in "\"'":
+                if line.startswith(char * 3, i):
+                    self._string = char * 3
+                    i += 3
+                    continue
+                i = _skip_string(line, i)
+                continue
+            if char in "([{":
+                self._depth += 1
+            elif char in ")]}":
+                self._depth = max(0, self._depth - 1)
+            i += 1
+
+    def _parseable(self):
+        """(source, tree) truncated to the last top-level statement that parses."""
+        lines = self._lines
+        starts = self._starts
+        end = len(lines)
+        while True:
+            source = "\n".join(lines[:end]).strip()
+            try:
+                return source, ast.parse(source)
+            except SyntaxError as e:
+                error_index = (e.lineno or end) - 1 + _leading_blank_lines(lines)
+                earlier = [s for s in starts if s < end and s <= error_index]
+                if not earlier or earlier[-1] == 0:
+                    # Nothing valid to fall back to: hand back the text as produced
+                    return "\n".join(lines).strip(), None
+                end = earlier[-1]
+
+
+def _is_prose(stripped: str) -> bool:
+    if not _PROSE.match(stripped):
+        return False
+    if _ASSIGNMENT.search(stripped):
+        return False  # `first, second, third = split3(text)`
+    first = re.split(r"[\s,:]", stripped, maxsplit=1)[0]
+    return first not in _KEYWORDS
+
+
+def _continues(stripped: str) -> bool:
+    # Clauses that belong to the previous compound statement
+    return re.match(r"(elif|else|except|finally)\b", stripped) is not None
+
+
+def _skip_string(line: str, i: int) -> int:
+    quote, i = line[i], i + 1
+    while i < len(line):
+        if line[i] == "\\":
+            i += 2
+            continue
+        if line[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _leading_blank_lines(lines: List[str]) -> int:
+    count = 0
+    for line in lines:
+        if line.strip():
+            break
+        count += 1
+    return count
+
+
+def _rewrite_imports(source: str, tree: ast.Module) -> str:
+    """Point `import code` / `from code import ...` at `user_code`, keeping local names."""
+    edits = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module and (
+            node.module == PROMPT_MODULE or node.module.startswith(PROMPT_MODULE + ".")
+        ):
+            node.module = USER_MODULE + node.module[len(PROMPT_MODULE):]
+            edits.append(node)
+        elif isinstance(node, ast.Import) and any(a.name == PROMPT_MODULE for a in node.names):
+            for alias in node.names:
+                if alias.name == PROMPT_MODULE:
+                    alias.name, alias.asname = USER_MODULE, alias.asname or PROMPT_MODULE
+            edits.append(node)
+    if not edits:
+        return source
+
+    lines = source.split("\n")
+    # Bottom-up so earlier offsets stay valid
+    for node in sorted(edits, key=lambda n: (n.lineno, n.col_offset), reverse=True):
+        first, last = lines[node.lineno - 1], lines[node.end_lineno - 1]
+        lines[node.lineno - 1:node.end_lineno] = [
+            first[:node.col_offset] + ast.unparse(node) + last[node.end_col_offset:]
+        ]
+    return "\n".join(lines)
+
+
+def _rewrite_statement(statement: str) -> str:
+    try:
+        return _rewrite_imports(statement, ast.parse(statement))
+    except SyntaxError:
+        return statement
+
+
+def sanitize_tests(raw: str) -> str:
+    """Sanitize a complete (non-streamed) response."""
+    sanitizer = StreamingSanitizer()
+    sanitizer.feed(raw)
+    return sanitizer.finish()
@@ -0,0 +1,117 @@
+"""
+Token-budgeted source for generation prompts.
+
+A prompt carries the definitions under test plus the context they need. When
+that exceeds `PROMPT_TOKEN_BUDGET` (estimated tokens of source code), the
+source is trimmed progressively: first docstrings and comments go, then the
+bodies of definitions that are only context (dependencies of the targets)
+are replaced by their signatures. Modules whose definitions do not fit one
+prompt even after trimming are split into chunks of whole top-level
+functions/classes, each generated separately and merged by `fragments`.
+"""
+import ast
+import copy
+import math
+import os
+from typing import Iterable, List, Optional
+
+from .fragments import DEFINITION_NODES, ModuleDefinitions
+
+CHARS_PER_TOKEN = 4.0
+PROMPT_TOKEN_BUDGET = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "2500"))
+
+_FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_DOCSTRING_OWNERS = (ast.Module, ast.ClassDef) + _FUNCTION_NODES
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for Python source)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _is_docstring(node: ast.stmt) -> bool:
+    return (
+        isinstance(node, ast.Expr)
+        and isinstance(node.value, ast.Constant)
+        and isinstance(node.value.value, str)
+    )
+
+
+def strip_docstrings(node: ast.AST) -> ast.AST:
+    """Copy of `node` without docstrings (comments are lost when unparsing anyway)."""
+    node = copy.deepcopy(node)
+    for owner in ast.walk(node):
+        if isinstance(owner, _DOCSTRING_OWNERS) and owner.body and _is_docstring(owner.body[0]):
+            owner.body = owner.body[1:] or [ast.Pass()]
+    return node
+
+
+def stub_definition(node: ast.stmt) -> ast.stmt:
+    """Signature-only copy: function bodies become `...`, classes keep their attributes."""
+    node = strip_docstrings(node)
+    for owner in ast.walk(node):
+        if isinstance(owner, _FUNCTION_NODES):
+            owner.body = [ast.Expr(ast.Constant(...))]
+    return node
+
+
+def _render(nodes: Iterable[ast.stmt]) -> str:
+    return "\n\n".join(ast.unparse(node) for node in nodes)
+
+
+def compact_source(
+    module: ModuleDefinitions, targets: List[str], budget: Optional[int] = None
+) -> str:
+    """
+    Module context plus `targets` and what they depend on, trimmed until it
+    fits `budget` tokens (best effort: targets themselves are never stubbed).
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    source = module.prompt_source(targets)
+    if estimate_tokens(source) <= budget:
+        return source
+
+    keep = module.closure(targets)
+    kept = [
+        node for node in module.nodes
+        if not isinstance(node, DEFINITION_NODES) or node.name in keep
+    ]
+    stripped = _render(strip_docstrings(node) for node in kept)
+    if estimate_tokens(stripped) <= budget:
+        return stripped
+
+    wanted = set(targets)
+    return _render(
+        stub_definition(node)
+        if isinstance(node, DEFINITION_NODES) and node.name not in wanted
+        else strip_docstrings(node)
+        for node in kept
+    )
+
+
+def plan_chunks(
+    module: ModuleDefinitions, names: List[str], budget: Optional[int] = None
+) -> List[List[str]]:
+    """
+    Group `names` (in module order) into chunks whose trimmed definitions fit
+    one prompt next to the module context. A definition larger than the
+    budget gets a chunk of its own.
+    """
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    context = _render(
+        strip_docstrings(node) for node in module.nodes if not isinstance(node, DEFINITION_NODES)
+    )
+    # Leave room for the context and dependency signatures
+    available = max(budget - estimate_tokens(context), budget // 2)
+
+    chunks: List[List[str]] = []
+    used = 0
+    for name in names:
+        size = estimate_tokens(ast.unparse(strip_docstrings(module.by_name[name].node)))
+        if chunks and used + size <= available:
+            chunks[-1].append(name)
+            used += size
+        else:
+            chunks.append([name])
+            used = size
+    return chunks
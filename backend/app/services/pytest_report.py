@@ -0,0 +1,95 @@
+"""
+Machine-readable pytest results.
+
+Every sandbox run passes `--junitxml` to pytest (built in, so the sandbox
+image needs no extra plugin). Containers cannot be read back from the host,
+so the sandbox command prints the report after `REPORT_MARKER` on stdout;
+local runs read the file directly. The report is parsed once here into the
+`test_results` structure returned by the API.
+"""
+import xml.etree.ElementTree as ET
+from typing import List, Optional, Tuple
+
+REPORT_MARKER = "@@ai-test-generator:junit-report@@"
+REPORT_PATH = "/tmp/pytest-report.xml"
+REPORT_MAX_BYTES = 2_000_000
+MESSAGE_MAX_CHARS = 2000
+
+
+def pytest_shell_command(targets: str, report_path: str = REPORT_PATH) -> str:
+    """Shell command that runs pytest and appends the JUnit report to stdout."""
+    return (
+        f"pytest {targets} -v --tb=short --junitxml={report_path}; status=$?; "
+        f"echo '{REPORT_MARKER}'; cat {report_path} 2>/dev/null; exit $status"
+    )
+
+
+def split_report(stdout: str) -> Tuple[str, Optional[str]]:
+    """(pytest output, report XML or None) from the stdout of `pytest_shell_command`."""
+    output, marker, report = stdout.rpartition(REPORT_MARKER)
+    if not marker:
+        return stdout, None
+    return output.rstrip("\n") + "\n", report.strip() or None
+
+
+def _node_id(classname: str, name: str) -> str:
+    # "test_generated.TestMore" + "test_c" -> "test_generated.py::TestMore::test_c"
+    parts = classname.split(".") if classname else []
+    split_at = next((i for i, part in enumerate(parts) if part[:1].isupper()), len(parts))
+    path = "/".join(parts[:split_at])
+    return "::".join(([f"{path}.py"] if path else []) + parts[split_at:] + [name])
+
+
+def _case_result(case: ET.Element) -> dict:
+    outcome, message = "passed", None
+    for child in case:
+        if child.tag in ("failure", "error", "skipped"):
+            outcome = {"failure": "failed", "error": "error", "skipped": "skipped"}[child.tag]
+            message = child.get("message") or (child.text or "").strip() or None
+            break
+    if message and len(message) > MESSAGE_MAX_CHARS:
+        message = message[:MESSAGE_MAX_CHARS] + "..."
+    return {
+        "name": _node_id(case.get("classname", ""), case.get("name", "")),
+        "outcome": outcome,
+        "duration": round(float(case.get("time") or 0.0), 4),
+        "message": message,
+    }
+
+
+def summarize(tests: List[dict], duration: float) -> dict:
+    counts = {outcome: 0 for outcome in ("passed", "failed", "error", "skipped")}
+    for test in tests:
+        counts[test["outcome"]] += 1
+    return {
+        "total": len(tests),
+        "passed": counts["passed"],
+        "failed": counts["failed"],
+        "errors": counts["error"],
+        "skipped": counts["skipped"],
+        "duration": round(duration, 4),
+        "tests": tests,
+    }
+
+
+def parse_junit_report(xml: Optional[str]) -> Optional[dict]:
+    """Structured results from a JUnit XML report; None if missing or unreadable."""
+    if not xml or len(xml) > REPORT_MAX_BYTES:
+        return None
+    try:
+        root = ET.fromstring(xml)
+    except ET.ParseError:
+        return None
+    suites = [root] if root.tag == "testsuite" else root.findall("testsuite")
+    tests = [_case_result(case) for case in root.iter("testcase")]
+    duration = sum(float(suite.get("time") or 0.0) for suite in suites)
+    return summarize(tests, duration)
+
+
+def merge_results(results: List[Optional[dict]]) -> Optional[dict]:
+    """Combine the structured results of several runs (shards)."""
+    present = [result for result in results if result is not None]
+    if not present:
+        return None
+    tests = [test for result in present for test in result["tests"]]
+    return summarize(tests, sum(result["duration"] for result in present))
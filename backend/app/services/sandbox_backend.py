@@ -0,0 +1,246 @@
+"""
+Descubrimiento y precalentamiento del backend de sandbox.
+
+Resuelve una sola vez (al arrancar) si el daemon de Docker responde y qué
+imagen usar, y cachea el resultado. Las ejecuciones leen la caché sin lanzar
+subprocesos; cuando el resultado caduca se refresca en segundo plano.
+
+Sólo se sirve en Docker con la imagen de sandbox verificada (pytest
+importable, sin red). El prewarm de arranque la construye desde
+`Dockerfile.sandbox` o la descarga si falta; mientras no esté lista las
+ejecuciones se rechazan ("Sandbox not ready") en vez de instalar pytest en
+cada contenedor o caer al host. Sólo sin Docker se usa el fallback local.
+"""
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+SANDBOX_IMAGE = "ai-test-generator-sandbox:latest"
+SANDBOX_DOCKERFILE = "Dockerfile.sandbox"
+# Raíz del repositorio: contexto de build de Dockerfile.sandbox
+DEFAULT_BUILD_CONTEXT = str(Path(__file__).resolve().parents[3])
+PREWARM_MODES = ("build", "pull", "verify", "off")
+BUILD_TIMEOUT = 900
+VERIFY_TIMEOUT = 30
+VERIFY_SCRIPT = "import pytest, sys; sys.stdout.write(pytest.__version__)"
+
+
+class SandboxDiscovery:
+    """Caché del estado de Docker y de la imagen de sandbox elegida."""
+
+    def __init__(
+        self,
+        preferred_image: str = SANDBOX_IMAGE,
+        refresh_interval: float = 60.0,
+    ):
+        self.preferred_image = preferred_image
+        self.refresh_interval = refresh_interval
+        self._state: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        # Digest de imagen -> versión de pytest comprobada dentro de ella
+        self._verified: Dict[str, str] = {}
+        self.prewarm_status = {"status": "pending", "mode": None, "error": None}
+
+    def resolve(self) -> dict:
+        """Ejecuta las sondas de forma síncrona y actualiza la caché."""
+        state = self._probe()
+        with self._lock:
+            self._state = state
+            self._refreshing = False
+        return dict(state)
+
+    def get(self) -> dict:
+        """
+        Devuelve el estado cacheado sin bloquear. Sólo la primera llamada
+        (si no se resolvió al arrancar) espera a las sondas, hasta decenas de
+        segundos: desde código async hay que llamarla en un hilo.
+        """
+        with self._lock:
+            state = self._state
+            stale = state is not None and time.time() - state["checked_at"] > self.refresh_interval
+            if stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self.resolve, name="sandbox-discovery", daemon=True).start()
+        if state is None:
+            return self.resolve()
+        return dict(state)
+
+    def invalidate(self) -> None:
+        """Marca la caché como caducada (p.ej. tras un error del daemon)."""
+        with self._lock:
+            if self._state is not None:
+                self._state["checked_at"] = 0.0
+
+    def prewarm(
+        self,
+        mode: str = "build",
+        pull_ref: Optional[str] = None,
+        build_context: str = DEFAULT_BUILD_CONTEXT,
+    ) -> dict:
+        """
+        Deja la imagen de sandbox lista: la construye (`build`) o descarga
+        (`pull`) si no existe, comprueba que pytest se importa sin red y
+        registra su digest. `verify` sólo comprueba; `off` no toca Docker.
+        Devuelve el estado resuelto; `ready` indica si se puede servir.
+        """
+        if mode not in PREWARM_MODES:
+            raise ValueError(f"Unknown prewarm mode: {mode!r}")
+        self.prewarm_status = {"status": "running", "mode": mode, "error": None}
+        if mode == "off":
+            self.prewarm_status["status"] = "disabled"
+            return self.get()
+
+        started = time.monotonic()
+        state = self.resolve()
+        error = state["error"]
+        if state["docker_available"] and not state["custom_image"] and mode != "verify":
+            try:
+                if mode == "build":
+                    self._build(build_context)
+                else:
+                    self._pull(pull_ref or self.preferred_image)
+            except (RuntimeError, OSError, subprocess.TimeoutExpired) as e:
+                error = str(e) or type(e).__name__
+            state = self.resolve()
+
+        if state["ready"]:
+            status = "ready"
+        elif not state["docker_available"]:
+            status = "unavailable"
+        else:
+            status = "failed"
+            error = error or state["error"] or f"Sandbox image {self.preferred_image} not found"
+        self.prewarm_status = {
+            "status": status,
+            "mode": mode,
+            "error": None if status == "ready" else error,
+            "digest": state["image_id"],
+            "pytest_version": state["pytest_version"],
+            "duration": round(time.monotonic() - started, 3),
+        }
+        return state
+
+    def _build(self, build_context: str) -> None:
+        dockerfile = os.path.join(build_context, SANDBOX_DOCKERFILE)
+        if not os.path.exists(dockerfile):
+            raise RuntimeError(f"{dockerfile} not found")
+        build = subprocess.run(
+            ["docker", "build", "-t", self.preferred_image, "-f", dockerfile, build_context],
+            capture_output=True,
+            text=True,
+            timeout=BUILD_TIMEOUT,
+        )
+        if build.returncode != 0:
+            raise RuntimeError(_last_line(build.stderr) or "docker build failed")
+
+    def _pull(self, ref: str) -> None:
+        pull = subprocess.run(
+            ["docker", "pull", ref], capture_output=True, text=True, timeout=BUILD_TIMEOUT
+        )
+        if pull.returncode != 0:
+            raise RuntimeError(_last_line(pull.stderr) or "docker pull failed")
+        if ref != self.preferred_image:
+            tag = subprocess.run(
+                ["docker", "tag", ref, self.preferred_image],
+                capture_output=True,
+                text=True,
+                timeout=30,
+            )
+            if tag.returncode != 0:
+                raise RuntimeError(_last_line(tag.stderr) or "docker tag failed")
+
+    def _verify(self, image_id: str) -> Optional[str]:
+        """Versión de pytest dentro de la imagen (sin red), cacheada por digest."""
+        if image_id not in self._verified:
+            check = subprocess.run(
+                ["docker", "run", "--rm", "--network=none", image_id, "python", "-c",
+                 VERIFY_SCRIPT],
+                capture_output=True,
+                text=True,
+                timeout=VERIFY_TIMEOUT,
+            )
+            if check.returncode != 0:
+                return None
+            self._verified[image_id] = check.stdout.strip() or "unknown"
+        return self._verified[image_id]
+
+    def _probe(self) -> dict:
+        state = {
+            "docker_available": False,
+            "image": None,
+            "image_id": None,
+            "custom_image": False,
+            "pytest_version": None,
+            "ready": False,
+            "checked_at": time.time(),
+            "error": None,
+        }
+        try:
+            # `docker version` falla si el daemon no responde (no sólo el CLI)
+            daemon = subprocess.run(
+                ["docker", "version", "--format", "{{.Server.Version}}"],
+                capture_output=True,
+                text=True,
+                timeout=5,
+            )
+            if daemon.returncode != 0:
+                state["error"] = (daemon.stderr or "Docker daemon not reachable").strip()
+                return state
+            state["docker_available"] = True
+
+            image_check = subprocess.run(
+                ["docker", "image", "inspect", "--format", "{{.Id}}", self.preferred_image],
+                capture_output=True,
+                text=True,
+                timeout=5,
+            )
+            if image_check.returncode != 0:
+                # Sin imagen no hay ejecución en Docker: nada de instalar pytest por request
+                state["error"] = f"Sandbox image {self.preferred_image} not found"
+                return state
+            state["image"] = self.preferred_image
+            state["image_id"] = image_check.stdout.strip() or self.preferred_image
+            state["custom_image"] = True
+            state["pytest_version"] = self._verify(state["image_id"])
+        except (FileNotFoundError, subprocess.TimeoutExpired, OSError) as e:
+            state["error"] = str(e) or type(e).__name__
+            return state
+
+        if state["pytest_version"] is None:
+            state["error"] = f"pytest is not importable in {self.preferred_image}"
+        state["ready"] = state["pytest_version"] is not None
+        return state
+
+
+def _last_line(output: str) -> str:
+    lines = [line for line in (output or "").strip().splitlines() if line.strip()]
+    return lines[-1] if lines else ""
+
+
+_discovery: Optional[SandboxDiscovery] = None
+_discovery_lock = threading.Lock()
+
+
+def get_sandbox_discovery() -> SandboxDiscovery:
+    """Instancia compartida por el proceso."""
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            _discovery = SandboxDiscovery(
+                preferred_image=os.getenv("SANDBOX_IMAGE", SANDBOX_IMAGE),
+                refresh_interval=float(os.getenv("SANDBOX_DISCOVERY_REFRESH", "60")),
+            )
+        return _discovery
+
+
+def prewarm_sandbox_image() -> dict:
+    """Prewarm configurado por entorno (`SANDBOX_PREWARM`, `SANDBOX_IMAGE_PULL`)."""
+    return get_sandbox_discovery().prewarm(
+        mode=os.getenv("SANDBOX_PREWARM", "build"),
+        pull_ref=os.getenv("SANDBOX_IMAGE_PULL") or None,
+        build_context=os.getenv("SANDBOX_BUILD_CONTEXT", DEFAULT_BUILD_CONTEXT),
+    )
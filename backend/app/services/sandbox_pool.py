@@ -0,0 +1,362 @@
+"""
+Pool de contenedores sandbox pre-arrancados (warm pool).
+
+Cada `docker run --rm` paga el arranque en frío del contenedor. El pool
+mantiene N contenedores endurecidos y sin red esperando (PID 1 es un
+proceso mínimo que sólo recoge zombies), entrega uno por ejecución (`docker
+exec` sobre un workdir tmpfs nuevo) y lo recicla o destruye al terminar.
+Reciclar deja el contenedor como recién creado: se matan los procesos que
+el código de usuario dejara vivos y se vacían /workspace, /tmp y /dev/shm;
+si algo falla, el contenedor se destruye. Un hilo en segundo plano rellena
+el pool y elimina los contenedores ociosos que superan el TTL. Al arrancar,
+ese hilo también destruye los contenedores huérfanos de procesos que ya no
+existen (cada contenedor lleva en su etiqueta el host y el PID de su dueño).
+"""
+import io
+import os
+import socket
+import subprocess
+import tarfile
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# Flags de seguridad compartidos por contenedores en frío y del pool
+SANDBOX_SECURITY_FLAGS = [
+    "--memory=256m",           # Límite de memoria (previene DoS)
+    "--cpus=0.5",              # Límite de CPU (previene DoS)
+    "--network=none",          # CRÍTICO: sin conexiones externas
+    "--read-only",             # Sistema de archivos read-only
+    "--cap-drop=ALL",          # Drop todas las capabilities
+    "--security-opt=no-new-privileges",  # Previene privilege escalation
+    "--pids-limit=64",         # Limita procesos (previene fork bomb)
+]
+
+POOL_LABEL = "ai-test-generator.pool"
+DEFAULT_POOL_IMAGE = "ai-test-generator-sandbox:latest"
+WORKSPACE_DIR = "/workspace"
+
+# PID 1 de los contenedores del pool: recoge los huérfanos que mata el
+# reciclado (con `sleep infinity` quedarían zombies y agotarían --pids-limit)
+REAPER_SCRIPT = (
+    "import os, time\n"
+    "while True:\n"
+    "    try:\n"
+    "        os.wait()\n"
+    "    except ChildProcessError:\n"
+    "        time.sleep(1)\n"
+)
+# Reciclado, como el usuario del sandbox: SIGKILL a todos sus procesos salvo
+# PID 1, este shell y el worker persistente ($KEEP_PID), y vaciado de tmpfs
+RECYCLE_SCRIPT = (
+    "for proc in /proc/[0-9]*; do pid=${proc#/proc/}; "
+    'case " 1 $$ $KEEP_PID " in *" $pid "*) ;; *) kill -9 "$pid" 2>/dev/null ;; esac; '
+    "done; "
+    f"find {WORKSPACE_DIR} /tmp /dev/shm -mindepth 1 -delete"
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def build_workspace_archive(files: Dict[str, str]) -> bytes:
+    """Empaqueta `files` (nombre -> contenido) en un tar en memoria, sin tocar disco."""
+    buffer = io.BytesIO()
+    now = time.time()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name in sorted(files):
+            data = files[name].encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = now
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def pool_owner() -> str:
+    """Valor de la etiqueta del pool: host y PID del proceso dueño."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_gone(owner: str) -> bool:
+    host, _, pid = owner.rpartition(":")
+    if not pid.isdigit():
+        return True  # Contenedor de una versión sin dueño en la etiqueta
+    if host != socket.gethostname():
+        return False  # Otro host comparte el daemon: no es nuestro
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class PooledContainer:
+    """Contenedor arrancado y listo para recibir ejecuciones."""
+
+    def __init__(self, container_id: str):
+        self.container_id = container_id
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.worker = None  # Worker persistente de pytest (modo worker)
+
+
+class SandboxPool:
+    """
+    Mantiene `size` contenedores calientes para `image`.
+
+    `acquire()` nunca bloquea: si no hay contenedor libre devuelve None y el
+    llamador usa el camino en frío (`docker run --rm`).
+    """
+
+    def __init__(
+        self,
+        image: str,
+        size: int = 2,
+        max_reuse: int = 20,
+        idle_ttl: float = 300.0,
+        refill_interval: float = 5.0,
+    ):
+        self.image = image
+        self.size = size
+        self.max_reuse = max_reuse
+        self.idle_ttl = idle_ttl
+        self.refill_interval = refill_interval
+        self._idle: Deque[PooledContainer] = deque()
+        self._dirty: List[PooledContainer] = []
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.owner = pool_owner()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and self._thread is not None and not self._stopped.is_set()
+
+    def start(self) -> None:
+        """Arranca el hilo de relleno en segundo plano."""
+        if self.size <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="sandbox-pool-refill", daemon=True
+        )
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        """Detiene el relleno y destruye todos los contenedores del pool."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        with self._lock:
+            containers = list(self._idle) + self._dirty
+            self._idle.clear()
+            self._dirty = []
+        for container in containers:
+            self._destroy(container)
+
+    def acquire(self) -> Optional[PooledContainer]:
+        """Entrega un contenedor caliente o None si el pool está vacío."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            container = self._idle.popleft() if self._idle else None
+            if container is not None:
+                self._in_use += 1
+        # Avisar al hilo de relleno para reponer el hueco
+        self._wakeup.set()
+        return container
+
+    def release(self, container: PooledContainer, healthy: bool = True) -> None:
+        """
+        Devuelve un contenedor al pool tras una ejecución.
+
+        Los contenedores no sanos (timeout, error de docker) o que alcanzaron
+        `max_reuse` se destruyen; el resto se limpia en segundo plano antes
+        de volver a estar disponible.
+        """
+        container.uses += 1
+        container.last_used = time.monotonic()
+        with self._lock:
+            self._in_use -= 1
+            if healthy and container.uses < self.max_reuse and not self._stopped.is_set():
+                self._dirty.append(container)
+                container = None
+        if container is not None:
+            threading.Thread(target=self._destroy, args=(container,), daemon=True).start()
+        self._wakeup.set()
+
+    def exec_command(self, container: PooledContainer, command: str) -> List[str]:
+        """
+        Comando `docker exec` que recibe el workspace como tar por stdin,
+        lo extrae en un directorio tmpfs nuevo y ejecuta `command` dentro.
+        """
+        workdir = f"{WORKSPACE_DIR}/run_{uuid.uuid4().hex}"
+        script = f"mkdir {workdir} && cd {workdir} && tar -xf - && {command}"
+        return [
+            "docker", "exec", "-i",
+            "-e", "PYTHONUNBUFFERED=1",
+            container.container_id,
+            "sh", "-c", script,
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "image": self.image,
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "recycling": len(self._dirty),
+                "enabled": self.enabled,
+            }
+
+    # ------------------------------------------------------------------
+    # Mantenimiento (hilo en segundo plano)
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        try:
+            self.reclaim_orphans()
+        except Exception:
+            pass
+        while not self._stopped.is_set():
+            try:
+                self._recycle_dirty()
+                self._reap_idle()
+                self._fill()
+            except Exception:
+                # El pool nunca debe tumbar el proceso; se reintenta en el siguiente ciclo
+                pass
+            self._wakeup.wait(timeout=self.refill_interval)
+            self._wakeup.clear()
+
+    def reclaim_orphans(self) -> int:
+        """Destruye contenedores del pool cuyo proceso dueño ya no existe."""
+        listing = subprocess.run(
+            ["docker", "ps", "-a", "--filter", f"label={POOL_LABEL}",
+             "--format", f'{{{{.ID}}}} {{{{.Label "{POOL_LABEL}"}}}}'],
+            capture_output=True,
+            text=True,
+            timeout=15,
+        )
+        if listing.returncode != 0:
+            return 0
+        orphans = []
+        for line in listing.stdout.splitlines():
+            container_id, _, owner = line.strip().partition(" ")
+            if container_id and owner != self.owner and _owner_gone(owner):
+                orphans.append(PooledContainer(container_id))
+        for container in orphans:
+            self._destroy(container)
+        return len(orphans)
+
+    def _fill(self) -> None:
+        while not self._stopped.is_set():
+            with self._lock:
+                missing = self.size - len(self._idle) - self._in_use - len(self._dirty)
+            if missing <= 0:
+                return
+            container = self._spawn()
+            if container is None:
+                return
+            with self._lock:
+                self._idle.append(container)
+
+    def _reap_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c in self._idle if now - c.last_used > self.idle_ttl]
+            for container in expired:
+                self._idle.remove(container)
+        for container in expired:
+            self._destroy(container)
+
+    def _recycle_dirty(self) -> None:
+        with self._lock:
+            dirty, self._dirty = self._dirty, []
+        for container in dirty:
+            worker = container.worker
+            keep = worker.pid if worker is not None and worker.alive and worker.pid else ""
+            try:
+                cleanup = subprocess.run(
+                    ["docker", "exec", "-e", f"KEEP_PID={keep}", container.container_id,
+                     "sh", "-c", RECYCLE_SCRIPT],
+                    capture_output=True,
+                    timeout=10,
+                )
+                recycled = cleanup.returncode == 0
+            except (subprocess.SubprocessError, OSError):
+                recycled = False
+            if not recycled:
+                # Un contenedor que no se pudo limpiar no vuelve a servir
+                self._destroy(container)
+                continue
+            with self._lock:
+                self._idle.append(container)
+
+    def _spawn(self) -> Optional[PooledContainer]:
+        docker_cmd = [
+            "docker", "run",
+            "-d", "--rm",
+            *SANDBOX_SECURITY_FLAGS,
+            "--label", f"{POOL_LABEL}={self.owner}",
+            "--tmpfs", f"{WORKSPACE_DIR}:rw,size=64m,mode=1777",
+            "--tmpfs", "/tmp:rw,size=64m,mode=1777",
+            "--workdir", WORKSPACE_DIR,
+            self.image,
+            "python", "-c", REAPER_SCRIPT,
+        ]
+        result = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=30)
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+        return PooledContainer(result.stdout.strip())
+
+    def _destroy(self, container: PooledContainer) -> None:
+        try:
+            subprocess.run(
+                ["docker", "rm", "-f", container.container_id],
+                capture_output=True,
+                timeout=15,
+            )
+        except (subprocess.SubprocessError, OSError):
+            pass
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool(image: Optional[str] = None) -> SandboxPool:
+    """
+    Pool compartido por el proceso, configurado por variables de entorno.
+
+    Sólo hay un pool por proceso: pedirlo con otra imagen distinta de la que
+    ya usa es un error (no se sirve en silencio la imagen equivocada).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(
+                image=image or DEFAULT_POOL_IMAGE,
+                size=_env_int("SANDBOX_POOL_SIZE", 2),
+                max_reuse=_env_int("SANDBOX_POOL_MAX_REUSE", 20),
+                idle_ttl=float(_env_int("SANDBOX_POOL_IDLE_TTL", 300)),
+            )
+        elif image is not None and image != _pool.image:
+            raise ValueError(
+                f"Sandbox pool already uses image {_pool.image!r}, not {image!r}"
+            )
+        return _pool
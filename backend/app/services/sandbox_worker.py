@@ -0,0 +1,108 @@
+"""
+Cliente del worker persistente de pytest (`scripts/pytest_worker.py`).
+
+En modo worker (`SANDBOX_WORKER_MODE=1`) cada contenedor del pool ejecuta
+un proceso `pytest_worker.py` de larga vida, arrancado con `docker exec -i`.
+El worker ya tiene pytest y sus plugins importados; cada ejecución viaja
+como una línea JSON por stdin y corre en un hijo recién forkeado dentro del
+mismo contenedor, así que se mantienen los mismos límites de recursos y el
+aislamiento de red sin pagar el arranque del intérprete.
+"""
+import asyncio
+import json
+import uuid
+from typing import Callable, Dict, List, Optional
+
+WORKER_SCRIPT = "/opt/sandbox/pytest_worker.py"
+WORKER_STARTUP_TIMEOUT = 10.0
+# La respuesta final incluye la salida completa y el reporte JUnit en una línea
+STREAM_LIMIT = 8 * 1024 * 1024
+
+
+class WorkerUnavailable(Exception):
+    """El worker no arrancó (p.ej. imagen sin `pytest_worker.py`)."""
+
+
+def worker_command(container_id: str) -> List[str]:
+    return [
+        "docker", "exec", "-i",
+        "-e", "PYTHONUNBUFFERED=1",
+        "-e", "PYTHONDONTWRITEBYTECODE=1",
+        container_id,
+        "python", WORKER_SCRIPT,
+    ]
+
+
+class SandboxWorker:
+    """Proceso worker vivo; atiende una ejecución a la vez."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.pid: Optional[int] = None  # PID dentro del contenedor (lo respeta el reciclado)
+        self.loop = asyncio.get_running_loop()
+
+    @classmethod
+    async def start(cls, cmd: List[str], startup_timeout: float = WORKER_STARTUP_TIMEOUT):
+        """Arranca el worker y espera su mensaje `ready` (precarga de pytest)."""
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=STREAM_LIMIT,
+        )
+        worker = cls(process)
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), startup_timeout)
+            message = json.loads(line) if line else {}
+            if not message.get("ready"):
+                raise WorkerUnavailable("pytest worker exited before becoming ready")
+            worker.pid = message.get("pid")
+        except (asyncio.TimeoutError, ValueError) as e:
+            await worker.close()
+            raise WorkerUnavailable(f"pytest worker did not start: {e!r}")
+        except WorkerUnavailable:
+            await worker.close()
+            raise
+        return worker
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def run(
+        self,
+        files: Dict[str, str],
+        targets: List[str],
+        timeout: float,
+        on_line: Optional[Callable[[str], None]] = None,
+    ) -> dict:
+        """
+        Ejecuta pytest sobre `targets` y devuelve el mensaje final del worker
+        (`returncode`, `output`, `report`, `timed_out`). El worker aplica el
+        timeout matando el grupo de procesos del hijo; el llamador debe
+        envolver esta llamada con un margen extra por si el worker se cuelga.
+        """
+        run_id = uuid.uuid4().hex
+        request = {"id": run_id, "files": files, "targets": targets, "timeout": timeout}
+        self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise WorkerUnavailable("pytest worker exited during a run")
+            message = json.loads(line)
+            if message.get("id") != run_id:
+                continue
+            if "line" in message:
+                if on_line is not None:
+                    on_line(message["line"])
+                continue
+            if message.get("error"):
+                raise RuntimeError(message["error"])
+            return message
+
+    async def close(self) -> None:
+        if self.alive:
+            self.process.kill()
+        await self.process.wait()
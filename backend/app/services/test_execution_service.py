@@ -1,52 +1,351 @@
-import subprocess
-import tempfile
-import shutil
+import ast
+import asyncio
+import re
+import threading
+import time
 import os
-import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-def execute_tests_in_sandbox(code: str, tests: str):
+from .cache import SingleFlight, TieredCache, build_cache, stable_hash
+from .metrics import EXECUTIONS, record_cache_lookup, record_stage, stage_timer
+from .pytest_report import (
+    REPORT_MARKER,
+    merge_results,
+    parse_junit_report,
+    pytest_shell_command,
+    split_report,
+    summarize,
+)
+from .sandbox_backend import get_sandbox_discovery, prewarm_sandbox_image
+from .sandbox_pool import (
+    SANDBOX_SECURITY_FLAGS,
+    build_workspace_archive,
+    get_sandbox_pool,
+)
+from .sandbox_worker import SandboxWorker, WorkerUnavailable, worker_command
+from .workspace import local_workspace
+
+SANDBOX_TIMEOUT = 15  # segundos dentro de Docker
+LOCAL_TIMEOUT = 10    # segundos en el fallback local
+
+# Máximo de snippets empaquetados en una misma sesión de pytest
+PACK_MAX_ITEMS = int(os.getenv("SANDBOX_PACK_MAX_ITEMS", "8"))
+
+# Modo worker: un pytest persistente por contenedor del pool (ver sandbox_worker)
+WORKER_MODE = os.getenv("SANDBOX_WORKER_MODE", "0") == "1"
+# Margen sobre SANDBOX_TIMEOUT para que el propio worker reporte el timeout
+WORKER_GRACE = 5.0
+
+# Sharding de suites grandes: CPUs que puede usar una ejecución (cada shard
+# es un sandbox de SHARD_CPUS) y tests mínimos por shard
+SHARD_CPUS = 0.5
+CPU_BUDGET = float(os.getenv("SANDBOX_CPU_BUDGET", str(SHARD_CPUS)))
+SHARD_MIN_TESTS = int(os.getenv("SANDBOX_SHARD_MIN_TESTS", "4"))
+
+_PYTEST_DURATION = re.compile(r" in (\d+(?:\.\d+)?)s")
+
+_OUTCOME_LINE = re.compile(
+    r"^test_generated_(\d+)\.py::\S+ (PASSED|FAILED|ERROR|SKIPPED|XFAIL|XPASS)"
+)
+# Salida de pytest -v: cabeceras de sección ("=== FAILURES ===") y de bloque
+# de traceback ("___ test_x ___")
+_SECTION_LINE = re.compile(r"^={3,} (.+?) ={3,}$")
+_BLOCK_LINE = re.compile(r"^_{3,} .+ _{3,}$")
+_PACKED_MODULE = re.compile(r"\b(?:test_generated|user_code)_(\d+)\b")
+_OUTCOME_WORDS = {
+    "FAILED": "failed", "PASSED": "passed", "SKIPPED": "skipped",
+    "ERROR": "error", "XFAIL": "xfailed", "XPASS": "xpassed",
+}
+
+# Callback de eventos de ejecución: on_event(nombre, datos)
+EventCallback = Optional[Callable[[str, Any], None]]
+
+_execution_cache: Optional[TieredCache] = None
+# Se desactiva el modo worker si la imagen no trae pytest_worker.py
+_worker_unavailable = False
+# Ejecuciones idénticas concurrentes comparten un único sandbox
+_execution_flight = SingleFlight("execution")
+
+
+def _line_relay(on_event: EventCallback) -> Optional[Callable[[str], None]]:
+    """
+    Adapta `on_event` a un callback por línea de salida, o None sin
+    streaming. El reporte JUnit que sigue a `REPORT_MARKER` no se reenvía.
+    """
+    if on_event is None:
+        return None
+    in_report = False
+
+    def relay(line: str) -> None:
+        nonlocal in_report
+        if line.strip() == REPORT_MARKER:
+            in_report = True
+        if not in_report:
+            on_event("output", line)
+
+    return relay
+
+
+def get_execution_cache() -> TieredCache:
+    """Caché de resultados de ejecución, configurada por variables de entorno."""
+    global _execution_cache
+    if _execution_cache is None:
+        _execution_cache = build_cache(
+            max_entries=int(os.getenv("EXECUTION_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("EXECUTION_CACHE_TTL", "600")),
+        )
+    return _execution_cache
+
+
+async def _sandbox_backend() -> dict:
+    """
+    Estado del backend de sandbox. La primera consulta (si el prewarm aún no
+    lo resolvió) lanza sondas de Docker bloqueantes, así que va en un hilo
+    para no bloquear el event loop.
+    """
+    with stage_timer("sandbox_discovery"):
+        return await asyncio.to_thread(get_sandbox_discovery().get)
+
+
+def _sandbox_not_ready(backend: dict) -> dict:
+    prewarm = getattr(get_sandbox_discovery(), "prewarm_status", None) or {}
+    detail = prewarm.get("status", "pending")
+    reason = backend.get("error") or f"prewarm {detail}"
+    return {
+        "output": "",
+        "passed": False,
+        "error": f"Sandbox not ready: {reason}",
+        "sandbox": "docker",
+    }
+
+
+def _sandbox_error(error: Exception) -> dict:
+    return {
+        "output": "",
+        "passed": False,
+        "error": f"Sandbox error: {error!r}",
+        "sandbox": "docker",
+    }
+
+
+def execution_cache_key(code: str, tests: str, backend: Optional[dict] = None) -> str:
+    """
+    Clave del resultado: código, tests, digest de la imagen sandbox y límites
+    de recursos. Si cambia la imagen o los límites, el resultado no se reutiliza.
+    """
+    if backend is None:
+        backend = get_sandbox_discovery().get()
+    if backend.get("ready"):
+        image = backend.get("image_id") or backend.get("image")
+    else:
+        image = "local"
+    limits = " ".join(SANDBOX_SECURITY_FLAGS) + f" timeout={SANDBOX_TIMEOUT}/{LOCAL_TIMEOUT}"
+    return stable_hash(code, tests, str(image), limits)
+
+
+async def _run_process(
+    cmd,
+    timeout: float,
+    input: bytes = None,
+    cwd: str = None,
+    env: Dict[str, str] = None,
+    on_line: Callable[[str], None] = None,
+):
+    """
+    Ejecuta un proceso sin bloquear el event loop.
+
+    Con `on_line`, stderr se une a stdout y cada línea se entrega en cuanto
+    el proceso la produce (para streaming), además de acumularse.
+
+    Returns:
+        Tuple[int, str, str]: (returncode, stdout, stderr)
+
+    Raises:
+        asyncio.TimeoutError: si excede `timeout` (el proceso se mata antes)
+
+    Si la tarea se cancela (cliente desconectado, apagado), el proceso
+    también se mata y se espera antes de propagar la cancelación.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT if on_line else asyncio.subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+    try:
+        if on_line is None:
+            stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout)
+        else:
+            stdout = await asyncio.wait_for(_relay_lines(process, input, on_line), timeout)
+            stderr = b""
+    except BaseException:
+        # Timeout o cancelación: no dejar el proceso vivo ni como zombie
+        if process.returncode is None:
+            process.kill()
+            await asyncio.shield(process.wait())
+        raise
+    return (
+        process.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
+
+
+async def _relay_lines(process, input: Optional[bytes], on_line: Callable[[str], None]):
+    if input is not None:
+        process.stdin.write(input)
+        await process.stdin.drain()
+        process.stdin.close()
+    chunks = []
+    async for raw in process.stdout:
+        chunks.append(raw)
+        on_line(raw.decode("utf-8", errors="replace").rstrip("\n"))
+    await process.wait()
+    return b"".join(chunks)
+
+
+async def _timed_run(sandbox: str, pooled: bool, cmd, **kwargs):
+    """
+    `_run_process` instrumentado: registra la ejecución por tipo de sandbox
+    y separa la duración total en tiempo de pytest (según su propio resumen
+    "in N.NNs") y arranque del contenedor/intérprete.
+    """
+    EXECUTIONS.inc(sandbox=sandbox, pooled=str(pooled).lower())
+    started = time.perf_counter()
+    try:
+        returncode, stdout, stderr = await _run_process(cmd, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        record_stage("sandbox_run", elapsed)
+    durations = _PYTEST_DURATION.findall(stdout.partition(REPORT_MARKER)[0] + stderr)
+    if durations:
+        pytest_seconds = min(float(durations[-1]), elapsed)
+        record_stage("pytest", pytest_seconds)
+        record_stage("container_start", elapsed - pytest_seconds)
+    return returncode, stdout, stderr
+
+
+async def execute_tests_in_sandbox(code: str, tests: str, on_event: EventCallback = None):
     """
     Ejecuta tests en un contenedor Docker aislado.
     Esto proporciona una capa extra de seguridad.
+
+    Las suites grandes se reparten en shards que corren en sandboxes
+    paralelos (ver `plan_shards`); el resultado se fusiona en una sola
+    salida y un único veredicto.
     """
-    temp_dir = tempfile.gettempdir()
-    folder_name = os.path.join(temp_dir, f"test_run_{uuid.uuid4().hex}")
-    os.makedirs(folder_name, exist_ok=True)
+    files = {"user_code.py": code, "test_generated.py": tests}
+    shards = plan_shards(tests)
+    if len(shards) <= 1:
+        return await _execute_workspace(files, ["test_generated.py"], on_event=on_event)
+
+    results = await asyncio.gather(*(
+        _execute_workspace(files, shard, on_event=on_event) for shard in shards
+    ))
+    return _merge_shard_results(results)
 
+
+def _collect_test_units(tests: str) -> List[Tuple[str, int]]:
+    """
+    Unidades de sharding del módulo de tests: funciones `test*` y clases
+    `Test*` de primer nivel, con su peso (número de tests que contienen).
+    """
     try:
-        code_path = os.path.join(folder_name, "user_code.py")
-        test_path = os.path.join(folder_name, "test_generated.py")
+        tree = ast.parse(tests)
+    except SyntaxError:
+        return []
+    functions = (ast.FunctionDef, ast.AsyncFunctionDef)
+    units = []
+    for node in tree.body:
+        if isinstance(node, functions) and node.name.startswith("test"):
+            units.append((node.name, 1))
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            methods = [
+                n for n in node.body if isinstance(n, functions) and n.name.startswith("test")
+            ]
+            if methods:
+                units.append((node.name, len(methods)))
+    return units
 
-        with open(code_path, "w") as f:
-            f.write(code)
 
-        with open(test_path, "w") as f:
-            f.write(tests)
+def plan_shards(tests: str, cpu_budget: Optional[float] = None) -> List[List[str]]:
+    """
+    Reparte los tests en shards de node ids (`test_generated.py::nombre`).
 
-        # Intentar ejecutar en Docker si está disponible
-        try:
-            docker_result = _execute_in_docker(folder_name, test_path)
-            if docker_result is not None:
-                return docker_result
-        except Exception as docker_error:
-            # Si Docker falla, caer a ejecución local
-            pass
+    El número de shards es el menor entre los que permite el presupuesto de
+    CPU (`SANDBOX_CPU_BUDGET` / CPUs por sandbox) y los que salen de agrupar
+    al menos `SANDBOX_SHARD_MIN_TESTS` tests por shard. Con el presupuesto
+    por defecto (un sandbox) no hay sharding.
+    """
+    budget = CPU_BUDGET if cpu_budget is None else cpu_budget
+    units = _collect_test_units(tests)
+    total = sum(weight for _, weight in units)
+    count = min(int(budget / SHARD_CPUS), total // max(SHARD_MIN_TESTS, 1), len(units))
+    if count <= 1:
+        return [["test_generated.py"]]
 
-        # Fallback a ejecución local
-        result = subprocess.run(
-            ["pytest", test_path, "-v", "--tb=short"],
-            cwd=folder_name,
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+    # Reparto greedy: la unidad más pesada va al shard con menos tests
+    shards: List[List[str]] = [[] for _ in range(count)]
+    loads = [0] * count
+    for name, weight in sorted(units, key=lambda unit: -unit[1]):
+        index = loads.index(min(loads))
+        shards[index].append(f"test_generated.py::{name}")
+        loads[index] += weight
+    return shards
+
+
+def _merge_shard_results(results: List[dict]) -> dict:
+    """Una sola salida y un único veredicto a partir de los shards."""
+    sections = [
+        f"===== shard {index}/{len(results)} =====\n{result['output']}"
+        for index, result in enumerate(results, start=1)
+    ]
+    errors = [result["error"] for result in results if result["error"]]
+    return {
+        "output": "\n".join(sections),
+        "passed": not errors and all(result["passed"] for result in results),
+        "error": errors[0] if errors else None,
+        "sandbox": results[0]["sandbox"],
+        "shards": len(results),
+        "test_results": merge_results([result.get("test_results") for result in results]),
+    }
 
-        passed = result.returncode == 0
 
+async def _execute_workspace(
+    files: Dict[str, str], targets: List[str], on_event: EventCallback = None
+):
+    """
+    Ejecuta pytest sobre `targets` (rutas relativas) con `files` como
+    workspace, en Docker o con fallback local.
+
+    En Docker los archivos viajan como tar por stdin a un tmpfs del
+    contenedor, sin escribir nada en el disco del host; el fallback local
+    usa un directorio en RAM (ver `workspace.local_workspace`).
+
+    `on_event(evento, datos)` recibe "container_started" y cada línea de
+    salida de pytest ("output") mientras se produce.
+    """
+    # Intentar ejecutar en Docker si está disponible; sólo sin Docker
+    # (None) se ejecuta en el host
+    try:
+        docker_result = await _execute_in_docker(files, targets, on_event)
+    except Exception as docker_error:
+        return _sandbox_error(docker_error)
+    if docker_result is not None:
+        return docker_result
+
+    try:
+        # Fallback a ejecución local
+        with local_workspace(files) as folder_name:
+            return await _execute_locally(folder_name, targets, on_event)
+
+    except asyncio.TimeoutError:
         return {
-            "output": result.stdout + result.stderr,
-            "passed": passed,
-            "error": None,
+            "output": "",
+            "passed": False,
+            "error": f"Timeout: Ejecución excedió {LOCAL_TIMEOUT} segundos",
             "sandbox": "local"
         }
 
@@ -58,114 +357,495 @@ def execute_tests_in_sandbox(code: str, tests: str):
             "sandbox": "local"
         }
 
-    finally:
-        shutil.rmtree(folder_name, ignore_errors=True)
 
+async def _execute_locally(folder_name: str, targets: List[str], on_event: EventCallback = None):
+    """Ejecuta pytest en el host (sin Docker) sobre un workspace ya escrito."""
+    if on_event:
+        on_event("container_started", {"sandbox": "local", "pooled": False})
+    report_path = os.path.join(folder_name, ".pytest-report.xml")
+    returncode, stdout, stderr = await _timed_run(
+        "local",
+        False,
+        ["pytest", *targets, "-v", "--tb=short", "-p", "no:cacheprovider",
+         f"--junitxml={report_path}"],
+        timeout=LOCAL_TIMEOUT,
+        cwd=folder_name,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        on_line=_line_relay(on_event),
+    )
+
+    report = None
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            report = f.read()
 
-def _execute_in_docker(folder_name: str, test_path: str):
+    return {
+        "output": stdout + stderr,
+        "passed": returncode == 0,
+        "error": None,
+        "sandbox": "local",
+        "test_results": parse_junit_report(report),
+    }
+
+
+async def _execute_in_docker(
+    files: Dict[str, str], targets: List[str], on_event: EventCallback = None
+):
     """
     Ejecuta pytest dentro de un contenedor Docker con límites de recursos.
-    Usa imagen personalizada con pytest pre-instalado para máxima seguridad.
+    Sólo usa la imagen de sandbox verificada por el prewarm (pytest
+    pre-instalado). Si hay Docker pero la imagen aún no está lista devuelve
+    un error "Sandbox not ready": el código de usuario nunca se ejecuta en el
+    host mientras el sandbox se prepara. Los fallos de ejecución (worker,
+    `docker exec`) devuelven también un error de sandbox; sólo sin Docker
+    devuelve None y se usa el fallback local.
     
     Security Features:
     - Memory limit: 256MB (previene DoS por memoria)
     - CPU limit: 0.5 (previene DoS por CPU)
     - Network: NONE (sin acceso a conexiones externas)
-    - Read-only filesystem (código del usuario no puede modificarse)
+    - Read-only filesystem (sólo /tests y /tmp son tmpfs escribibles)
     - Timeout: 15 segundos máximo
+
+    El workspace viaja como tar por stdin y se extrae en el tmpfs /tests.
     
     Returns:
         dict: Resultado de ejecución o None si Docker no está disponible
     """
     
-    # Verificar si Docker está disponible
-    try:
-        subprocess.run(["docker", "--version"], capture_output=True, check=True, timeout=5)
-    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+    # Estado de Docker e imagen resueltos al arrancar (sin sondas por request)
+    discovery = get_sandbox_discovery()
+    backend = await _sandbox_backend()
+    if not backend.get("docker_available"):
         return None
+    if not backend.get("ready"):
+        return _sandbox_not_ready(backend)
     
     try:
-        test_relative = os.path.basename(test_path)
-        
-        # En Docker for Windows, las rutas de Windows funcionan directamente
-        docker_folder = folder_name
+        test_relative = " ".join(targets)
         
-        # Intentar usar imagen personalizada con pytest pre-instalado
-        # Si no existe, fallback a python:3.11-slim sin network
-        docker_image = "ai-test-generator-sandbox:latest"
-        
-        # Verificar si la imagen existe
-        image_check = subprocess.run(
-            ["docker", "inspect", docker_image],
-            capture_output=True,
-            timeout=5
-        )
-        
-        if image_check.returncode != 0:
-            # Imagen personalizada no disponible, usar python:3.11-slim
-            docker_image = "python:3.11-slim"
-            # Instalar pytest en el mismo paso (requiere network temporal)
-            installation_step = "pip install pytest --no-cache-dir -q && "
-        else:
-            # Imagen personalizada disponible, pytest ya está instalado
-            installation_step = ""
+        # Imagen de sandbox con pytest pre-instalado (verificada al arrancar)
+        docker_image = backend["image"]
+        pool = get_sandbox_pool(docker_image)
+        pooled = pool.acquire()
+        if pooled is not None:
+            return await _execute_in_pool(
+                pool, pooled, files, test_relative, on_event
+            )
         
         # Comando Docker con máxima seguridad (Nivel Producción)
         docker_cmd = [
             "docker", "run",
-            "--rm",
-            "--memory=256m",           # Límite de memoria (previene DoS)
-            "--cpus=0.5",              # Límite de CPU (previene DoS)
-            "--network=none",          # CRÍTICO: sin conexiones externas
-            "--read-only",             # Sistema de archivos read-only
-            "--cap-drop=ALL",          # Drop todas las capabilities
-            "--security-opt=no-new-privileges",  # Previene privilege escalation
-            "--pids-limit=64",         # Limita procesos (previene fork bomb)
-            "-v", f"{docker_folder}:/tests:ro",  # Código read-only
+            "--rm", "-i",
+            *SANDBOX_SECURITY_FLAGS,   # Memoria, CPU, sin red, read-only, sin capabilities
+            "--tmpfs", "/tests:rw,size=64m,mode=1777",  # Workspace en RAM
+            "--tmpfs", "/tmp:rw,size=64m,mode=1777",    # Temp storage (writable)
             "--workdir", "/tests",
-            "-v", "/tmp",              # Temp storage (writable)
+            "-e", "PYTHONUNBUFFERED=1",  # Salida línea a línea para streaming
             docker_image,
             "sh", "-c",
-            f"{installation_step}pytest {test_relative} -v --tb=short"
+            f"tar -xf - && {pytest_shell_command(test_relative)}"
         ]
         
-        result = subprocess.run(
+        with stage_timer("workspace_prep"):
+            archive = build_workspace_archive(files)
+        if on_event:
+            on_event("container_started", {"sandbox": "docker", "pooled": False})
+        returncode, stdout, stderr = await _timed_run(
+            "docker",
+            False,
             docker_cmd,
-            capture_output=True,
-            text=True,
-            timeout=15,
-            encoding='utf-8',
-            errors='replace'
+            timeout=SANDBOX_TIMEOUT,
+            input=archive,
+            on_line=_line_relay(on_event),
         )
 
-        passed = result.returncode == 0
-
-        # Limpiar output de pip warnings
-        output = (result.stdout or "") + (result.stderr or "")
-        output = "\n".join([l for l in output.split("\n") 
-                           if "WARNING" not in l or "pytest" in l])
+        passed = returncode == 0
+        stdout, report = split_report(stdout)
 
         return {
-            "output": output,
+            "output": stdout + stderr,
             "passed": passed,
             "error": None,
-            "sandbox": "docker"
+            "sandbox": "docker",
+            "test_results": parse_junit_report(report),
         }
 
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         return {
             "output": "",
             "passed": False,
-            "error": "Timeout: Ejecución excedió 15 segundos",
+            "error": f"Timeout: Ejecución excedió {SANDBOX_TIMEOUT} segundos",
             "sandbox": "docker"
         }
     except Exception as e:
-        # Si algo falla en Docker, retornar None para usar fallback local
+        # Forzar que el estado del daemon se vuelva a comprobar: sólo se cae
+        # al fallback local si Docker ya no está disponible
+        discovery.invalidate()
+        if not (await _sandbox_backend()).get("docker_available"):
+            return None
+        return _sandbox_error(e)
+
+
+async def _execute_in_pool(
+    pool, pooled, files: Dict[str, str], test_relative: str, on_event: EventCallback = None
+):
+    """
+    Ejecuta pytest en un contenedor caliente del pool.
+
+    Los archivos viajan como tar por stdin a un workdir tmpfs nuevo. Si la
+    ejecución excede el timeout o falla, el contenedor se destruye en vez de
+    reciclarse, porque el proceso dentro del contenedor puede seguir vivo.
+    """
+    healthy = False
+    try:
+        if WORKER_MODE and not _worker_unavailable:
+            result = await _execute_with_worker(pooled, files, test_relative, on_event)
+            if result is not None:
+                healthy = True
+                return result
+
+        with stage_timer("workspace_prep"):
+            archive = build_workspace_archive(files)
+        if on_event:
+            on_event("container_started", {"sandbox": "docker", "pooled": True})
+        returncode, stdout, stderr = await _timed_run(
+            "docker",
+            True,
+            pool.exec_command(pooled, pytest_shell_command(test_relative)),
+            timeout=SANDBOX_TIMEOUT,
+            input=archive,
+            on_line=_line_relay(on_event),
+        )
+        healthy = True
+        stdout, report = split_report(stdout)
+
+        return {
+            "output": stdout + stderr,
+            "passed": returncode == 0,
+            "error": None,
+            "sandbox": "docker",
+            "test_results": parse_junit_report(report),
+        }
+    except asyncio.TimeoutError:
+        return {
+            "output": "",
+            "passed": False,
+            "error": f"Timeout: Ejecución excedió {SANDBOX_TIMEOUT} segundos",
+            "sandbox": "docker",
+        }
+    except Exception as e:
+        # Fallo del worker o de `docker exec` (murió a mitad, línea de más de
+        # 8MB, error interno): es un error del sandbox, no motivo para
+        # ejecutar en el host. Con `error` puesto el resultado no se cachea.
+        return _sandbox_error(e)
+    finally:
+        if not healthy:
+            pooled.worker = None  # El worker muere con el contenedor
+        pool.release(pooled, healthy=healthy)
+
+
+async def _execute_with_worker(
+    pooled, files: Dict[str, str], test_relative: str, on_event: EventCallback = None
+) -> Optional[dict]:
+    """
+    Ejecuta pytest a través del worker persistente del contenedor,
+    arrancándolo si hace falta. Devuelve None si el worker no está
+    disponible (se usa `docker exec`). Un timeout reportado por el worker
+    deja el contenedor sano: el worker ya mató el grupo de procesos del hijo.
+    """
+    global _worker_unavailable
+    worker = pooled.worker
+    if worker is None or not worker.alive or worker.loop is not asyncio.get_running_loop():
+        try:
+            worker = await SandboxWorker.start(worker_command(pooled.container_id))
+        except WorkerUnavailable:
+            _worker_unavailable = True
+            return None
+        pooled.worker = worker
+
+    if on_event:
+        on_event("container_started", {"sandbox": "docker", "pooled": True})
+    EXECUTIONS.inc(sandbox="worker", pooled="true")
+    run = worker.run(
+        files, test_relative.split(), SANDBOX_TIMEOUT, on_line=_line_relay(on_event)
+    )
+    started = time.perf_counter()
+    try:
+        message = await asyncio.wait_for(run, SANDBOX_TIMEOUT + WORKER_GRACE)
+    finally:
+        record_stage("sandbox_run", time.perf_counter() - started)
+
+    if message["timed_out"]:
+        return {
+            "output": message["output"],
+            "passed": False,
+            "error": f"Timeout: Ejecución excedió {SANDBOX_TIMEOUT} segundos",
+            "sandbox": "docker",
+        }
+    durations = _PYTEST_DURATION.findall(message["output"])
+    if durations:
+        record_stage("pytest", float(durations[-1]))
+    return {
+        "output": message["output"],
+        "passed": message["returncode"] == 0,
+        "error": None,
+        "sandbox": "docker",
+        "test_results": parse_junit_report(message["report"]),
+    }
+
+
+def start_sandbox_pool():
+    """
+    Prewarm de la imagen de sandbox (build/pull y verificación) y arranque
+    del pool de contenedores calientes si queda lista. Puede tardar minutos
+    la primera vez, así que lo llama `start_sandbox_prewarm` en un hilo.
+    """
+    backend = prewarm_sandbox_image()
+    if not backend["ready"]:
         return None
 
+    pool = get_sandbox_pool(backend["image"])
+    pool.start()
+    return pool
+
 
-def execute_tests(code: str, tests: str):
+def start_sandbox_prewarm() -> threading.Thread:
+    """
+    Lanza `start_sandbox_pool` en segundo plano para no retrasar el arranque
+    de la API; hasta que termine, /health informa el progreso y, si hay
+    Docker, las ejecuciones responden "Sandbox not ready".
+    """
+    thread = threading.Thread(target=start_sandbox_pool, name="sandbox-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_sandbox_pool():
+    """Destruye los contenedores del pool al apagar la aplicación."""
+    get_sandbox_pool().shutdown()
+
+
+async def execute_tests(
+    code: str, tests: str, use_cache: bool = True, on_event: EventCallback = None
+):
     """
     Ejecuta tests con sandboxing. Intenta Docker primero, cae a local si no disponible.
+
+    Los resultados deterministas (sin error de sandbox ni timeout) se
+    memorizan por (código, tests, imagen, límites); `use_cache=False` fuerza
+    una ejecución nueva y refresca la entrada. Las ejecuciones idénticas
+    concurrentes comparten un único sandbox (salvo en streaming, donde cada
+    cliente necesita sus propios eventos).
     """
-    return execute_tests_in_sandbox(code, tests)
+    cache = get_execution_cache()
+    key = execution_cache_key(code, tests, await _sandbox_backend())
+    if use_cache:
+        cached = cache.get(key)
+        record_cache_lookup("execution", cached is not None)
+        if cached is not None:
+            return dict(cached)
+
+    async def run() -> dict:
+        result = await execute_tests_in_sandbox(code, tests, on_event=on_event)
+        if result["error"] is None:
+            cache.set(key, result)
+        return result
+
+    if not use_cache or on_event is not None:
+        return await run()
+    return dict(await _execution_flight.do(key, run))
+
+
+async def execute_tests_batch(
+    pairs: List[Tuple[str, str]],
+    use_cache: bool = True,
+    concurrency: int = 4,
+) -> List[dict]:
+    """
+    Ejecuta varios pares (código, tests) minimizando arranques de sandbox.
+
+    Los pares cuyos tests sólo importan `user_code` de forma reescribible se
+    empaquetan como módulos separados (`user_code_N` / `test_generated_N`)
+    en una sola sesión de pytest. Los que no se pueden empaquetar, o cuyo
+    resultado no aparece en la salida empaquetada (p.ej. un error de
+    colección interrumpe la sesión), se ejecutan individualmente con
+    concurrencia acotada.
+    """
+    results: List[Optional[dict]] = [None] * len(pairs)
+    cache = get_execution_cache()
+    backend = await _sandbox_backend()
+    if use_cache:
+        for index, (code, tests) in enumerate(pairs):
+            cached = cache.get(execution_cache_key(code, tests, backend))
+            if cached is not None:
+                results[index] = dict(cached)
+
+    packable = []
+    for index, (code, tests) in enumerate(pairs):
+        if results[index] is None:
+            packed_tests = _pack_tests(tests, index)
+            if packed_tests is not None:
+                packable.append((index, code, packed_tests))
+
+    chunks = [packable[i:i + PACK_MAX_ITEMS] for i in range(0, len(packable), PACK_MAX_ITEMS)]
+    packed_runs = await asyncio.gather(
+        *(_execute_packed(chunk) for chunk in chunks if len(chunk) > 1)
+    )
+    for packed in packed_runs:
+        for index, result in packed.items():
+            results[index] = result
+            # Mismo resultado que una ejecución individual: se memoriza igual
+            code, tests = pairs[index]
+            cache.set(execution_cache_key(code, tests, backend), dict(result))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_single(index: int):
+        code, tests = pairs[index]
+        async with semaphore:
+            results[index] = await execute_tests(code, tests, use_cache=use_cache)
+
+    await asyncio.gather(*(run_single(i) for i, r in enumerate(results) if r is None))
+    return results
+
+
+def _pack_tests(tests: str, index: int) -> Optional[str]:
+    """
+    Reescribe los imports de `user_code` a `user_code_{index}`. Devuelve None
+    si no es seguro empaquetar (sintaxis inválida, submódulos o referencias
+    a `user_code` en strings, p.ej. `mock.patch("user_code.x")`).
+    """
+    try:
+        tree = ast.parse(tests)
+    except SyntaxError:
+        return None
+
+    module = f"user_code_{index}"
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            if node.module == "user_code":
+                node.module = module
+            elif node.module.startswith("user_code."):
+                return None
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name == "user_code":
+                    alias.asname = alias.asname or "user_code"
+                    alias.name = module
+                elif alias.name.startswith("user_code."):
+                    return None
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            if "user_code" in node.value:
+                return None
+    return ast.unparse(tree)
+
+
+async def _execute_packed(chunk: List[Tuple[int, str, str]]) -> Dict[int, dict]:
+    """Ejecuta un paquete en una sesión de pytest y reparte la salida por snippet."""
+    files = {}
+    targets = []
+    for index, code, packed_tests in chunk:
+        files[f"user_code_{index}.py"] = code
+        files[f"test_generated_{index}.py"] = packed_tests
+        targets.append(f"test_generated_{index}.py")
+
+    result = await _execute_workspace(files, targets)
+    if result["error"]:
+        # Timeout o error de sandbox: se reintenta cada snippet por separado
+        return {}
+
+    outcomes: Dict[int, List[str]] = {}
+    for line in result["output"].splitlines():
+        match = _OUTCOME_LINE.match(line)
+        if match:
+            outcomes.setdefault(int(match.group(1)), []).append(match.group(2))
+
+    outputs = _split_packed_output(result["output"], outcomes)
+    split = {}
+    for index, _, _ in chunk:
+        if index not in outcomes:
+            continue
+        split[index] = {
+            "output": outputs[index],
+            "passed": not any(o in ("FAILED", "ERROR") for o in outcomes[index]),
+            "error": None,
+            "sandbox": result["sandbox"],
+            "test_results": _packed_test_results(result.get("test_results"), index),
+        }
+    return split
+
+
+def _split_packed_output(output: str, outcomes: Dict[int, List[str]]) -> Dict[int, str]:
+    """
+    Reparte la salida de una sesión empaquetada por snippet, como si cada uno
+    se hubiera ejecutado solo: su cabecera, sus líneas de resultado, sus
+    tracebacks (con los `E ...` de las aserciones), su resumen corto y una
+    línea final con sus propios totales. Los nombres empaquetados
+    (`test_generated_N.py`, `user_code_N`) vuelven a los originales.
+    """
+    header: List[str] = []
+    lines: Dict[int, List[str]] = {index: [] for index in outcomes}
+    sections: Dict[int, Dict[str, List[str]]] = {index: {} for index in outcomes}
+    durations = _PYTEST_DURATION.findall(output)
+    section: Optional[str] = None
+    owner: Optional[int] = None
+    pending: List[str] = []  # Cabecera de bloque cuyo dueño aún no se conoce
+    for line in output.splitlines():
+        title = _SECTION_LINE.match(line)
+        if title and title.group(1) == "test session starts":
+            header.append(line)
+            continue
+        if title:
+            section, owner, pending = title.group(1), None, []
+            continue
+        module = _PACKED_MODULE.search(line)
+        if section is None:
+            # Cabecera de la sesión y una línea de resultado por test
+            if module is not None:
+                owner = int(module.group(1))
+                lines.get(owner, []).append(line)
+            elif owner is None and not line.startswith("collect"):
+                header.append(line)
+            continue
+        if _BLOCK_LINE.match(line):
+            owner, pending = None, []
+        if module is not None:
+            owner = int(module.group(1))
+        if owner is None:
+            pending.append(line)
+            continue
+        if owner in sections:
+            sections[owner].setdefault(section, []).extend(pending + [line])
+        pending = []
+
+    while header and not header[-1].strip():
+        header.pop()
+    split = {}
+    for index, own in lines.items():
+        counts: Dict[str, int] = {}
+        for outcome in outcomes[index]:
+            counts[_OUTCOME_WORDS[outcome]] = counts.get(_OUTCOME_WORDS[outcome], 0) + 1
+        parts = [*header, f"collected {len(outcomes[index])} items", "", *own, ""]
+        for title, section_lines in sections[index].items():
+            parts += [f"{'=' * 20} {title} {'=' * 20}", *section_lines]
+        totals = ", ".join(f"{count} {word}" for word, count in sorted(counts.items()))
+        if durations:
+            totals += f" in {durations[-1]}s"
+        parts.append(f"{'=' * 20} {totals} {'=' * 20}")
+        text = "\n".join(parts)
+        text = re.sub(rf"\btest_generated_{index}\.py\b", "test_generated.py", text)
+        split[index] = re.sub(rf"\buser_code_{index}\b", "user_code", text)
+    return split
+
+
+def _packed_test_results(test_results: Optional[dict], index: int) -> Optional[dict]:
+    """Resultados estructurados de un snippet dentro de una sesión empaquetada."""
+    if test_results is None:
+        return None
+    prefix = f"test_generated_{index}.py::"
+    tests = [
+        {**test, "name": "test_generated.py::" + test["name"][len(prefix):]}
+        for test in test_results["tests"] if test["name"].startswith(prefix)
+    ]
+    return summarize(tests, sum(test["duration"] for test in tests))
@@ -1,76 +1,213 @@
 from .llm_service import generate_tests_from_code
-from .test_execution_service import execute_tests
-from .code_validator import validate_code_safety
+from .test_execution_service import execute_tests, execute_tests_batch
+from .code_validator import analyze_code
+from .metrics import collect_timings, record_request, stage_timer
+import asyncio
+import os
 import time
 
-MAX_CODE_LENGTH = 5000
+# Large modules are trimmed and chunked into token-budgeted prompts (prompt_builder)
+MAX_CODE_LENGTH = int(os.getenv("MAX_CODE_LENGTH", "50000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
 
-def process_code(code: str):
+
+def _error_response(
+    start_time: float, error: str, error_type: str, status: str = "validation_error"
+):
+    return {
+        "status": status,
+        "generated_tests": "",
+        "execution_output": "",
+        "passed": False,
+        "execution_time": round(time.time() - start_time, 2),
+        "error": error,
+        "error_type": error_type
+    }
+
+
+def _validate(code: str, start_time: float):
+    """
+    Valida tamaño y seguridad parseando el código una sola vez.
+
+    Returns:
+        Tuple[Optional[dict], Optional[CodeAnalysis]]: (respuesta de error o
+        None, análisis reutilizable por la generación)
+    """
+    # Validar tamaño
+    if len(code) > MAX_CODE_LENGTH:
+        return _error_response(
+            start_time,
+            f"Código muy grande. Máximo: {MAX_CODE_LENGTH} caracteres, tienes: {len(code)}",
+            "CodeInvalid",
+        ), None
+
+    # Validar seguridad
+    with stage_timer("validation"):
+        analysis = analyze_code(code)
+    if not analysis.is_safe:
+        return _error_response(start_time, analysis.message, "SecurityViolation"), analysis
+    return None, analysis
+
+
+def _build_response(tests: str, execution_result: dict, start_time: float):
+    # Determinar status basado en resultado
+    if execution_result["error"]:
+        if "Timeout" in execution_result["error"]:
+            status = "timeout"
+            error_type = "Timeout"
+        else:
+            status = "execution_error"
+            error_type = "DockerError"
+    elif execution_result["passed"]:
+        status = "success"
+        error_type = None
+    else:
+        status = "failed"
+        error_type = "TestFailure"
+
+    return {
+        "status": status,
+        "generated_tests": tests,
+        "execution_output": execution_result["output"],
+        "passed": execution_result["passed"],
+        "execution_time": round(time.time() - start_time, 2),
+        "error": execution_result["error"],
+        "error_type": error_type,
+        "test_results": execution_result.get("test_results"),
+    }
+
+
+async def process_code(code: str, bypass_cache: bool = False, include_timings: bool = False):
+    """
+    Valida, genera y ejecuta tests. Cada etapa se registra en las métricas;
+    con `include_timings` la respuesta incluye el desglose por etapa.
+    """
+    with collect_timings() as timings:
+        with stage_timer("total"):
+            response = await _process_code(code, bypass_cache)
+    record_request(response)
+    if include_timings:
+        response["timings"] = timings
+    return response
+
+
+async def _process_code(code: str, bypass_cache: bool):
     start_time = time.time()
-    
+
     try:
-        # Validar tamaño
-        if len(code) > MAX_CODE_LENGTH:
-            return {
-                "status": "validation_error",
-                "generated_tests": "",
-                "execution_output": "",
-                "passed": False,
-                "execution_time": round(time.time() - start_time, 2),
-                "error": f"Código muy grande. Máximo: {MAX_CODE_LENGTH} caracteres, tienes: {len(code)}",
-                "error_type": "CodeInvalid"
-            }
-        
-        # Validar seguridad
-        is_safe, message, dangerous_items = validate_code_safety(code)
-        if not is_safe:
-            return {
-                "status": "validation_error",
-                "generated_tests": "",
-                "execution_output": "",
-                "passed": False,
-                "execution_time": round(time.time() - start_time, 2),
-                "error": message,
-                "error_type": "SecurityViolation"
-            }
+        validation_error, analysis = _validate(code, start_time)
+        if validation_error:
+            return validation_error
 
         # Generar tests
-        tests = generate_tests_from_code(code)
-        
+        with stage_timer("generation"):
+            tests = await generate_tests_from_code(code, analysis=analysis)
+
         # Ejecutar tests
-        execution_result = execute_tests(code, tests)
-
-        # Determinar status basado en resultado
-        if execution_result["error"]:
-            if "Timeout" in execution_result["error"]:
-                status = "timeout"
-                error_type = "Timeout"
-            else:
-                status = "execution_error"
-                error_type = "DockerError"
-        elif execution_result["passed"]:
-            status = "success"
-            error_type = None
-        else:
-            status = "failed"
-            error_type = "TestFailure"
-
-        return {
-            "status": status,
-            "generated_tests": tests,
-            "execution_output": execution_result["output"],
-            "passed": execution_result["passed"],
-            "execution_time": round(time.time() - start_time, 2),
-            "error": execution_result["error"],
-            "error_type": error_type
-        }
+        with stage_timer("execution"):
+            execution_result = await execute_tests(code, tests, use_cache=not bypass_cache)
+
+        return _build_response(tests, execution_result, start_time)
     except Exception as e:
-        return {
-            "status": "execution_error",
-            "generated_tests": "",
-            "execution_output": "",
-            "passed": False,
-            "execution_time": round(time.time() - start_time, 2),
-            "error": str(e),
-            "error_type": "Unknown"
+        return _error_response(start_time, str(e), "Unknown", status="execution_error")
+
+
+async def process_code_stream(code: str, bypass_cache: bool = False):
+    """
+    Variante de `process_code` que emite eventos `(nombre, datos)` a medida
+    que avanza: "validated", "tests_generated", "container_started", una
+    "output" por línea de pytest y finalmente "result" con la respuesta.
+    """
+    start_time = time.time()
+
+    try:
+        validation_error, analysis = _validate(code, start_time)
+        if validation_error:
+            record_request(validation_error)
+            yield "result", validation_error
+            return
+        yield "validated", {
+            "code_length": len(code),
+            "functions": analysis.functions,
+            "classes": analysis.classes,
         }
+
+        tests = await generate_tests_from_code(code, analysis=analysis)
+        yield "tests_generated", {"generated_tests": tests}
+
+        events = asyncio.Queue()
+        execution = asyncio.create_task(execute_tests(
+            code,
+            tests,
+            use_cache=not bypass_cache,
+            on_event=lambda name, data: events.put_nowait((name, data)),
+        ))
+        execution.add_done_callback(lambda _: events.put_nowait(None))
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+
+        response = _build_response(tests, execution.result(), start_time)
+    except Exception as e:
+        response = _error_response(start_time, str(e), "Unknown", status="execution_error")
+    record_request(response)
+    yield "result", response
+
+
+async def process_batch(codes, bypass_cache: bool = False):
+    """
+    Genera y ejecuta tests para varios snippets.
+
+    La validación y la generación se reparten con concurrencia acotada
+    (`BATCH_CONCURRENCY`); la ejecución empaqueta los snippets en sesiones
+    de pytest compartidas cuando es seguro.
+    """
+    start_time = time.time()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    responses = [None] * len(codes)
+    generated = {}
+
+    async def prepare(index: int, code: str):
+        item_start = time.time()
+        validation_error, analysis = _validate(code, item_start)
+        if validation_error:
+            responses[index] = validation_error
+            return
+        async with semaphore:
+            try:
+                tests = await generate_tests_from_code(code, analysis=analysis)
+                generated[index] = (tests, item_start)
+            except Exception as e:
+                responses[index] = _error_response(
+                    item_start, str(e), "Unknown", status="execution_error"
+                )
+
+    await asyncio.gather(*(prepare(i, code) for i, code in enumerate(codes)))
+
+    indices = sorted(generated)
+    try:
+        execution_results = await execute_tests_batch(
+            [(codes[i], generated[i][0]) for i in indices],
+            use_cache=not bypass_cache,
+            concurrency=BATCH_CONCURRENCY,
+        )
+        for index, execution_result in zip(indices, execution_results):
+            tests, item_start = generated[index]
+            responses[index] = _build_response(tests, execution_result, item_start)
+    except Exception as e:
+        for index in indices:
+            responses[index] = _error_response(
+                generated[index][1], str(e), "Unknown", status="execution_error"
+            )
+
+    for response in responses:
+        record_request(response)
+
+    return {
+        "results": responses,
+        "total_time": round(time.time() - start_time, 2),
+        "passed_count": sum(1 for r in responses if r["passed"]),
+        "failed_count": sum(1 for r in responses if not r["passed"]),
+    }
@@ -0,0 +1,80 @@
+"""
+Workspaces de ejecución sin E/S de disco en el host.
+
+Las ejecuciones en Docker reciben los archivos como tar por stdin y los
+extraen en un tmpfs dentro del contenedor, así que no necesitan directorio
+en el host. Sólo el fallback local escribe archivos, y lo hace bajo una raíz
+en RAM (`/dev/shm`) cuando existe. Un proceso que muere a mitad de una
+ejecución deja su directorio atrás; `reclaim_orphaned_workspaces` los
+elimina al arrancar.
+"""
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from .metrics import stage_timer
+
+WORKSPACE_PREFIX = "run_"
+# Directorios de versiones anteriores (`tempfile` + bind mount por request)
+LEGACY_PREFIX = "test_run_"
+# Ninguna ejecución local dura tanto: lo que sea más antiguo es huérfano
+ORPHAN_MAX_AGE = 120.0
+
+
+def _default_root() -> str:
+    shm = "/dev/shm"
+    base = shm if os.path.isdir(shm) and os.access(shm, os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, "ai-test-generator")
+
+
+def workspace_root() -> str:
+    return os.getenv("SANDBOX_WORKSPACE_ROOT") or _default_root()
+
+
+@contextmanager
+def local_workspace(files: Dict[str, str]) -> Iterator[str]:
+    """Directorio con `files` escritos, eliminado al salir."""
+    root = workspace_root()
+    os.makedirs(root, exist_ok=True)
+    folder = os.path.join(root, f"{WORKSPACE_PREFIX}{uuid.uuid4().hex}")
+    try:
+        with stage_timer("workspace_prep"):
+            os.mkdir(folder)
+            for name, content in files.items():
+                with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+                    f.write(content)
+        yield folder
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _orphans(root: str, prefix: str, max_age: float) -> List[str]:
+    try:
+        entries = os.scandir(root)
+    except OSError:
+        return []
+    now = time.time()
+    with entries:
+        return [
+            entry.path for entry in entries
+            if entry.name.startswith(prefix)
+            and entry.is_dir(follow_symlinks=False)
+            and now - entry.stat(follow_symlinks=False).st_mtime > max_age
+        ]
+
+
+def reclaim_orphaned_workspaces(max_age: float = ORPHAN_MAX_AGE) -> int:
+    """
+    Elimina workspaces abandonados por procesos anteriores (incluidos los
+    `test_run_*` del directorio temporal). Sólo toca directorios más antiguos
+    que `max_age`, así que es seguro con varios workers compartiendo raíz.
+    """
+    orphans = _orphans(workspace_root(), WORKSPACE_PREFIX, max_age)
+    orphans += _orphans(tempfile.gettempdir(), LEGACY_PREFIX, max_age)
+    for path in orphans:
+        shutil.rmtree(path, ignore_errors=True)
+    return len(orphans)
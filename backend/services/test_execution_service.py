@@ -1,46 +1,243 @@
+"""
+Client for the remote sandbox service (`sandbox-service/main.py`).
+
+All calls share one long-lived, per-event-loop `httpx.AsyncClient`, so
+executions reuse keep-alive connections (and HTTP/2 when `h2` is installed
+and `SANDBOX_HTTP2=1`). `SANDBOX_SERVICE_URLS` lists one or more sandbox
+nodes; each execution goes to the node with the fewest requests in flight.
+Every node has a circuit breaker: after consecutive connection errors or
+5xx responses it fails fast instead of waiting out the timeout, and once
+the cool-down elapses a single `/health` probe decides whether it closes.
+A node at capacity answers 503 with Retry-After; that is not a failure:
+the run goes to another node and the busy one is skipped until then.
+"""
+import asyncio
+import importlib.util
+import itertools
 import os
+import time
+from typing import List, Optional
+
 import httpx
 
 SANDBOX_SERVICE_URL = os.getenv("SANDBOX_SERVICE_URL", "http://localhost:8001")
+SANDBOX_SERVICE_URLS = [
+    url.strip().rstrip("/")
+    for url in os.getenv("SANDBOX_SERVICE_URLS", SANDBOX_SERVICE_URL).split(",")
+    if url.strip()
+]
 
+REMOTE_TIMEOUT = float(os.getenv("SANDBOX_REMOTE_TIMEOUT", "20"))
+REMOTE_POOL_SIZE = int(os.getenv("SANDBOX_REMOTE_POOL_SIZE", "20"))
+REMOTE_KEEPALIVE_SECONDS = float(os.getenv("SANDBOX_REMOTE_KEEPALIVE_SECONDS", "60"))
+REMOTE_HTTP2 = os.getenv("SANDBOX_HTTP2", "0") == "1"
+BREAKER_FAILURES = int(os.getenv("SANDBOX_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("SANDBOX_BREAKER_RESET_SECONDS", "10"))
+HEALTH_TIMEOUT = 2.0
+MAX_BUSY_SECONDS = 30.0
 
-def execute_tests(code: str, tests: str):
-    """Execute tests in remote sandbox service"""
+
+def _error(message: str) -> dict:
+    return {"output": "", "passed": False, "error": message, "sandbox": "error"}
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
     try:
-        # Call remote sandbox service
-        with httpx.Client(timeout=20.0) as client:
-            response = client.post(
-                f"{SANDBOX_SERVICE_URL}/execute",
-                json={"code": code, "tests": tests},
-            )
-            response.raise_for_status()
-            result = response.json()
+        return min(float(response.headers["retry-after"]), MAX_BUSY_SECONDS)
+    except (KeyError, ValueError):
+        return None
 
-        return {
-            "output": result.get("output", ""),
-            "passed": result.get("passed", False),
-            "error": result.get("error"),
-            "sandbox": result.get("sandbox", "remote"),
-        }
 
-    except httpx.TimeoutException:
-        return {
-            "output": "",
-            "passed": False,
-            "error": "Sandbox service timeout (20s exceeded)",
-            "sandbox": "error",
-        }
-    except httpx.RequestError as e:
-        return {
-            "output": "",
-            "passed": False,
-            "error": f"Failed to connect to sandbox service: {str(e)}",
-            "sandbox": "error",
-        }
-    except Exception as e:
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open (one probe) -> closed."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class SandboxNode:
+    """One sandbox service instance with its breaker and in-flight count."""
+
+    def __init__(self, url: str, breaker: Optional[CircuitBreaker] = None):
+        self.url = url
+        self.breaker = breaker or CircuitBreaker()
+        self.outstanding = 0
+        self.busy_until = 0.0  # Set from the Retry-After of a 503 at capacity
+
+    @property
+    def busy(self) -> bool:
+        return time.monotonic() < self.busy_until
+
+    def stats(self) -> dict:
         return {
-            "output": "",
-            "passed": False,
-            "error": f"Unexpected error: {str(e)}",
-            "sandbox": "error",
+            "url": self.url,
+            "state": self.breaker.state,
+            "outstanding": self.outstanding,
+            "failures": self.breaker.failures,
+            "busy": self.busy,
         }
+
+
+class RemoteSandboxClient:
+    """Load-balanced, circuit-broken client over one or more sandbox nodes."""
+
+    def __init__(self, urls: List[str], transport: Optional[httpx.AsyncBaseTransport] = None):
+        if not urls:
+            raise ValueError("At least one sandbox service URL is required")
+        self.nodes = [SandboxNode(url) for url in urls]
+        self.transport = transport
+        self._rotation = itertools.count()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived client created on first use; keeps connections alive between calls."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # httpx connections belong to the loop that opened them
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=REMOTE_POOL_SIZE,
+                    max_keepalive_connections=REMOTE_POOL_SIZE,
+                    keepalive_expiry=REMOTE_KEEPALIVE_SECONDS,
+                ),
+                timeout=REMOTE_TIMEOUT,
+                http2=REMOTE_HTTP2 and importlib.util.find_spec("h2") is not None,
+                transport=self.transport,
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def _probe(self, node: SandboxNode) -> bool:
+        """Half-open check: one `/health` request decides whether the breaker closes."""
+        node.breaker.probing = True
+        try:
+            response = await self.client().get(f"{node.url}/health", timeout=HEALTH_TIMEOUT)
+            healthy = response.status_code == 200 and response.json().get("status") == "healthy"
+        except (httpx.HTTPError, ValueError):
+            healthy = False
+        finally:
+            node.breaker.probing = False
+        if healthy:
+            node.breaker.record_success()
+        else:
+            node.breaker.record_failure()
+        return healthy
+
+    async def _pick(self, exclude: List[SandboxNode]) -> Optional[SandboxNode]:
+        """
+        Closed, non-busy node with the fewest requests in flight, probing
+        recovered ones first.
+        """
+        candidates = [node for node in self.nodes if node not in exclude]
+        for node in candidates:
+            if node.breaker.state == "half_open" and not node.breaker.probing:
+                await self._probe(node)
+        available = [
+            node for node in candidates if node.breaker.state == "closed" and not node.busy
+        ]
+        if not available:
+            return None
+        # Rotate the starting point so ties do not always land on the first node
+        start = next(self._rotation) % len(available)
+        rotated = available[start:] + available[:start]
+        return min(rotated, key=lambda node: node.outstanding)
+
+    async def execute(self, code: str, tests: str) -> dict:
+        """Run the tests on a sandbox node, failing over on connection errors."""
+        tried: List[SandboxNode] = []
+        last_error = "Sandbox service unavailable (circuit open)"
+        while True:
+            node = await self._pick(tried)
+            if node is None:
+                return _error(last_error)
+            tried.append(node)
+            node.outstanding += 1
+            try:
+                response = await self.client().post(
+                    f"{node.url}/execute", json={"code": code, "tests": tests}
+                )
+                busy_for = _retry_after(response) if response.status_code == 503 else None
+                if busy_for is not None:
+                    # At capacity: healthy but full, try a less loaded node
+                    node.busy_until = time.monotonic() + busy_for
+                    last_error = f"Sandbox service busy, retry after {busy_for:g}s"
+                    continue
+                if response.status_code >= 500:
+                    node.breaker.record_failure()
+                    last_error = f"Sandbox service error: HTTP {response.status_code}"
+                    continue
+                response.raise_for_status()
+                result = response.json()
+                node.breaker.record_success()
+            except httpx.TimeoutException:
+                # The run may still be executing: do not replay it on another node
+                node.breaker.record_failure()
+                return _error(f"Sandbox service timeout ({REMOTE_TIMEOUT:g}s exceeded)")
+            except httpx.RequestError as e:
+                node.breaker.record_failure()
+                last_error = f"Failed to connect to sandbox service: {str(e)}"
+                continue
+            except Exception as e:
+                return _error(f"Unexpected error: {str(e)}")
+            finally:
+                node.outstanding -= 1
+
+            return {
+                "output": result.get("output", ""),
+                "passed": result.get("passed", False),
+                "error": result.get("error"),
+                "sandbox": result.get("sandbox", "remote"),
+            }
+
+    def stats(self) -> List[dict]:
+        return [node.stats() for node in self.nodes]
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+
+_remote_sandbox: Optional[RemoteSandboxClient] = None
+
+
+def get_remote_sandbox() -> RemoteSandboxClient:
+    """Process-wide client for `SANDBOX_SERVICE_URLS`."""
+    global _remote_sandbox
+    if _remote_sandbox is None:
+        _remote_sandbox = RemoteSandboxClient(SANDBOX_SERVICE_URLS)
+    return _remote_sandbox
+
+
+async def close_remote_sandbox() -> None:
+    if _remote_sandbox is not None:
+        await _remote_sandbox.close()
+
+
+async def execute_tests(code: str, tests: str):
+    """Execute tests in remote sandbox service"""
+    return await get_remote_sandbox().execute(code, tests)
@@ -0,0 +1,104 @@
+"""
+Deterministic corpus of realistic snippets for the benchmark suite.
+
+Snippets are assembled from function/class templates until they reach the
+target size, so every run benchmarks exactly the same inputs.
+"""
+import random
+
+SIZES = [100, 500, 1000, 2500, 5000]
+
+TEMPLATES = [
+    '''def add_{n}(a: int, b: int) -> int:
+    return a + b
+''',
+    '''def normalize_{n}(text: str) -> str:
+    """Collapse whitespace and lowercase."""
+    return " ".join(text.split()).lower()
+''',
+    '''def moving_average_{n}(values, window=3):
+    if window <= 0:
+        return []
+    result = []
+    for i in range(len(values) - window + 1):
+        chunk = values[i:i + window]
+        result.append(sum(chunk) / window)
+    return result
+''',
+    '''class Account{n}:
+    balance = 0
+
+    def deposit(self, amount):
+        if amount <= 0:
+            raise ValueError("amount must be positive")
+        self.balance += amount
+        return self.balance
+
+    def withdraw(self, amount):
+        if amount > self.balance:
+            raise ValueError("insufficient funds")
+        self.balance -= amount
+        return self.balance
+''',
+    '''def word_frequencies_{n}(text):
+    counts = {{}}
+    for word in text.lower().split():
+        word = word.strip(".,;:!?")
+        if word:
+            counts[word] = counts.get(word, 0) + 1
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+''',
+    '''def fibonacci_{n}(limit):
+    # Iterative to avoid recursion limits
+    a, b = 0, 1
+    sequence = []
+    while a <= limit:
+        sequence.append(a)
+        a, b = b, a + b
+    return sequence
+''',
+]
+
+STUB_LLM_RESPONSE = '''Here are the pytest tests for your code:
+
+```python
+import pytest
+from code import add_0
+
+
+def test_add_positive():
+    assert add_0(1, 2) == 3
+
+
+def test_add_zero():
+    assert add_0(0, 0) == 0
+```
+
+These tests cover the normal use cases of the function.'''
+
+
+def build_snippet(target_size: int, seed: int = 0) -> str:
+    """Concatenate templates until adding another would exceed `target_size`."""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    n = 0
+    while True:
+        part = rng.choice(TEMPLATES).format(n=n)
+        if parts and length + len(part) + 1 > target_size:
+            break
+        parts.append(part)
+        length += len(part) + 1
+        n += 1
+        if length >= target_size:
+            break
+    return "\n".join(parts)
+
+
+def build_corpus(variants: int = 5):
+    """List of (size_label, code) pairs, `variants` snippets per size."""
+    return [
+        (size, build_snippet(size, seed=size * 100 + variant))
+        for size in SIZES
+        for variant in range(variants)
+    ]
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Latency benchmarks for the validation, generation and sandbox stages.
+
+The LLM and the sandbox are replaced by in-process stubs so the numbers
+measure only our own code paths. Results are printed as a table and can be
+written as JSON and compared against a previous run:
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.corpus import STUB_LLM_RESPONSE, build_corpus  # noqa: E402
+
+from app.services import llm_service  # noqa: E402
+from app.services import test_execution_service as tes  # noqa: E402
+from app.services import test_generation_service as tgs  # noqa: E402
+from app.services.cache import build_cache  # noqa: E402
+from app.services.code_validator import validate_code_safety  # noqa: E402
+from app.services.llm_providers import LLMProvider  # noqa: E402
+
+FAKE_PYTEST_OUTPUT = (
+    "test_generated.py::test_add_positive PASSED\n"
+    "test_generated.py::test_add_zero PASSED\n"
+    "2 passed in 0.01s\n"
+)
+
+
+class StubProvider(LLMProvider):
+    """Stands in for the LLM backend; returns a canned markdown-wrapped answer."""
+
+    name = "stub"
+
+    async def complete(self, prompt, temperature=0.2):
+        return STUB_LLM_RESPONSE
+
+
+class FakeDiscovery:
+    """Reports a ready Docker backend without probing anything."""
+
+    def get(self):
+        return {
+            "docker_available": True,
+            "image": "ai-test-generator-sandbox:latest",
+            "image_id": "sha256:benchmark",
+            "custom_image": True,
+            "pytest_version": "benchmark",
+            "ready": True,
+        }
+
+    def invalidate(self):
+        pass
+
+
+def install_stubs(sandbox_latency: float) -> None:
+    """Replace the LLM client and sandbox process with stubs, and disable caches."""
+
+    async def fake_run_process(cmd, timeout, input=None, cwd=None, env=None, on_line=None):
+        if sandbox_latency:
+            await asyncio.sleep(sandbox_latency)
+        return 0, FAKE_PYTEST_OUTPUT, ""
+
+    stub_provider = StubProvider(model="stub")
+    llm_service.get_llm_provider = lambda: stub_provider
+    llm_service.OFFLINE_TRIVIAL = False
+    llm_service._generation_cache = build_cache(max_entries=1, ttl=-1)
+    tes._execution_cache = build_cache(max_entries=1, ttl=-1)
+    tes._run_process = fake_run_process
+    tes.get_sandbox_discovery = lambda: FakeDiscovery()
+
+
+def summarize(samples, elapsed: float) -> dict:
+    ordered = sorted(samples)
+    p95_index = max(0, int(round(0.95 * len(ordered))) - 1)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[p95_index] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "throughput_per_s": round(len(ordered) / elapsed, 1) if elapsed else None,
+    }
+
+
+def bench_sync(func, inputs, repeat: int) -> dict:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            t0 = time.perf_counter()
+            func(item)
+            samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def bench_async(func, inputs, repeat: int) -> dict:
+    async def run():
+        samples = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for item in inputs:
+                t0 = time.perf_counter()
+                await func(item)
+                samples.append(time.perf_counter() - t0)
+        return summarize(samples, time.perf_counter() - started)
+
+    return asyncio.run(run())
+
+
+def run_benchmarks(repeat: int, variants: int, sandbox_latency: float) -> dict:
+    install_stubs(sandbox_latency)
+    corpus = build_corpus(variants)
+    codes = [code for _, code in corpus]
+    tests = llm_service.clean_generated_tests(STUB_LLM_RESPONSE)
+
+    stages = {
+        "validation": bench_sync(validate_code_safety, codes, repeat),
+        "llm_cleanup": bench_sync(
+            llm_service.clean_generated_tests, [STUB_LLM_RESPONSE] * len(codes), repeat
+        ),
+        "generation": bench_async(llm_service.generate_tests_from_code, codes, repeat),
+        "sandbox": bench_async(lambda code: tes.execute_tests(code, tests), codes, repeat),
+        "process_code": bench_async(tgs.process_code, codes, repeat),
+    }
+
+    by_size = {}
+    for size in sorted({size for size, _ in corpus}):
+        sized = [code for s, code in corpus if s == size]
+        by_size[str(size)] = bench_sync(validate_code_safety, sized, repeat)
+    stages["validation_by_size"] = by_size
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "corpus_size": len(corpus),
+            "sandbox_latency_s": sandbox_latency,
+            "timestamp": time.time(),
+        },
+        "stages": stages,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """Return (stage, metric, old, new) tuples whose p95 regressed beyond `threshold`."""
+    regressions = []
+    for stage, stats in current["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old or "p95_ms" not in stats or "p95_ms" not in old:
+            continue
+        if old["p95_ms"] and stats["p95_ms"] > old["p95_ms"] * (1 + threshold):
+            regressions.append((stage, "p95_ms", old["p95_ms"], stats["p95_ms"]))
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    print(f"{'stage':<16}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'ops/s':>12}")
+    for stage, stats in results["stages"].items():
+        if "p50_ms" not in stats:
+            continue
+        print(
+            f"{stage:<16}{stats['count']:>8}{stats['p50_ms']:>12.3f}"
+            f"{stats['p95_ms']:>12.3f}{stats['throughput_per_s']:>12}"
+        )
+    print("\nvalidation by snippet size:")
+    for size, stats in results["stages"]["validation_by_size"].items():
+        print(f"  {size:>5} chars  p50 {stats['p50_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the corpus")
+    parser.add_argument("--variants", type=int, default=5, help="snippets per size")
+    parser.add_argument(
+        "--sandbox-latency", type=float, default=0.0,
+        help="simulated seconds per fake sandbox run",
+    )
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare p95 latencies against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2,
+        help="allowed relative p95 regression before failing",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeat, args.variants, args.sandbox_latency)
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        for stage, metric, old, new in regressions:
+            print(f"REGRESSION {stage} {metric}: {old} -> {new}")
+        if regressions:
+            return 1
+        print("\nNo regressions beyond threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
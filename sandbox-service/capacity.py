@@ -0,0 +1,166 @@
+"""
+Concurrent-run limit for the sandbox service.
+
+Each run starts (or borrows) a container capped by `--memory` and `--cpus`,
+so a node can only host so many at once. The limit comes from
+`SANDBOX_MAX_CONCURRENT` or is derived from the host's CPUs and memory and
+those per-container caps. Runs beyond the limit wait in a bounded queue;
+when the queue is full or the wait times out the request is rejected with
+a Retry-After estimate, so the caller can route it to a less loaded node.
+The wait is capped so that waiting plus a full run still answers before
+the caller's own timeout (`SANDBOX_CLIENT_TIMEOUT`, the backend's
+`SANDBOX_REMOTE_TIMEOUT`); a late answer would count as a node failure.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# Share of host memory sandbox containers may use (the rest is for Docker and the service)
+MEMORY_RESERVE = 0.8
+# Initial guess of a run's duration, refined as runs complete
+DEFAULT_RUN_SECONDS = 2.0
+# Caller timeout per request (matches the backend's SANDBOX_REMOTE_TIMEOUT)
+DEFAULT_CLIENT_TIMEOUT = 20.0
+# Headroom for the workspace transfer and the response itself
+RESPONSE_MARGIN_SECONDS = 1.0
+
+_UNITS = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+class CapacityExceeded(Exception):
+    """No slot became free in time; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Sandbox at capacity, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _flag_value(flags: List[str], name: str) -> Optional[str]:
+    prefix = f"--{name}="
+    return next((flag[len(prefix):] for flag in flags if flag.startswith(prefix)), None)
+
+
+def _parse_memory(value: str) -> int:
+    value = value.strip().lower()
+    if value[-1:] in _UNITS:
+        return int(float(value[:-1]) * _UNITS[value[-1]])
+    return int(value)
+
+
+def host_memory_bytes() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def derive_slots(
+    flags: List[str],
+    cpu_count: Optional[int] = None,
+    memory_bytes: Optional[int] = None,
+) -> int:
+    """Concurrent containers the host fits given the per-container `--cpus`/`--memory`."""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    memory_bytes = memory_bytes or host_memory_bytes()
+    limits = []
+    cpus = _flag_value(flags, "cpus")
+    if cpus:
+        limits.append(cpu_count / float(cpus))
+    memory = _flag_value(flags, "memory")
+    if memory and memory_bytes:
+        limits.append(memory_bytes * MEMORY_RESERVE / _parse_memory(memory))
+    return max(1, int(min(limits))) if limits else cpu_count
+
+
+def max_queue_wait(run_timeout: float, client_timeout: float = DEFAULT_CLIENT_TIMEOUT) -> float:
+    """Longest queue wait that still lets a full run finish before the caller gives up."""
+    return max(0.0, client_timeout - run_timeout - RESPONSE_MARGIN_SECONDS)
+
+
+class CapacityLimiter:
+    """Counting limiter with a bounded FIFO-ish wait and load statistics."""
+
+    def __init__(self, slots: int, queue_size: int, queue_timeout: float):
+        self.slots = slots
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.avg_run_seconds = DEFAULT_RUN_SECONDS
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for a new request."""
+        backlog = self.waiting + 1
+        return max(1, math.ceil(self.avg_run_seconds * backlog / self.slots))
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold a run slot, waiting up to `queue_timeout`; raises CapacityExceeded."""
+        with self._cond:
+            if self.running >= self.slots or self.waiting:
+                if self.waiting >= self.queue_size:
+                    self.rejected += 1
+                    raise CapacityExceeded(self.retry_after())
+                self.waiting += 1
+                try:
+                    acquired = self._cond.wait_for(
+                        lambda: self.running < self.slots, timeout=self.queue_timeout
+                    )
+                finally:
+                    self.waiting -= 1
+                if not acquired:
+                    self.rejected += 1
+                    raise CapacityExceeded(self.retry_after())
+            self.running += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self.running -= 1
+                self.avg_run_seconds = 0.8 * self.avg_run_seconds + 0.2 * elapsed
+                self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "running": self.running,
+                "queued": self.waiting,
+                "free_slots": max(0, self.slots - self.running),
+                "load": round(self.running / self.slots, 3),
+                "queue_size": self.queue_size,
+                "rejected": self.rejected,
+                "avg_run_seconds": round(self.avg_run_seconds, 3),
+            }
+
+
+_limiter: Optional[CapacityLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_capacity_limiter(flags: List[str], run_timeout: float) -> CapacityLimiter:
+    """
+    Process-wide limiter configured by environment variables. The queue wait
+    defaults to, and never exceeds, `max_queue_wait(run_timeout)`.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            slots = int(os.getenv("SANDBOX_MAX_CONCURRENT", "0")) or derive_slots(flags)
+            client_timeout = float(
+                os.getenv("SANDBOX_CLIENT_TIMEOUT", str(DEFAULT_CLIENT_TIMEOUT))
+            )
+            budget = max_queue_wait(run_timeout, client_timeout)
+            _limiter = CapacityLimiter(
+                slots=slots,
+                queue_size=int(os.getenv("SANDBOX_QUEUE_SIZE", str(slots))),
+                queue_timeout=min(float(os.getenv("SANDBOX_QUEUE_TIMEOUT", str(budget))), budget),
+            )
+        return _limiter
@@ -1,13 +1,54 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 import subprocess
 import tempfile
 import os
-import uuid
 import shutil
-
-app = FastAPI(title="AI Test Sandbox Service", version="1.0.0")
+import time
+
+from backend.app.services.sandbox_pool import (
+    SANDBOX_SECURITY_FLAGS,
+    build_workspace_archive,
+    get_sandbox_pool,
+)
+from capacity import CapacityExceeded, get_capacity_limiter
+
+SANDBOX_IMAGE = "ai-test-sandbox:latest"
+RUN_TIMEOUT = 15
+# Per-request directories written by earlier versions of this service
+LEGACY_WORKSPACE_PREFIX = "test_run_"
+ORPHAN_MAX_AGE = 120.0
+
+
+def reclaim_orphaned_workspaces(max_age: float = ORPHAN_MAX_AGE) -> int:
+    """Remove workspace directories left behind by crashed runs"""
+    root = tempfile.gettempdir()
+    now = time.time()
+    removed = 0
+    for entry in os.scandir(root):
+        if (
+            entry.name.startswith(LEGACY_WORKSPACE_PREFIX)
+            and entry.is_dir(follow_symlinks=False)
+            and now - entry.stat(follow_symlinks=False).st_mtime > max_age
+        ):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Keep a warm pool of sandbox containers for the lifetime of the service"""
+    reclaim_orphaned_workspaces()
+    pool = get_sandbox_pool(SANDBOX_IMAGE)
+    pool.start()
+    yield
+    pool.shutdown()
+
+
+app = FastAPI(title="AI Test Sandbox Service", version="1.0.0", lifespan=lifespan)
 
 
 class ExecutionRequest(BaseModel):
@@ -32,67 +73,75 @@ def health_check():
             timeout=5,
         )
         docker_available = result.returncode == 0
-        return {"status": "healthy", "docker_available": docker_available}
+        return {
+            "status": "healthy",
+            "docker_available": docker_available,
+            "capacity": get_capacity_limiter(SANDBOX_SECURITY_FLAGS, RUN_TIMEOUT).stats(),
+        }
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
 
 
 @app.post("/execute", response_model=ExecutionResponse)
 def execute_tests(request: ExecutionRequest):
-    """Execute tests in isolated Docker sandbox"""
-    temp_dir = tempfile.gettempdir()
-    folder_name = os.path.join(temp_dir, f"test_run_{uuid.uuid4().hex}")
-    os.makedirs(folder_name, exist_ok=True)
+    """
+    Execute tests in isolated Docker sandbox.
 
+    At most `slots` runs execute at once; excess requests wait in a bounded
+    queue and get a 503 with Retry-After when it is full or the wait times out.
+    """
+    limiter = get_capacity_limiter(SANDBOX_SECURITY_FLAGS, RUN_TIMEOUT)
     try:
-        code_path = os.path.join(folder_name, "user_code.py")
-        test_path = os.path.join(folder_name, "test_generated.py")
+        with limiter.slot():
+            return _run_tests(request)
+    except CapacityExceeded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
-        with open(code_path, "w", encoding="utf-8") as f:
-            f.write(request.code)
 
-        with open(test_path, "w", encoding="utf-8") as f:
-            f.write(request.tests)
+def _run_tests(request: ExecutionRequest) -> ExecutionResponse:
+    """
+    The files never touch the host disk: they are streamed as a tar over
+    stdin and extracted into a tmpfs inside the container.
+    """
+    try:
+        archive = build_workspace_archive(
+            {"user_code.py": request.code, "test_generated.py": request.tests}
+        )
+
+        pool = get_sandbox_pool(SANDBOX_IMAGE)
+        pooled = pool.acquire()
+        if pooled is not None:
+            return _execute_in_pool(pool, pooled, archive)
 
         # Docker command with security constraints
         docker_cmd = [
             "docker", "run",
-            "--rm",
-            "--memory=256m",
-            "--cpus=0.5",
-            "--network=none",
-            "--read-only",
-            "-v", f"{folder_name}:/tests:ro",
-            "-v", "/tmp",
-            "--cap-drop=ALL",
-            "--security-opt=no-new-privileges",
-            "--pids-limit=64",
+            "--rm", "-i",
+            *SANDBOX_SECURITY_FLAGS,
+            "--tmpfs", "/tests:rw,size=64m,mode=1777",
+            "--tmpfs", "/tmp:rw,size=64m,mode=1777",
             "--workdir", "/tests",
-            "ai-test-sandbox:latest",
+            SANDBOX_IMAGE,
             "sh", "-c",
-            "pytest test_generated.py -v --tb=short",
+            "tar -xf - && pytest test_generated.py -v --tb=short",
         ]
 
         result = subprocess.run(
             docker_cmd,
+            input=archive,
             capture_output=True,
-            text=True,
-            timeout=15,
-            encoding="utf-8",
-            errors="replace",
-        )
-
-        passed = result.returncode == 0
-        output = (result.stdout or "") + (result.stderr or "")
-
-        # Clean pip warnings
-        output = "\n".join(
-            [line for line in output.split("\n") if "WARNING" not in line or "pytest" in line]
+            timeout=RUN_TIMEOUT,
         )
 
+        output = result.stdout.decode("utf-8", errors="replace")
+        output += result.stderr.decode("utf-8", errors="replace")
         return ExecutionResponse(
             output=output,
-            passed=passed,
+            passed=result.returncode == 0,
             error=None,
             sandbox="docker",
         )
@@ -101,13 +150,41 @@ def execute_tests(request: ExecutionRequest):
         return ExecutionResponse(
             output="",
             passed=False,
-            error="Timeout: execution exceeded 15 seconds",
+            error=f"Timeout: execution exceeded {RUN_TIMEOUT} seconds",
             sandbox="docker",
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
+
+
+def _execute_in_pool(pool, pooled, archive: bytes) -> ExecutionResponse:
+    """Run pytest in a warm pooled container; timed-out containers are destroyed"""
+    healthy = False
+    try:
+        result = subprocess.run(
+            pool.exec_command(pooled, "pytest test_generated.py -v --tb=short"),
+            input=archive,
+            capture_output=True,
+            timeout=RUN_TIMEOUT,
+        )
+        healthy = True
+        output = result.stdout.decode("utf-8", errors="replace")
+        output += result.stderr.decode("utf-8", errors="replace")
+        return ExecutionResponse(
+            output=output,
+            passed=result.returncode == 0,
+            error=None,
+            sandbox="docker",
+        )
+    except subprocess.TimeoutExpired:
+        return ExecutionResponse(
+            output="",
+            passed=False,
+            error=f"Timeout: execution exceeded {RUN_TIMEOUT} seconds",
+            sandbox="docker",
+        )
     finally:
-        shutil.rmtree(folder_name, ignore_errors=True)
+        pool.release(pooled, healthy=healthy)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq chat completions API, for offline load tests.
+
+Point the backend at it with GROQ_BASE_URL=http://localhost:8002. Every
+completion returns pytest tests that import each top-level function found in
+the prompt and assert it is callable, after an optional simulated latency.
+Requests with `"stream": true` get the same content as server-sent events.
+
+    python scripts/llm_stub_server.py --port 8002 --latency 0.8
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="LLM Stub Server")
+LATENCY = {"seconds": 0.0}
+
+FUNCTION_DEF = re.compile(r"^def (\w+)\(", re.MULTILINE)
+
+
+def build_tests(prompt: str) -> str:
+    names = [name for name in FUNCTION_DEF.findall(prompt) if not name.startswith("_")]
+    if not names:
+        return "def test_placeholder():\n    assert True\n"
+    lines = [f"from user_code import {', '.join(sorted(set(names)))}", ""]
+    for name in sorted(set(names)):
+        lines += ["", f"def test_{name}_is_callable():", f"    assert callable({name})", ""]
+    return "\n".join(lines)
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    if LATENCY["seconds"]:
+        await asyncio.sleep(LATENCY["seconds"])
+    content = build_tests(prompt)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    if body.get("stream"):
+        return StreamingResponse(
+            stream_completion(completion_id, body.get("model", "stub"), content),
+            media_type="text/event-stream",
+        )
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": (len(prompt) + len(content)) // 4},
+    }
+
+
+async def stream_completion(completion_id: str, model: str, content: str):
+    """One chunk per line, OpenAI/Groq `chat.completion.chunk` format."""
+    pieces = [line + "\n" for line in content.split("\n")]
+    deltas = [{"role": "assistant", "content": ""}] + [{"content": piece} for piece in pieces]
+    for index, delta in enumerate(deltas):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "delta": delta,
+                "finish_reason": "stop" if index == len(deltas) - 1 else None,
+            }],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Groq-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per completion")
+    args = parser.parse_args()
+    LATENCY["seconds"] = args.latency
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Persistent pytest worker for the sandbox image.
+
+Started once per warm container (`docker exec -i <id> python
+/opt/sandbox/pytest_worker.py`), it imports pytest and its default plugins up
+front and then serves runs requested as JSON lines on stdin, so a run no
+longer pays interpreter startup, pytest import and plugin discovery. Each run
+executes in a freshly forked child in its own process group: user code is
+only ever imported in the child, so no state leaks between runs. A run ends
+when the child exits (or times out) and its whole process group is killed
+then, background processes included, while the worker stays alive. Standard library
+and pytest only.
+
+Protocol (one JSON object per line):
+    -> {"id": "...", "files": {"user_code.py": "..."}, "targets": ["test_generated.py"],
+        "timeout": 15}
+    <- {"ready": true, "pid": 7}                        once, after preloading
+    <- {"id": "...", "line": "..."}                     each output line, as produced
+    <- {"id": "...", "done": true, "returncode": 0, "output": "...",
+        "report": "<junit xml>", "timed_out": false}
+"""
+import importlib
+import json
+import os
+import select
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+WORKSPACE = os.environ.get("PYTEST_WORKER_WORKSPACE", "/workspace")
+REPORT_NAME = ".pytest-report.xml"
+DEFAULT_TIMEOUT = 15.0
+# How often a run's exit is checked while its output pipe is quiet
+EXIT_POLL_SECONDS = 0.05
+
+
+def preload():
+    import pytest  # noqa: F401
+    from _pytest.config import default_plugins
+
+    for name in default_plugins:
+        try:
+            importlib.import_module(f"_pytest.{name}")
+        except ImportError:
+            pass
+
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def run_child(workdir, targets, write_fd):
+    """Body of the forked child: run pytest with output on the pipe and exit."""
+    os.setpgid(0, 0)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)  # The protocol stream is not for user code
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd, 2)
+    sys.stdout = sys.stderr = open(1, "w", buffering=1, closefd=False)
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+
+    import pytest
+
+    code = pytest.main([
+        *targets, "-v", "--tb=short", "-p", "no:cacheprovider", f"--junitxml={REPORT_NAME}",
+    ])
+    sys.stdout.flush()
+    os._exit(int(code))
+
+
+def kill_group(pid):
+    """Kill the run's process group, including anything user code left running."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def collect_output(run_id, read_fd, pid, deadline):
+    """
+    Relay the child's output line by line until it exits or the deadline
+    passes, then kill its process group. Background processes started by
+    user code may hold the pipe open, so EOF alone does not end a run.
+    Returns (lines, wait status, timed_out).
+    """
+    lines, pending, status, timed_out = [], b"", None, False
+
+    def relay(chunk):
+        nonlocal pending
+        *complete, pending = (pending + chunk).split(b"\n")
+        for raw in complete:
+            line = raw.decode("utf-8", errors="replace")
+            lines.append(line)
+            send({"id": run_id, "line": line})
+
+    eof = False
+    while status is None and not eof:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], min(remaining, EXIT_POLL_SECONDS))
+        if ready:
+            chunk = os.read(read_fd, 65536)
+            if chunk:
+                relay(chunk)
+            else:
+                eof = True
+        exited, wait_status = os.waitpid(pid, os.WNOHANG)
+        if exited:
+            status = wait_status
+
+    kill_group(pid)
+    # Every writer is gone now: drain what is left in the pipe
+    while not eof:
+        ready, _, _ = select.select([read_fd], [], [], max(0.0, deadline - time.monotonic()))
+        chunk = os.read(read_fd, 65536) if ready else b""
+        if not chunk:
+            break
+        relay(chunk)
+    if pending:
+        line = pending.decode("utf-8", errors="replace")
+        lines.append(line)
+        send({"id": run_id, "line": line})
+    if status is None:
+        _, status = os.waitpid(pid, 0)
+    return lines, status, timed_out
+
+
+def handle(request):
+    """Run one request; returns the final message (sent once the workdir is gone)."""
+    run_id = request.get("id")
+    workdir = tempfile.mkdtemp(prefix="run_", dir=WORKSPACE)
+    try:
+        for name, content in request["files"].items():
+            with open(os.path.join(workdir, os.path.basename(name)), "w") as f:
+                f.write(content)
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                run_child(workdir, request["targets"], write_fd)
+            except BaseException:
+                os.write(write_fd, traceback.format_exc().encode("utf-8", errors="replace"))
+            os._exit(70)
+
+        os.close(write_fd)
+        deadline = time.monotonic() + float(request.get("timeout") or DEFAULT_TIMEOUT)
+        try:
+            lines, status, timed_out = collect_output(run_id, read_fd, pid, deadline)
+        finally:
+            os.close(read_fd)
+
+        report = None
+        report_path = os.path.join(workdir, REPORT_NAME)
+        if not timed_out and os.path.exists(report_path):
+            with open(report_path) as f:
+                report = f.read()
+        return {
+            "id": run_id,
+            "done": True,
+            "returncode": os.waitstatus_to_exitcode(status),
+            "output": "\n".join(lines),
+            "report": report,
+            "timed_out": timed_out,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    preload()
+    os.makedirs(WORKSPACE, exist_ok=True)
+    send({"ready": True, "pid": os.getpid()})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            send({"done": True, "error": "invalid request"})
+            continue
+        try:
+            send(handle(request))
+        except Exception as e:
+            send({"id": request.get("id"), "done": True, "error": str(e)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.services import admission
+from app.services.admission import (
+    AdmissionMiddleware,
+    ConcurrencyGate,
+    InMemoryRateLimitStore,
+    RedisRateLimitStore,
+    build_admission_controller,
+)
+
+
+def _app(gate_release=None):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware)
+
+    @app.post("/api/generate-tests")
+    async def generate():
+        if gate_release is not None:
+            await gate_release()
+        return {"ok": True}
+
+    @app.post("/api/generate-tests/batch")
+    async def batch(request: Request):
+        body = await request.json()
+        if gate_release is not None:
+            await gate_release()
+        return {"items": len(body["items"])}
+
+    @app.post("/api/validate-code")
+    def validate():
+        return {"ok": True}
+
+    @app.get("/health")
+    def health():
+        return {"ok": True}
+
+    return app
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    store = InMemoryRateLimitStore()
+
+    assert store.take("k", rate=1.0, burst=2) == 0
+    assert store.take("k", rate=1.0, burst=2) == 0
+    assert store.take("k", rate=1.0, burst=2) == 1.0
+    now[0] += 1.0
+    assert store.take("k", rate=1.0, burst=2) == 0
+
+
+def test_rate_limit_is_per_client_and_returns_429(monkeypatch):
+    monkeypatch.setenv("ADMISSION_RATE_PER_MINUTE", "60")
+    monkeypatch.setenv("ADMISSION_BURST", "2")
+    monkeypatch.setattr(admission, "_controller", build_admission_controller())
+    client = TestClient(_app())
+
+    codes = [client.post("/api/generate-tests").status_code for _ in range(3)]
+    limited = client.post("/api/generate-tests")
+    other_key = client.post("/api/generate-tests", headers={"X-API-Key": "other"})
+
+    assert codes == [200, 200, 429]
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    assert other_key.status_code == 200
+    # Cheap lane and unmanaged paths have their own budget
+    assert client.post("/api/validate-code").status_code == 200
+    assert client.get("/health").status_code == 200
+
+
+def test_saturated_generate_lane_rejects_with_503_but_not_cheap_lane(monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_CONCURRENT", "1")
+    monkeypatch.setenv("ADMISSION_MAX_WAITING", "0")
+    controller = build_admission_controller()
+    monkeypatch.setattr(admission, "_controller", controller)
+    statuses = []
+
+    async def scenario():
+        import httpx
+
+        entered, release = asyncio.Event(), asyncio.Event()
+
+        async def hold():
+            entered.set()
+            await release.wait()
+
+        transport = httpx.ASGITransport(app=_app(hold))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            first = asyncio.create_task(client.post("/api/generate-tests"))
+            await entered.wait()
+            rejected = await client.post("/api/generate-tests")
+            cheap = await client.post("/api/validate-code")
+            statuses.extend([rejected.status_code, cheap.status_code])
+            assert rejected.headers["retry-after"]
+            release.set()
+            statuses.append((await first).status_code)
+
+    asyncio.run(scenario())
+
+    assert statuses == [503, 200, 200]
+    assert controller.gate.stats()["active"] == 0
+
+
+def test_gate_waits_briefly_for_a_free_slot():
+    gate = ConcurrencyGate(limit=1, max_waiting=1, wait_timeout=1.0)
+
+    async def scenario():
+        assert await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        gate.release()
+        return await waiter
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_batch_is_charged_per_item(monkeypatch):
+    monkeypatch.setenv("ADMISSION_RATE_PER_MINUTE", "60")
+    monkeypatch.setenv("ADMISSION_BURST", "10")
+    monkeypatch.setattr(admission, "_controller", build_admission_controller())
+    client = TestClient(_app())
+
+    def batch(n):
+        return client.post("/api/generate-tests/batch", json={"items": [{"code": "x"}] * n})
+
+    first = batch(6)
+    assert first.status_code == 200 and first.json() == {"items": 6}
+    # 4 tokens left: a batch of 6 or a few single generations exceed them
+    assert batch(6).status_code == 429
+    assert [client.post("/api/generate-tests").status_code for _ in range(5)] == [
+        200, 200, 200, 200, 429,
+    ]
+
+
+def test_oversized_batch_is_clamped_to_the_bucket_size(monkeypatch):
+    monkeypatch.setenv("ADMISSION_BURST", "5")
+    monkeypatch.setattr(admission, "_controller", build_admission_controller())
+    client = TestClient(_app())
+
+    response = client.post("/api/generate-tests/batch", json={"items": [{"code": "x"}] * 50})
+
+    assert response.status_code == 200
+
+
+def test_batch_holds_one_gate_slot_per_concurrent_generation(monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_CONCURRENT", "4")
+    monkeypatch.setenv("ADMISSION_MAX_WAITING", "0")
+    monkeypatch.setenv("BATCH_CONCURRENCY", "3")
+    controller = build_admission_controller()
+    monkeypatch.setattr(admission, "_controller", controller)
+    observed = []
+
+    async def scenario():
+        import httpx
+
+        entered, release = asyncio.Event(), asyncio.Event()
+
+        async def hold():
+            entered.set()
+            await release.wait()
+
+        transport = httpx.ASGITransport(app=_app(hold))
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            first = asyncio.create_task(client.post(
+                "/api/generate-tests/batch", json={"items": [{"code": "x"}] * 10}
+            ))
+            await entered.wait()
+            observed.append(controller.gate.stats()["active"])
+            second = await client.post(
+                "/api/generate-tests/batch", json={"items": [{"code": "x"}] * 2}
+            )
+            observed.append(second.status_code)
+            release.set()
+            observed.append((await first).status_code)
+
+    asyncio.run(scenario())
+
+    assert observed == [3, 503, 200]
+    assert controller.gate.stats()["active"] == 0
+
+
+def test_gate_returns_partial_slots_when_the_wait_times_out():
+    gate = ConcurrencyGate(limit=3, max_waiting=1, wait_timeout=0.05)
+
+    async def scenario():
+        assert await gate.acquire(2)
+        assert await gate.acquire(2) is False
+        # The slot taken before timing out was given back
+        return await gate.acquire(1)
+
+    assert asyncio.run(scenario()) is True
+    assert gate.stats()["active"] == 3
+
+
+def test_redis_store_runs_the_bucket_script():
+    class FakeRedis:
+        def eval(self, script, numkeys, key, *args):
+            self.call = (numkeys, key, args[:3])
+            return b"0.5"
+
+    redis = FakeRedis()
+    wait = RedisRateLimitStore(redis).take("generate:ip:1", rate=1.0, burst=5)
+
+    assert wait == 0.5
+    assert redis.call == (1, "ai-test-generator:rate:generate:ip:1", (1.0, 5, 1.0))
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from app.services.cache import (
+    LRUCache,
+    SingleFlight,
+    SQLiteCache,
+    TieredCache,
+    normalized_code_hash,
+)
+from app.services.metrics import COALESCED
+
+
+def test_normalized_hash_ignores_whitespace_and_comments():
+    original = "def add(a, b):\n    return a + b\n"
+    reformatted = "# helper\ndef add(a,b):\n\n    return a+b  # sum\n"
+
+    assert normalized_code_hash(original) == normalized_code_hash(reformatted)
+    assert normalized_code_hash(original) != normalized_code_hash(original.replace("+", "-"))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_expires_entries_after_ttl():
+    cache = LRUCache(ttl=-1)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+
+
+def test_tiered_cache_promotes_disk_hits_and_counts(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    SQLiteCache(db_path).set("key", {"tests": "def test_ok(): pass"})
+    cache = TieredCache(LRUCache(), SQLiteCache(db_path))
+
+    assert cache.get("key") == {"tests": "def test_ok(): pass"}
+    assert cache.get("missing") is None
+    assert len(cache.memory) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_sqlite_cache_enforces_max_entries(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+        time.sleep(0.01)
+
+    assert len(cache) == 2
+    assert cache.get("a") is None
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "coalesced": 4}
+    assert COALESCED.value(stage="test") == 4
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    flight = SingleFlight("test-errors")
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.do("key", boom), flight.do("key", boom), return_exceptions=True
+        )
+
+    errors = asyncio.run(scenario())
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert flight.stats()["in_flight"] == 0
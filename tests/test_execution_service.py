@@ -1,16 +1,409 @@
+import asyncio
+import os
 import subprocess
+import sys
+import threading
 
+from app.services import sandbox_backend
+from app.services.cache import build_cache
+from app.services.sandbox_backend import SandboxDiscovery
+from app.services import test_execution_service as tes
 from app.services.test_execution_service import _execute_in_docker
 
+WORKSPACE = {
+    "user_code.py": "def add(a, b):\n    return a + b\n",
+    "test_generated.py": (
+        "from user_code import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+    ),
+}
 
-def test_execute_in_docker_returns_none_when_docker_missing(monkeypatch, tmp_path):
+
+def test_execute_in_docker_returns_none_when_docker_missing(monkeypatch):
     def fake_run(*args, **kwargs):
-        if args[0][:2] == ["docker", "--version"]:
+        if args[0][0] == "docker":
             raise FileNotFoundError()
         return subprocess.CompletedProcess(args[0], 0)
 
     monkeypatch.setattr(subprocess, "run", fake_run)
+    monkeypatch.setattr(sandbox_backend, "_discovery", SandboxDiscovery())
 
-    result = _execute_in_docker(str(tmp_path), str(tmp_path / "test_generated.py"))
+    result = asyncio.run(_execute_in_docker(WORKSPACE, ["test_generated.py"]))
 
     assert result is None
+
+
+def test_discovery_caches_probe_results(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout="sha256:abc\n", stderr="")
+
+    monkeypatch.setattr(sandbox_backend.subprocess, "run", fake_run)
+    discovery = SandboxDiscovery(refresh_interval=3600)
+
+    first = discovery.get()
+    second = discovery.get()
+
+    assert len(calls) == 3  # docker version + image inspect + pytest check, once
+    assert calls[2][:4] == ["docker", "run", "--rm", "--network=none"]
+    assert first == second
+    assert first["docker_available"] is True
+    assert first["custom_image"] is True
+    assert first["ready"] is True
+    assert first["image_id"] == "sha256:abc"
+
+    discovery.resolve()
+    assert len(calls) == 5  # The digest was already verified
+
+
+def test_discovery_is_not_ready_without_sandbox_image(monkeypatch):
+    def fake_run(cmd, *args, **kwargs):
+        returncode = 1 if "inspect" in cmd else 0
+        return subprocess.CompletedProcess(cmd, returncode, stdout="", stderr="")
+
+    monkeypatch.setattr(sandbox_backend.subprocess, "run", fake_run)
+
+    state = SandboxDiscovery().resolve()
+
+    assert state["docker_available"] is True
+    assert state["custom_image"] is False
+    assert state["ready"] is False
+    assert state["image"] is None
+
+
+def test_prewarm_builds_missing_image_and_records_digest(monkeypatch, tmp_path):
+    (tmp_path / "Dockerfile.sandbox").write_text("FROM python:3.11-slim\n")
+    built = []
+
+    def fake_run(cmd, *args, **kwargs):
+        if cmd[:2] == ["docker", "build"]:
+            built.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+        if "inspect" in cmd:
+            found = bool(built)
+            return subprocess.CompletedProcess(cmd, 0 if found else 1, stdout="sha256:new\n")
+        if cmd[:2] == ["docker", "run"]:
+            return subprocess.CompletedProcess(cmd, 0, stdout="9.0.2", stderr="")
+        return subprocess.CompletedProcess(cmd, 0, stdout="27.0", stderr="")
+
+    monkeypatch.setattr(sandbox_backend.subprocess, "run", fake_run)
+    discovery = SandboxDiscovery()
+
+    state = discovery.prewarm("build", build_context=str(tmp_path))
+
+    assert len(built) == 1
+    assert built[0][-1] == str(tmp_path)
+    assert state["ready"] is True
+    assert discovery.prewarm_status["status"] == "ready"
+    assert discovery.prewarm_status["digest"] == "sha256:new"
+    assert discovery.prewarm_status["pytest_version"] == "9.0.2"
+
+
+def test_prewarm_fails_when_pytest_is_not_importable(monkeypatch):
+    def fake_run(cmd, *args, **kwargs):
+        returncode = 1 if cmd[:2] == ["docker", "run"] else 0
+        return subprocess.CompletedProcess(cmd, returncode, stdout="sha256:abc", stderr="")
+
+    monkeypatch.setattr(sandbox_backend.subprocess, "run", fake_run)
+    discovery = SandboxDiscovery()
+
+    state = discovery.prewarm("verify")
+
+    assert state["ready"] is False
+    assert discovery.prewarm_status["status"] == "failed"
+    assert "pytest" in discovery.prewarm_status["error"]
+
+
+def test_execute_tests_refuses_to_run_on_host_while_sandbox_is_not_ready(monkeypatch):
+    class Unverified:
+        prewarm_status = {"status": "running", "mode": "build", "error": None}
+
+        def get(self):
+            return {"docker_available": True, "custom_image": False, "ready": False,
+                    "error": None}
+
+    async def no_local_run(*args, **kwargs):
+        raise AssertionError("user code must not run on the host")
+
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: Unverified())
+    monkeypatch.setattr(tes, "_execute_locally", no_local_run)
+
+    assert asyncio.run(_execute_in_docker(WORKSPACE, ["test_generated.py"]))["error"] == (
+        "Sandbox not ready: prewarm running"
+    )
+    result = asyncio.run(tes.execute_tests("def f():\n    return 1", "def test_f(): pass"))
+    assert result["error"].startswith("Sandbox not ready")
+    assert result["passed"] is False
+
+
+def test_first_discovery_probe_runs_off_the_event_loop(monkeypatch):
+    main_thread = threading.get_ident()
+    probed_from = []
+
+    class SlowDiscovery:
+        def get(self):
+            probed_from.append(threading.get_ident())
+            return {"docker_available": False, "ready": False}
+
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: SlowDiscovery())
+
+    asyncio.run(tes._sandbox_backend())
+
+    assert probed_from and probed_from[0] != main_thread
+
+
+def test_execute_tests_falls_back_to_local_pytest(monkeypatch):
+    class NoDocker:
+        def get(self):
+            return {"docker_available": False}
+
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: NoDocker())
+    code = "def add(a, b):\n    return a + b\n"
+    tests = "from user_code import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+
+    result = asyncio.run(tes.execute_tests(code, tests))
+
+    assert result["sandbox"] == "local"
+    assert result["passed"] is True
+    assert "test_add PASSED" in result["output"]
+    assert result["test_results"]["total"] == 1
+    assert result["test_results"]["tests"][0]["name"] == "test_generated.py::test_add"
+    assert result["test_results"]["tests"][0]["outcome"] == "passed"
+
+
+def test_execute_tests_memoizes_deterministic_results(monkeypatch):
+    runs = []
+
+    async def fake_sandbox(code, tests, on_event=None):
+        runs.append((code, tests))
+        return {"output": "1 passed", "passed": True, "error": None, "sandbox": "docker"}
+
+    monkeypatch.setattr(tes, "execute_tests_in_sandbox", fake_sandbox)
+    monkeypatch.setattr(tes, "_execution_cache", build_cache(max_entries=8, ttl=60))
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: _FakeDiscovery())
+
+    first = asyncio.run(tes.execute_tests("code", "tests"))
+    second = asyncio.run(tes.execute_tests("code", "tests"))
+    bypassed = asyncio.run(tes.execute_tests("code", "tests", use_cache=False))
+
+    assert first == second == bypassed
+    assert len(runs) == 2
+
+
+def test_execute_tests_does_not_cache_timeouts(monkeypatch):
+    runs = []
+
+    async def fake_sandbox(code, tests, on_event=None):
+        runs.append(code)
+        return {"output": "", "passed": False, "error": "Timeout: x", "sandbox": "docker"}
+
+    monkeypatch.setattr(tes, "execute_tests_in_sandbox", fake_sandbox)
+    monkeypatch.setattr(tes, "_execution_cache", build_cache(max_entries=8, ttl=60))
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: _FakeDiscovery())
+
+    asyncio.run(tes.execute_tests("code", "tests"))
+    asyncio.run(tes.execute_tests("code", "tests"))
+
+    assert len(runs) == 2
+
+
+class _FakeDiscovery:
+    def get(self):
+        return {"docker_available": True, "image": "sandbox", "image_id": "sha256:abc"}
+
+
+def test_execute_tests_batch_packs_snippets_into_one_session(monkeypatch):
+    class NoDocker:
+        def get(self):
+            return {"docker_available": False}
+
+    sessions = []
+    original = tes._execute_workspace
+
+    async def spy_workspace(files, targets, on_event=None):
+        sessions.append(targets)
+        return await original(files, targets, on_event=on_event)
+
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: NoDocker())
+    monkeypatch.setattr(tes, "_execute_workspace", spy_workspace)
+    monkeypatch.setattr(tes, "_execution_cache", build_cache(max_entries=8, ttl=60))
+    code = "def add(a, b):\n    return a + b\n"
+    pairs = [
+        (code, "from user_code import add\n\ndef test_add():\n    assert add(1, 2) == 3\n"),
+        (code, "import user_code\n\ndef test_add():\n    assert user_code.add(1, 1) == 3\n"),
+        (code, "def test_patch():\n    assert 'user_code.add'\n"),
+    ]
+
+    results = asyncio.run(tes.execute_tests_batch(pairs))
+
+    assert [r["passed"] for r in results] == [True, False, True]
+    assert sessions[0] == ["test_generated_0.py", "test_generated_1.py"]
+    assert len(sessions) == 2
+    failed = results[1]["output"]
+    assert "test_generated.py::test_add FAILED" in failed
+    assert "E   assert 2 == 3" in failed
+    assert "1 failed" in failed.splitlines()[-1]
+    assert "test_generated_" not in failed and "user_code_" not in failed
+    assert "test_generated.py::test_add PASSED" in results[0]["output"]
+    assert "FAILED" not in results[0]["output"]
+
+    # Packed results are memoized like individual runs
+    sessions.clear()
+    assert asyncio.run(tes.execute_tests_batch(pairs[:2])) == results[:2]
+    assert sessions == []
+
+
+def test_concurrent_identical_executions_share_one_sandbox_run(monkeypatch):
+    runs = []
+
+    async def fake_sandbox(code, tests, on_event=None):
+        runs.append(code)
+        await asyncio.sleep(0.05)
+        return {"passed": True, "output": "1 passed", "error": None}
+
+    monkeypatch.setattr(tes, "execute_tests_in_sandbox", fake_sandbox)
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: _FakeDiscovery())
+    monkeypatch.setattr(tes, "_execution_cache", build_cache(max_entries=8, ttl=60))
+
+    async def scenario():
+        return await asyncio.gather(*(
+            tes.execute_tests("def f():\n    return 1", "def test_f(): pass") for _ in range(3)
+        ))
+
+    results = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert all(r["passed"] for r in results)
+    assert results[0] is not results[1]
+
+
+SHARDABLE_TESTS = """from user_code import add
+
+
+def test_a():
+    assert add(1, 1) == 2
+
+
+def test_b():
+    assert add(1, 2) == 3
+
+
+class TestMore:
+    def test_c(self):
+        assert add(0, 0) == 0
+
+    def test_d(self):
+        assert add(2, 2) == 5
+
+
+def test_e():
+    assert add(-1, 1) == 0
+"""
+
+
+def test_plan_shards_respects_cpu_budget_and_min_tests(monkeypatch):
+    monkeypatch.setattr(tes, "SHARD_MIN_TESTS", 2)
+
+    assert tes.plan_shards(SHARDABLE_TESTS, cpu_budget=0.5) == [["test_generated.py"]]
+    shards = tes.plan_shards(SHARDABLE_TESTS, cpu_budget=4)
+
+    assert len(shards) == 2  # 5 tests, at least 2 per shard
+    assert sorted(sum(shards, [])) == [
+        "test_generated.py::TestMore",
+        "test_generated.py::test_a",
+        "test_generated.py::test_b",
+        "test_generated.py::test_e",
+    ]
+    assert "test_generated.py::TestMore" in shards[0]
+
+
+def test_sharded_local_run_merges_results(monkeypatch):
+    class NoDocker:
+        def get(self):
+            return {"docker_available": False}
+
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: NoDocker())
+    monkeypatch.setattr(tes, "CPU_BUDGET", 1.0)
+    monkeypatch.setattr(tes, "SHARD_MIN_TESTS", 2)
+
+    result = asyncio.run(tes.execute_tests_in_sandbox("def add(a, b):\n    return a + b\n",
+                                                      SHARDABLE_TESTS))
+
+    assert result["shards"] == 2
+    assert result["passed"] is False  # test_d fails in one shard
+    assert "shard 2/2" in result["output"]
+    assert "test_a PASSED" in result["output"]
+    assert "TestMore::test_d FAILED" in result["output"]
+    assert result["test_results"]["total"] == 5
+    assert result["test_results"]["failed"] == 1
+
+
+def test_cancelled_run_kills_the_process():
+    pids = []
+
+    async def scenario():
+        script = "import os, time; print(os.getpid(), flush=True); time.sleep(60)"
+        task = asyncio.ensure_future(
+            tes._run_process([sys.executable, "-c", script], timeout=30, on_line=pids.append)
+        )
+        while not pids:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(scenario())
+
+    try:
+        os.kill(int(pids[0]), 0)
+        alive = True
+    except ProcessLookupError:
+        alive = False
+    assert not alive
+
+
+def test_worker_failure_is_a_sandbox_error_not_a_host_run(monkeypatch):
+    from app.services.sandbox_pool import PooledContainer
+
+    class FakePool:
+        released = []
+
+        def acquire(self):
+            return PooledContainer("abc123")
+
+        def release(self, container, healthy=True):
+            self.released.append(healthy)
+
+    class BrokenWorker:
+        alive = True
+
+        async def run(self, *args, **kwargs):
+            raise ValueError("Separator is found, but chunk is longer than limit")
+
+    async def start_worker(cmd):
+        worker = BrokenWorker()
+        worker.loop = asyncio.get_running_loop()
+        return worker
+
+    async def no_host_run(*args, **kwargs):
+        raise AssertionError("user code must not run on the host")
+
+    pool, ready = FakePool(), _FakeDiscovery()
+    ready.get = lambda: {**_FakeDiscovery().get(), "ready": True}
+    ready.invalidate = lambda: None
+    monkeypatch.setattr(tes, "get_sandbox_discovery", lambda: ready)
+    monkeypatch.setattr(tes, "get_sandbox_pool", lambda image=None: pool)
+    monkeypatch.setattr(tes, "WORKER_MODE", True)
+    monkeypatch.setattr(tes, "_worker_unavailable", False)
+    monkeypatch.setattr(tes.SandboxWorker, "start", start_worker)
+    monkeypatch.setattr(tes, "_execute_locally", no_host_run)
+    monkeypatch.setattr(tes, "_execution_cache", build_cache(max_entries=8, ttl=60))
+
+    first = asyncio.run(tes.execute_tests("code", "tests"))
+    asyncio.run(tes.execute_tests("code", "tests"))
+
+    assert first["sandbox"] == "docker"
+    assert first["error"].startswith("Sandbox error")
+    assert pool.released == [False, False]  # Not cached: both calls ran, containers destroyed
@@ -0,0 +1,117 @@
+import ast
+
+from app.services.fragments import ModuleDefinitions, assemble_tests, split_tests
+
+CODE = '''
+import math
+
+FACTOR = 3
+
+
+def area(r):
+    return math.pi * r ** 2
+
+
+def scaled_area(r):
+    return area(r) * FACTOR
+
+
+class Shape:
+    def size(self):
+        return scaled_area(1)
+'''
+
+
+def test_fingerprint_tracks_dependencies_and_context():
+    module = ModuleDefinitions(CODE, ast.parse(CODE))
+    edited_code = CODE.replace("** 2", "* r")
+    edited = ModuleDefinitions(edited_code, ast.parse(edited_code))
+
+    changed = [
+        name for name in module.names
+        if module.fingerprint(module.by_name[name]) != edited.fingerprint(edited.by_name[name])
+    ]
+
+    assert changed == ["area", "scaled_area", "Shape"]
+    assert module.closure(["Shape"]) == {"Shape", "scaled_area", "area"}
+    assert "class Shape" not in module.prompt_source(["area"])
+    assert "FACTOR = 3" in module.prompt_source(["area"])
+
+
+def test_split_and_assemble_round_trip():
+    tests = '''import pytest
+from user_code import area, scaled_area as sa
+
+
+@pytest.fixture
+def radius():
+    return 2
+
+
+def test_area(radius):
+    assert area(radius) > 0
+
+
+def test_scaled(radius):
+    assert sa(radius) > area(radius)
+'''
+    fragments = split_tests(tests, ["area", "scaled_area"])
+
+    assert "test_scaled" not in fragments["area"]
+    assert "def radius" in fragments["area"] and "def radius" in fragments["scaled_area"]
+    assert split_tests("def broken(:", ["area"]) is None
+
+    # A stale fragment for a removed definition does not leak into the import
+    stale = "from user_code import perimeter\n\n\ndef test_area():\n    assert perimeter(1)"
+    assembled = assemble_tests(
+        [fragments["area"], fragments["scaled_area"], stale], ["area", "scaled_area"]
+    )
+
+    tree = ast.parse(assembled)
+    names = [node.name for node in tree.body if isinstance(node, ast.FunctionDef)]
+    assert names == ["radius", "test_area", "test_scaled", "test_area_2"]
+    assert assembled.count("import pytest") == 1
+    assert "from user_code import area\n" in assembled
+    assert "from user_code import scaled_area as sa" in assembled
+    assert "perimeter" not in assembled.splitlines()[0]
+
+
+def test_assemble_keeps_constants_imported_from_user_code():
+    code = "import math\nPI = 3.14\nUNITS: str = 'cm'\n\n\ndef area(r):\n    return PI * r * r\n"
+    module = ModuleDefinitions(code, ast.parse(code))
+    fragment = '''from user_code import area, PI, UNITS
+
+
+def test_area():
+    assert area(1) == PI
+'''
+    # TAU no longer exists in user_code: its stale import is dropped
+    stale = "from user_code import TAU\n\n\ndef test_tau():\n    assert TAU"
+
+    assert module.exports == ["math", "PI", "UNITS", "area"]
+    assembled = assemble_tests([fragment, stale], module.names, module.exports)
+
+    assert assembled.splitlines()[0] == "from user_code import PI, area"
+
+
+def test_split_attributes_module_attribute_access():
+    tests = '''import user_code as code
+import user_code
+
+
+def test_add():
+    assert code.add(1, 2) == 3
+
+
+def test_mul():
+    assert user_code.mul(2, 3) == 6
+'''
+    fragments = split_tests(tests, ["add", "mul"])
+
+    assert "test_add" in fragments["add"] and "test_mul" not in fragments["add"]
+    assert "test_mul" in fragments["mul"] and "test_add" not in fragments["mul"]
+    assert "import user_code as code" in fragments["mul"]
+
+    # A test that uses no target cannot be cached per definition
+    unowned = tests + "\n\ndef test_module_loads():\n    assert user_code\n"
+    assert split_tests(unowned, ["add", "mul"]) is None
@@ -1,48 +1,121 @@
+import asyncio
+
 from app.services import test_generation_service as tgs
 
 
+class _FakeAnalysis:
+    def __init__(self, is_safe, message, dangerous_items):
+        self.is_safe = is_safe
+        self.message = message
+        self.dangerous_items = dangerous_items
+        self.functions = []
+        self.classes = []
+
+
+async def _fake_generate(code, analysis=None):
+    return "def test_ok():\n    assert True"
+
+
+def _fake_execute(result):
+    async def fake_execute(code, tests, use_cache=True):
+        return result
+
+    return fake_execute
+
+
 def test_process_code_rejects_large_input():
     large_code = "a" * (tgs.MAX_CODE_LENGTH + 1)
-    result = tgs.process_code(large_code)
+    result = asyncio.run(tgs.process_code(large_code))
 
     assert result["status"] == "validation_error"
     assert result["error_type"] == "CodeInvalid"
 
 
 def test_process_code_rejects_security_violation(monkeypatch):
-    monkeypatch.setattr(tgs, "validate_code_safety", lambda code: (False, "bad", ["import os"]))
+    unsafe = _FakeAnalysis(False, "bad", ["import os"])
+    monkeypatch.setattr(tgs, "analyze_code", lambda code: unsafe)
 
-    result = tgs.process_code("import os")
+    result = asyncio.run(tgs.process_code("import os"))
 
     assert result["status"] == "validation_error"
     assert result["error_type"] == "SecurityViolation"
 
 
 def test_process_code_timeout(monkeypatch):
-    monkeypatch.setattr(tgs, "validate_code_safety", lambda code: (True, "", []))
-    monkeypatch.setattr(tgs, "generate_tests_from_code", lambda code: "def test_ok():\n    assert True")
-    monkeypatch.setattr(tgs, "execute_tests", lambda code, tests: {
+    monkeypatch.setattr(tgs, "analyze_code", lambda code: _FakeAnalysis(True, "", []))
+    monkeypatch.setattr(tgs, "generate_tests_from_code", _fake_generate)
+    monkeypatch.setattr(tgs, "execute_tests", _fake_execute({
         "output": "",
         "passed": False,
         "error": "Timeout: exceeded",
-    })
+    }))
 
-    result = tgs.process_code("def add(a, b): return a + b")
+    result = asyncio.run(tgs.process_code("def add(a, b): return a + b"))
 
     assert result["status"] == "timeout"
     assert result["error_type"] == "Timeout"
 
 
 def test_process_code_success(monkeypatch):
-    monkeypatch.setattr(tgs, "validate_code_safety", lambda code: (True, "", []))
-    monkeypatch.setattr(tgs, "generate_tests_from_code", lambda code: "def test_ok():\n    assert True")
-    monkeypatch.setattr(tgs, "execute_tests", lambda code, tests: {
+    monkeypatch.setattr(tgs, "analyze_code", lambda code: _FakeAnalysis(True, "", []))
+    monkeypatch.setattr(tgs, "generate_tests_from_code", _fake_generate)
+    monkeypatch.setattr(tgs, "execute_tests", _fake_execute({
         "output": "ok",
         "passed": True,
         "error": None,
-    })
+    }))
 
-    result = tgs.process_code("def add(a, b): return a + b")
+    result = asyncio.run(tgs.process_code("def add(a, b): return a + b"))
 
     assert result["status"] == "success"
     assert result["error_type"] is None
+
+
+def test_process_batch_keeps_per_item_results(monkeypatch):
+    async def fake_batch(pairs, use_cache=True, concurrency=4):
+        return [{"output": "ok", "passed": True, "error": None} for _ in pairs]
+
+    monkeypatch.setattr(tgs, "generate_tests_from_code", _fake_generate)
+    monkeypatch.setattr(tgs, "execute_tests_batch", fake_batch)
+
+    result = asyncio.run(tgs.process_batch(["def add(a, b): return a + b", "import os"]))
+
+    statuses = [r["status"] for r in result["results"]]
+    assert statuses == ["success", "validation_error"]
+    assert result["passed_count"] == 1
+    assert result["failed_count"] == 1
+
+
+def test_process_code_stream_relays_execution_events(monkeypatch):
+    async def fake_execute(code, tests, use_cache=True, on_event=None):
+        on_event("container_started", {"sandbox": "local", "pooled": False})
+        on_event("output", "test_generated.py::test_ok PASSED")
+        return {"output": "test_generated.py::test_ok PASSED", "passed": True, "error": None}
+
+    monkeypatch.setattr(tgs, "generate_tests_from_code", _fake_generate)
+    monkeypatch.setattr(tgs, "execute_tests", fake_execute)
+
+    async def collect():
+        return [event async for event in tgs.process_code_stream("def add(a, b): return a + b")]
+
+    events = asyncio.run(collect())
+
+    assert [name for name, _ in events] == [
+        "validated", "tests_generated", "container_started", "output", "result",
+    ]
+    assert events[-1][1]["status"] == "success"
+
+
+def test_process_code_includes_stage_timings_when_requested(monkeypatch):
+    monkeypatch.setattr(tgs, "generate_tests_from_code", _fake_generate)
+    monkeypatch.setattr(tgs, "execute_tests", _fake_execute({
+        "output": "ok",
+        "passed": True,
+        "error": None,
+    }))
+
+    timed = asyncio.run(tgs.process_code("def add(a, b): return a + b", include_timings=True))
+    untimed = asyncio.run(tgs.process_code("def add(a, b): return a + b"))
+
+    assert {"validation", "generation", "execution", "total"} <= set(timed["timings"])
+    assert "timings" not in untimed
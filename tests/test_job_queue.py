@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.services.job_queue import (
+    InMemoryJobStore,
+    JobQueue,
+    QueueFullError,
+    RedisJobStore,
+)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode("utf-8")
+
+    def get(self, key):
+        return self.data.get(key)
+
+
+async def _ok_processor(code, bypass_cache=False):
+    return {"status": "success", "passed": True, "code": code}
+
+
+async def _wait_for(queue, job_id, status):
+    for _ in range(100):
+        job = queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job never reached {status}")
+
+
+@pytest.mark.parametrize("store_factory", [InMemoryJobStore, lambda: RedisJobStore(FakeRedis())])
+def test_submitted_job_completes_with_result(store_factory):
+    async def scenario():
+        queue = JobQueue(store_factory(), processor=_ok_processor, workers=1)
+        job = queue.submit("def add(a, b): return a + b")
+        assert job["status"] == "queued"
+        done = await _wait_for(queue, job["id"], "completed")
+        await queue.stop()
+        return done
+
+    done = asyncio.run(scenario())
+
+    assert done["result"]["code"] == "def add(a, b): return a + b"
+    assert done["finished_at"] >= done["created_at"]
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def blocked(code, bypass_cache=False):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        queue = JobQueue(InMemoryJobStore(), processor=blocked, workers=1, max_depth=1)
+        queue.submit("a")
+        await asyncio.sleep(0)  # worker picks up the first job
+        queue.submit("b")
+        try:
+            with pytest.raises(QueueFullError):
+                queue.submit("c")
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_job_times_out():
+    async def slow(code, bypass_cache=False):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        queue = JobQueue(InMemoryJobStore(), processor=slow, workers=1, job_timeout=0.05)
+        job = queue.submit("a")
+        done = await _wait_for(queue, job["id"], "timeout")
+        await queue.stop()
+        return done
+
+    done = asyncio.run(scenario())
+
+    assert "exceeded" in done["error"]
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import groq
+import httpx
+import pytest
+
+from app.services import llm_providers
+from app.services.llm_providers import GroqProvider, OpenAICompatibleProvider, build_provider
+
+
+def _api_error(status_code, headers=None):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return groq.APIStatusError("error", response=response, body=None)
+
+
+class _Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_with_retries_backs_off_on_rate_limit_and_server_errors(monkeypatch):
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(llm_providers.asyncio, "sleep", fake_sleep)
+    call = _Flaky([_api_error(429, {"retry-after": "2"}), _api_error(503)])
+
+    assert asyncio.run(llm_providers.with_retries(call)) == "ok"
+    assert call.calls == 3
+    assert delays[0] == 2.0
+    assert 0 < delays[1] <= llm_providers.LLM_RETRY_BASE_DELAY * 2
+
+
+def test_with_retries_does_not_retry_client_errors(monkeypatch):
+    monkeypatch.setattr(llm_providers.asyncio, "sleep", lambda seconds: None)
+    call = _Flaky([_api_error(400)])
+
+    with pytest.raises(groq.APIStatusError):
+        asyncio.run(llm_providers.with_retries(call))
+    assert call.calls == 1
+
+
+def test_groq_client_is_shared_within_a_loop():
+    provider = GroqProvider(model="m", base_url="http://127.0.0.1:8002")
+
+    async def scenario():
+        first = provider.client()
+        second = provider.client()
+        await provider.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert provider._client is None
+
+
+def test_openai_compatible_provider_posts_chat_completion(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(502)
+        content = "def test_ok():\n    assert True"
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(llm_providers.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(
+        llm_providers, "_http_client",
+        lambda **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(handler), **kwargs),
+    )
+    provider = OpenAICompatibleProvider(model="qwen", base_url="http://llm:8080/v1", api_key="k")
+
+    async def scenario():
+        try:
+            return await provider.complete("write tests")
+        finally:
+            await provider.close()
+
+    assert asyncio.run(scenario()).startswith("def test_ok")
+    assert len(requests) == 2
+    assert str(requests[-1].url) == "http://llm:8080/v1/chat/completions"
+    assert requests[-1].headers["authorization"] == "Bearer k"
+    assert json.loads(requests[-1].content)["model"] == "qwen"
+
+
+def test_build_provider_from_name(monkeypatch):
+    monkeypatch.setenv("LLM_MODEL", "")
+    assert build_provider("offline") is None
+    assert build_provider("groq").cache_id == "groq:llama-3.1-8b-instant"
+    assert isinstance(build_provider("OpenAI"), OpenAICompatibleProvider)
+    with pytest.raises(ValueError):
+        build_provider("nope")
+
+
+def test_openai_compatible_provider_streams_server_sent_events(monkeypatch):
+    events = [
+        {"choices": [{"delta": {"role": "assistant", "content": ""}}]},
+        {"choices": [{"delta": {"content": "def test_ok():\n"}}]},
+        {"choices": [{"delta": {"content": "    assert True"}}]},
+    ]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    monkeypatch.setattr(
+        llm_providers, "_http_client",
+        lambda **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(handler), **kwargs),
+    )
+    provider = OpenAICompatibleProvider(model="qwen", base_url="http://llm:8080/v1")
+
+    async def scenario():
+        try:
+            return [chunk async for chunk in provider.stream("write tests")]
+        finally:
+            await provider.close()
+
+    assert asyncio.run(scenario()) == ["def test_ok():\n", "    assert True"]
@@ -0,0 +1,158 @@
+import asyncio
+import re
+
+from app.services import llm_service, prompt_builder
+from app.services.cache import build_cache
+
+
+def test_generate_tests_reuses_cache_for_equivalent_code(monkeypatch):
+    calls = []
+
+    async def fake_llm(code, targets=None):
+        calls.append(code)
+        return "def test_ok():\n    assert True"
+
+    monkeypatch.setattr(llm_service, "_generate_with_llm", fake_llm)
+    monkeypatch.setattr(llm_service, "_generation_cache", build_cache(max_entries=8, ttl=60))
+
+    first = asyncio.run(llm_service.generate_tests_from_code("def add(a, b):\n    return a + b"))
+    second = asyncio.run(
+        llm_service.generate_tests_from_code("def add(a,b):  # retry\n  return a+b")
+    )
+
+    assert first == second
+    assert len(calls) == 1
+    assert llm_service.get_generation_cache().stats()["hits"] == 1
+
+
+
+def test_trivial_snippets_skip_the_llm(monkeypatch):
+    async def fail_llm(code, targets=None):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(llm_service, "_generate_with_llm", fail_llm)
+    monkeypatch.setattr(llm_service, "OFFLINE_TRIVIAL", True)
+
+    tests = asyncio.run(llm_service.generate_tests_from_code(
+        "def add(a: int, b: int) -> int:\n    return a + b"
+    ))
+
+    assert "from user_code import add" in tests
+    assert "assert isinstance(result, int)" in tests
+
+
+def test_concurrent_identical_generations_share_one_llm_call(monkeypatch):
+    calls = []
+
+    async def slow_llm(code, targets=None):
+        calls.append(code)
+        await asyncio.sleep(0.05)
+        return "def test_ok():\n    assert True"
+
+    monkeypatch.setattr(llm_service, "_generate_with_llm", slow_llm)
+    monkeypatch.setattr(llm_service, "_generation_cache", build_cache(max_entries=8, ttl=60))
+
+    async def scenario():
+        return await asyncio.gather(
+            llm_service.generate_tests_from_code("def add(a, b):\n    return a + b"),
+            llm_service.generate_tests_from_code("def add(a, b):  # same\n    return a + b"),
+        )
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_resubmission_only_regenerates_changed_definitions(monkeypatch):
+    prompts = []
+
+    async def fake_llm(code, targets=None):
+        prompts.append((code, targets))
+        names = targets or re.findall(r"^def (\w+)", code, re.MULTILINE)
+        tests = [f"from user_code import {', '.join(names)}"]
+        tests += [f"def test_{name}():\n    assert callable({name})" for name in names]
+        return "\n\n\n".join(tests)
+
+    monkeypatch.setattr(llm_service, "_generate_with_llm", fake_llm)
+    monkeypatch.setattr(llm_service, "_generation_cache", build_cache(max_entries=32, ttl=60))
+    monkeypatch.setattr(llm_service, "OFFLINE_TRIVIAL", False)
+
+    original = (
+        "RATE = 2\n\n\ndef scale(x):\n    return x * RATE\n\n\n"
+        "def total(xs):\n    return sum(scale(x) for x in xs)\n\n\n"
+        "def label(x):\n    return str(x)\n"
+    )
+    edited = original.replace("return str(x)", "return f'#{x}'")
+
+    asyncio.run(llm_service.generate_tests_from_code(original))
+    tests = asyncio.run(llm_service.generate_tests_from_code(edited))
+
+    assert prompts[0][1] is None
+    code, targets = prompts[1]
+    assert targets == ["label"]
+    assert "def scale" not in code and "def label" in code
+    assert tests.startswith("from user_code import scale, total, label")
+    for name in ("scale", "total", "label"):
+        assert f"def test_{name}():" in tests
+
+    # Changing a dependency invalidates the definitions that use it
+    asyncio.run(llm_service.generate_tests_from_code(edited.replace("x * RATE", "RATE * x")))
+    assert prompts[2][1] == ["scale", "total"]
+
+
+def test_large_module_is_generated_in_concurrent_budgeted_chunks(monkeypatch):
+    prompts = []
+    in_flight = {"now": 0, "max": 0}
+
+    async def fake_llm(code, targets=None):
+        prompts.append((code, targets))
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        tests = [f"from user_code import {', '.join(targets)}"]
+        tests += [f"def test_{name}():\n    assert callable({name})" for name in targets]
+        return "\n\n\n".join(tests)
+
+    monkeypatch.setattr(llm_service, "_generate_with_llm", fake_llm)
+    monkeypatch.setattr(llm_service, "_generation_cache", build_cache(max_entries=32, ttl=60))
+    monkeypatch.setattr(llm_service, "OFFLINE_TRIVIAL", False)
+    monkeypatch.setattr(llm_service, "PROMPT_TOKEN_BUDGET", 20)
+    monkeypatch.setattr(prompt_builder, "PROMPT_TOKEN_BUDGET", 20)
+    padding = "    # " + "x" * 60 + "\n"
+    code = "\n\n".join(
+        f"def f{i}(x):\n    \"\"\"Docstring.\"\"\"\n{padding}    return x + {i}\n" for i in range(4)
+    )
+
+    tests = asyncio.run(llm_service.generate_tests_from_code(code))
+
+    assert len(prompts) > 1 and in_flight["max"] > 1
+    assert sorted(name for _, targets in prompts for name in targets) == [f"f{i}" for i in range(4)]
+    for source, _ in prompts:
+        assert "Docstring" not in source and "xxxx" not in source
+    assert tests.startswith("from user_code import f0, f1, f2, f3")
+    assert tests.count("def test_f") == 4
+
+
+def test_module_style_tests_do_not_leave_stale_fragments(monkeypatch):
+    async def fake_llm(code, targets=None):
+        factor = re.search(r"return a \* b \* (\d+)", code)
+        expected = 6 * int(factor.group(1)) if factor else 6
+        return (
+            "import user_code as code\n\n\n"
+            "def test_add():\n    assert code.add(1, 2) == 3\n\n\n"
+            f"def test_mul():\n    assert code.mul(2, 3) == {expected}\n"
+        )
+
+    monkeypatch.setattr(llm_service, "_generate_with_llm", fake_llm)
+    monkeypatch.setattr(llm_service, "_generation_cache", build_cache(max_entries=32, ttl=60))
+    monkeypatch.setattr(llm_service, "OFFLINE_TRIVIAL", False)
+
+    original = "def add(a, b):\n    return a + b\n\n\ndef mul(a, b):\n    return a * b\n"
+    asyncio.run(llm_service.generate_tests_from_code(original))
+    tests = asyncio.run(llm_service.generate_tests_from_code(
+        original.replace("return a * b", "return a * b * 2")
+    ))
+
+    assert "test_mul_2" not in tests
+    assert "== 12" in tests and "== 6" not in tests
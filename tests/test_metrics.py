@@ -0,0 +1,42 @@
+from app.services.metrics import (
+    Counter,
+    Histogram,
+    collect_timings,
+    record_stage,
+    stage_timer,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+
+    text = histogram.render()
+
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{stage="a"} 2' in text
+
+
+def test_counter_tracks_label_sets_separately():
+    counter = Counter("demo_total", "Demo.")
+    counter.inc(status="success")
+    counter.inc(status="success")
+    counter.inc(status="failed")
+
+    assert counter.value(status="success") == 2
+    assert 'demo_total{status="failed"} 1' in counter.render()
+
+
+def test_collect_timings_only_records_inside_the_block():
+    record_stage("outside", 1.0)
+    with collect_timings() as timings:
+        with stage_timer("validation"):
+            pass
+        record_stage("llm_call", 0.25)
+        record_stage("llm_call", 0.25)
+
+    assert set(timings) == {"validation", "llm_call"}
+    assert timings["llm_call"] == 0.5
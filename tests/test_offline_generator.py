@@ -0,0 +1,61 @@
+import subprocess
+import sys
+
+from app.services.code_validator import analyze_code
+from app.services.offline_generator import generate_offline_tests, is_trivial
+
+TYPED = '''
+from typing import List, Optional
+
+
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+def ratio(a: float, b: float) -> float:
+    return a / (a - b)
+
+
+def shout(text: str, times: int = 2) -> str:
+    return text.upper() * times
+
+
+def largest(values: List[int]) -> Optional[int]:
+    return max(values) if values else None
+
+
+def log(message: str) -> None:
+    pass
+'''
+
+
+def test_fully_typed_functions_are_trivial():
+    assert is_trivial(analyze_code(TYPED))
+
+
+def test_untyped_raising_or_class_code_is_not_trivial():
+    assert not is_trivial(analyze_code("def add(a, b):\n    return a + b"))
+    assert not is_trivial(analyze_code(
+        "def pos(a: int) -> int:\n    if a < 0:\n        raise ValueError()\n    return a"
+    ))
+    assert not is_trivial(analyze_code("class A:\n    pass"))
+    assert not is_trivial(analyze_code("x: int = 1"))
+
+
+def test_generated_tests_pass_against_the_code(tmp_path):
+    analysis = analyze_code(TYPED)
+    (tmp_path / "user_code.py").write_text(TYPED)
+    (tmp_path / "test_generated.py").write_text(generate_offline_tests(analysis))
+
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "test_generated.py"],
+        cwd=tmp_path, capture_output=True, text=True, timeout=60,
+    )
+
+    assert result.returncode == 0, result.stdout
+    assert "5 passed" in result.stdout
+
+
+def test_falls_back_to_an_import_test_without_testable_functions():
+    tests = generate_offline_tests(analyze_code("def helper(x):\n    return x"))
+    assert "def test_module_imports" in tests
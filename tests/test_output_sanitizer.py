@@ -0,0 +1,94 @@
+import ast
+
+from app.services.output_sanitizer import StreamingSanitizer, sanitize_tests
+
+RESPONSE = '''Here are the tests for your code:
+
+```python
+import pytest
+from code import add, sub  # functions under test
+import code
+
+
+def test_add():
+    """Adds two numbers.
+
+    The docstring is prose but stays.
+    """
+    assert add(1, 2) == 3
+
+
+def test_sub():
+    values = [
+        1,
+        2,
+    ]
+    assert sub(3, 1) == 2
+```
+
+These tests cover the basic cases. Let me know if
+def test_cut(:
+    assert'''
+
+
+def test_strips_fences_and_prose_and_truncates_to_valid_code():
+    tests = sanitize_tests(RESPONSE)
+
+    tree = ast.parse(tests)
+    assert [node.name for node in tree.body if isinstance(node, ast.FunctionDef)] == [
+        "test_add", "test_sub",
+    ]
+    assert "Here are" not in tests and "```" not in tests and "test_cut" not in tests
+    assert "The docstring is prose but stays." in tests
+
+
+def test_rewrites_code_imports_on_the_ast():
+    tests = sanitize_tests(
+        "from code import add  # keep me\n"
+        "import code\n"
+        "from code.helpers import x\n"
+        "from codecs import decode\n\n"
+        "def test_x():\n"
+        "    assert 'from code import' and code.add(1, 1) == 2\n"
+    )
+
+    lines = tests.split("\n")
+    assert lines[0] == "from user_code import add  # keep me"
+    assert lines[1] == "import user_code as code"
+    assert lines[2] == "from user_code.helpers import x"
+    assert lines[3] == "from codecs import decode"
+    assert "'from code import'" in tests  # String literals are left alone
+
+
+def test_streamed_chunks_match_whole_response_and_emit_statements_early():
+    sanitizer = StreamingSanitizer()
+    emitted = []
+    for i in range(0, len(RESPONSE), 7):
+        emitted += sanitizer.feed(RESPONSE[i:i + 7])
+
+    assert sanitizer.finish() == sanitize_tests(RESPONSE)
+    assert emitted[:3] == [
+        "import pytest",
+        "from user_code import add, sub  # functions under test",
+        "import user_code as code",
+    ]
+    assert emitted[3].startswith("def test_add():")
+
+
+def test_unparseable_output_is_returned_cleaned():
+    assert sanitize_tests("```\ndef test(:\n    pass\n```") == "def test(:\n    pass"
+
+
+def test_indented_code_that_reads_like_words_is_kept():
+    raw = (
+        "from code import split3\n"
+        "first, second, third = split3(\"a b c\")\n"
+        "\n"
+        "\n"
+        "def test_split3():\n"
+        "    first, second, third = split3(\"a b c\")\n"
+        "    a = b = c = first\n"
+        "    assert a and b and c\n"
+    )
+
+    assert sanitize_tests(raw) == raw.replace("from code", "from user_code").strip()
@@ -0,0 +1,64 @@
+import ast
+
+from app.services.fragments import ModuleDefinitions
+from app.services.prompt_builder import compact_source, estimate_tokens, plan_chunks
+
+CODE = '''import math
+
+LIMIT = 10
+
+
+def helper(x):
+    """Normalize x."""
+    # Clamp to the limit
+    return min(x, LIMIT) * math.pi
+
+
+def area(r):
+    """Area of a circle."""
+    return helper(r) * r
+
+
+def unrelated(s):
+    return s.upper() * 100
+'''
+
+
+def _module(code=CODE):
+    return ModuleDefinitions(code, ast.parse(code))
+
+
+def test_source_within_budget_is_kept_verbatim():
+    source = compact_source(_module(), ["area"], budget=10_000)
+
+    assert '"""Area of a circle."""' in source
+    assert "# Clamp to the limit" in source
+    assert "def unrelated" not in source
+
+
+def test_docstrings_and_comments_go_first():
+    module = _module()
+    verbatim = estimate_tokens(module.prompt_source(["area"]))
+
+    source = compact_source(module, ["area"], budget=verbatim - 5)
+
+    assert "Area of a circle" not in source and "Clamp" not in source
+    assert "return min(x, LIMIT) * math.pi" in source
+    assert "LIMIT = 10" in source and "import math" in source
+
+
+def test_context_bodies_are_stubbed_when_still_too_large():
+    source = compact_source(_module(), ["area"], budget=1)
+
+    assert "def helper(x):\n    ..." in source
+    assert "return helper(r) * r" in source
+    ast.parse(source)
+
+
+def test_chunks_respect_the_budget_and_module_order():
+    module = _module()
+
+    assert plan_chunks(module, module.names, budget=10_000) == [["helper", "area", "unrelated"]]
+    chunks = plan_chunks(module, module.names, budget=30)
+    assert [name for chunk in chunks for name in chunk] == ["helper", "area", "unrelated"]
+    assert len(chunks) > 1
@@ -0,0 +1,51 @@
+from app.services.pytest_report import (
+    REPORT_MARKER,
+    merge_results,
+    parse_junit_report,
+    split_report,
+)
+
+REPORT = """<?xml version="1.0" encoding="utf-8"?>
+<testsuites><testsuite name="pytest" errors="0" failures="1" skipped="1" tests="3" time="0.042">
+<testcase classname="test_generated" name="test_add" time="0.001" />
+<testcase classname="test_generated.TestMore" name="test_d" time="0.003">
+<failure message="assert 4 == 5">def test_d(self): ...</failure></testcase>
+<testcase classname="test_generated" name="test_skip" time="0.000">
+<skipped type="pytest.skip" message="not ready" /></testcase>
+</testsuite></testsuites>"""
+
+
+def test_parse_junit_report():
+    results = parse_junit_report(REPORT)
+
+    assert (results["total"], results["passed"], results["failed"], results["skipped"]) == (
+        3, 1, 1, 1
+    )
+    assert results["duration"] == 0.042
+    assert results["tests"][1] == {
+        "name": "test_generated.py::TestMore::test_d",
+        "outcome": "failed",
+        "duration": 0.003,
+        "message": "assert 4 == 5",
+    }
+    assert parse_junit_report("<not xml") is None
+    assert parse_junit_report(None) is None
+
+
+def test_split_report_separates_output_from_xml():
+    stdout = f"test_generated.py::test_add PASSED\n1 passed in 0.01s\n{REPORT_MARKER}\n{REPORT}\n"
+
+    output, report = split_report(stdout)
+
+    assert output == "test_generated.py::test_add PASSED\n1 passed in 0.01s\n"
+    assert report.startswith("<?xml")
+    assert split_report("no report") == ("no report", None)
+
+
+def test_merge_results_sums_shards():
+    first = parse_junit_report(REPORT)
+    merged = merge_results([first, None, first])
+
+    assert merged["total"] == 6
+    assert merged["failed"] == 2
+    assert merged["duration"] == 0.084
@@ -0,0 +1,144 @@
+import asyncio
+
+import httpx
+
+from services.test_execution_service import CircuitBreaker, RemoteSandboxClient
+
+RESULT = {"output": "1 passed", "passed": True, "error": None, "sandbox": "docker"}
+
+
+def test_client_reuses_one_pooled_connection_pool():
+    seen = []
+
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, json=RESULT)
+
+    remote = RemoteSandboxClient(["http://a"], transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        first = remote.client()
+        await remote.execute("code", "tests")
+        await remote.execute("code", "tests")
+        assert remote.client() is first
+        await remote.close()
+
+    asyncio.run(scenario())
+
+    assert seen == ["http://a/execute", "http://a/execute"]
+
+
+def test_least_outstanding_node_is_chosen():
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        return httpx.Response(200, json=RESULT)
+
+    remote = RemoteSandboxClient(["http://a", "http://b"], transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        remote.nodes[0].outstanding = 1  # "a" is busy with a run
+        await remote.execute("code", "tests")
+        remote.nodes[0].outstanding, remote.nodes[1].outstanding = 0, 2
+        await remote.execute("code", "tests")
+        await remote.close()
+
+    asyncio.run(scenario())
+
+    assert hosts == ["b", "a"]
+
+
+def test_breaker_fails_fast_then_probes_health_to_close():
+    calls = []
+    state = {"up": False}
+
+    def handler(request):
+        calls.append(request.url.path)
+        if not state["up"]:
+            raise httpx.ConnectError("refused", request=request)
+        if request.url.path == "/health":
+            return httpx.Response(200, json={"status": "healthy"})
+        return httpx.Response(200, json=RESULT)
+
+    remote = RemoteSandboxClient(["http://a"], transport=httpx.MockTransport(handler))
+    breaker = remote.nodes[0].breaker
+    breaker.failure_threshold, breaker.reset_timeout = 2, 60
+
+    async def scenario():
+        for _ in range(2):
+            result = await remote.execute("code", "tests")
+            assert "Failed to connect" in result["error"]
+        assert breaker.state == "open"
+
+        failed_fast = await remote.execute("code", "tests")
+        assert "circuit open" in failed_fast["error"]
+        assert calls == ["/execute", "/execute"]
+
+        state["up"] = True
+        breaker.opened_at -= 60
+        recovered = await remote.execute("code", "tests")
+        await remote.close()
+        return recovered
+
+    recovered = asyncio.run(scenario())
+
+    assert recovered["passed"] is True
+    assert calls[2:] == ["/health", "/execute"]
+    assert breaker.state == "closed"
+
+
+def test_connection_errors_fail_over_to_another_node():
+    def handler(request):
+        if request.url.host == "down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json=RESULT)
+
+    remote = RemoteSandboxClient(
+        ["http://down", "http://up"], transport=httpx.MockTransport(handler)
+    )
+    remote._rotation = iter([0, 0])
+
+    result = asyncio.run(remote.execute("code", "tests"))
+
+    assert result["passed"] is True
+    assert remote.nodes[0].breaker.failures == 1
+
+
+def test_failed_half_open_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.state == "half_open"
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+
+def test_busy_node_is_skipped_without_tripping_the_breaker():
+    hosts = []
+
+    def handler(request):
+        hosts.append(request.url.host)
+        if request.url.host == "full":
+            return httpx.Response(503, headers={"Retry-After": "5"}, json={"detail": "busy"})
+        return httpx.Response(200, json=RESULT)
+
+    remote = RemoteSandboxClient(
+        ["http://full", "http://free"], transport=httpx.MockTransport(handler)
+    )
+    remote._rotation = iter([0, 0, 0])
+
+    async def scenario():
+        first = await remote.execute("code", "tests")
+        second = await remote.execute("code", "tests")
+        await remote.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first["passed"] and second["passed"]
+    assert hosts == ["full", "free", "free"]
+    assert remote.nodes[0].busy is True
+    assert remote.nodes[0].breaker.failures == 0
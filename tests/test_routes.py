@@ -1,11 +1,13 @@
 from fastapi.testclient import TestClient
 
+from app import main as main_module
 from app.main import app
 from app.api import routes
+from app.services.job_queue import QueueFullError
 
 
 def test_generate_tests_route_success(monkeypatch):
-    def fake_process(code: str):
+    async def fake_process(code: str, bypass_cache: bool = False, include_timings=False):
         return {
             "status": "success",
             "generated_tests": "def test_ok():\n    assert True",
@@ -48,3 +50,130 @@ def test_validate_code_route_safe(monkeypatch):
     data = response.json()
     assert data["is_safe"] is True
     assert data["functions"] == ["add"]
+
+
+def test_health_reports_cached_sandbox_backend(monkeypatch):
+    class FakeDiscovery:
+        prewarm_status = {"status": "unavailable", "mode": "build", "error": "no daemon"}
+
+        def get(self):
+            return {"docker_available": False, "image": None}
+
+    monkeypatch.setattr(main_module, "get_sandbox_discovery", lambda: FakeDiscovery())
+
+    client = TestClient(app)
+    response = client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["sandbox"]["docker_available"] is False
+    assert response.json()["sandbox_prewarm"]["status"] == "unavailable"
+
+
+def test_generate_tests_batch_route(monkeypatch):
+    async def fake_batch(codes, bypass_cache=False):
+        return {
+            "results": [
+                {
+                    "status": "success",
+                    "generated_tests": "def test_ok():\n    assert True",
+                    "execution_output": "ok",
+                    "passed": True,
+                    "execution_time": 0.1,
+                    "error": None,
+                    "error_type": None,
+                }
+                for _ in codes
+            ],
+            "total_time": 0.2,
+            "passed_count": len(codes),
+            "failed_count": 0,
+        }
+
+    monkeypatch.setattr(routes, "process_batch", fake_batch)
+
+    client = TestClient(app)
+    response = client.post(
+        "/api/generate-tests/batch",
+        json={"items": [{"code": "def a(): pass"}, {"code": "def b(): pass"}]},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["results"]) == 2
+    assert data["passed_count"] == 2
+
+
+def test_generate_tests_stream_emits_stage_events(monkeypatch):
+    async def fake_stream(code: str, bypass_cache: bool = False):
+        yield "validated", {"code_length": len(code)}
+        yield "tests_generated", {"generated_tests": "def test_ok():\n    assert True"}
+        yield "output", "test_generated.py::test_ok PASSED"
+        yield "result", {
+            "status": "success",
+            "generated_tests": "def test_ok():\n    assert True",
+            "execution_output": "test_generated.py::test_ok PASSED",
+            "passed": True,
+            "execution_time": 0.1,
+        }
+
+    monkeypatch.setattr(routes, "process_code_stream", fake_stream)
+
+    client = TestClient(app)
+    response = client.post("/api/generate-tests/stream", json={"code": "def a(): pass"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line[len("event: "):] for line in response.text.splitlines()
+              if line.startswith("event: ")]
+    assert events == ["validated", "tests_generated", "output", "result"]
+    assert '"status": "success"' in response.text
+
+
+def test_submit_job_returns_429_when_queue_full(monkeypatch):
+    class FullQueue:
+        def submit(self, code, bypass_cache=False):
+            raise QueueFullError("full")
+
+    monkeypatch.setattr(routes, "get_job_queue", lambda: FullQueue())
+
+    client = TestClient(app)
+    response = client.post("/api/jobs", json={"code": "def a(): pass"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "5"
+
+
+def test_get_unknown_job_returns_404(monkeypatch):
+    class EmptyQueue:
+        def get(self, job_id):
+            return None
+
+    monkeypatch.setattr(routes, "get_job_queue", lambda: EmptyQueue())
+
+    client = TestClient(app)
+    response = client.get("/api/jobs/missing")
+
+    assert response.status_code == 404
+
+
+def test_metrics_endpoint_exposes_prometheus_text():
+    client = TestClient(app)
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE ai_test_generator_stage_seconds histogram" in response.text
+    assert "# TYPE ai_test_generator_requests_total counter" in response.text
+
+
+def test_lifespan_runs_startup_and_shutdown_hooks(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main_module, "reclaim_orphaned_workspaces", lambda: calls.append("reclaim"))
+    monkeypatch.setattr(main_module, "start_sandbox_prewarm", lambda: calls.append("prewarm"))
+    monkeypatch.setattr(main_module, "stop_sandbox_pool", lambda: calls.append("stop"))
+
+    with TestClient(app) as client:
+        assert calls == ["reclaim", "prewarm"]
+        assert client.post("/api/validate-code", json={"code": "x = 1"}).status_code == 200
+
+    assert calls[-1] == "stop"
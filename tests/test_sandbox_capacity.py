@@ -0,0 +1,82 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "sandbox-service"))
+
+import capacity  # noqa: E402
+from capacity import CapacityExceeded, CapacityLimiter, derive_slots  # noqa: E402
+
+FLAGS = ["--memory=256m", "--cpus=0.5", "--network=none"]
+
+
+def test_slots_are_bounded_by_cpu_and_memory():
+    gib = 1024 ** 3
+    assert derive_slots(FLAGS, cpu_count=4, memory_bytes=16 * gib) == 8   # CPU bound
+    assert derive_slots(FLAGS, cpu_count=16, memory_bytes=1 * gib) == 3   # Memory bound
+    assert derive_slots(FLAGS, cpu_count=1, memory_bytes=64 * 1024 ** 2) == 1
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    limiter = CapacityLimiter(slots=1, queue_size=0, queue_timeout=1)
+
+    with limiter.slot():
+        assert limiter.stats()["free_slots"] == 0
+        with pytest.raises(CapacityExceeded) as exc:
+            with limiter.slot():
+                pass
+
+    assert exc.value.retry_after >= 1
+    assert limiter.stats()["rejected"] == 1
+    assert limiter.stats()["running"] == 0
+
+
+def test_queued_request_runs_when_a_slot_frees():
+    limiter = CapacityLimiter(slots=1, queue_size=1, queue_timeout=5)
+    entered, release, ran = threading.Event(), threading.Event(), []
+
+    def holder():
+        with limiter.slot():
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    entered.wait()
+
+    def waiter():
+        with limiter.slot():
+            ran.append(True)
+
+    queued = threading.Thread(target=waiter)
+    queued.start()
+    while limiter.stats()["queued"] == 0:
+        pass
+    release.set()
+    thread.join()
+    queued.join()
+
+    assert ran == [True]
+
+
+def test_wait_times_out():
+    limiter = CapacityLimiter(slots=1, queue_size=1, queue_timeout=0.05)
+
+    with limiter.slot():
+        with pytest.raises(CapacityExceeded):
+            with limiter.slot():
+                pass
+
+
+def test_queue_wait_leaves_room_for_a_full_run_before_the_client_times_out(monkeypatch):
+    monkeypatch.setattr(capacity, "_limiter", None)
+    monkeypatch.setenv("SANDBOX_MAX_CONCURRENT", "2")
+    monkeypatch.setenv("SANDBOX_QUEUE_TIMEOUT", "10")
+    monkeypatch.delenv("SANDBOX_CLIENT_TIMEOUT", raising=False)
+
+    limiter = capacity.get_capacity_limiter(FLAGS, run_timeout=15)
+
+    assert limiter.queue_timeout == capacity.max_queue_wait(15) == 4
+    assert capacity.max_queue_wait(15, client_timeout=10) == 0
@@ -0,0 +1,191 @@
+import subprocess
+
+import pytest
+
+from app.services import sandbox_pool
+from app.services.sandbox_pool import PooledContainer, SandboxPool
+
+
+def _fake_docker(calls):
+    counter = {"n": 0}
+
+    def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        if cmd[:2] == ["docker", "run"]:
+            counter["n"] += 1
+            return subprocess.CompletedProcess(cmd, 0, stdout=f"cid{counter['n']}\n", stderr="")
+        return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+    return fake_run
+
+
+def test_fill_starts_hardened_containers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", _fake_docker(calls))
+    pool = SandboxPool("sandbox:latest", size=2)
+
+    pool._fill()
+
+    run_cmds = [c for c in calls if c[:2] == ["docker", "run"]]
+    assert len(run_cmds) == 2
+    for flag in ("--read-only", "--cap-drop=ALL", "--pids-limit=64", "--network=none"):
+        assert flag in run_cmds[0]
+    assert pool.stats()["idle"] == 2
+
+
+def test_acquire_returns_none_when_pool_not_started():
+    pool = SandboxPool("sandbox:latest", size=2)
+    pool._idle.append(PooledContainer("cid1"))
+
+    assert pool.acquire() is None
+
+
+def test_release_destroys_after_max_reuse(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", _fake_docker(calls))
+    monkeypatch.setattr(sandbox_pool.threading, "Thread", _InlineThread)
+    pool = SandboxPool("sandbox:latest", size=1, max_reuse=1)
+    pool._thread = object()
+    pool._idle.append(PooledContainer("cid1"))
+
+    container = pool.acquire()
+    pool.release(container)
+
+    assert ["docker", "rm", "-f", "cid1"] in calls
+    assert pool.stats()["recycling"] == 0
+
+
+def test_reap_idle_destroys_expired_containers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", _fake_docker(calls))
+    pool = SandboxPool("sandbox:latest", size=1, idle_ttl=0)
+    expired = PooledContainer("cid1")
+    expired.last_used -= 10
+    pool._idle.append(expired)
+
+    pool._reap_idle()
+
+    assert ["docker", "rm", "-f", "cid1"] in calls
+    assert pool.stats()["idle"] == 0
+
+
+class _InlineThread:
+    def __init__(self, target, args=(), **kwargs):
+        self._target = target
+        self._args = args
+
+    def start(self):
+        self._target(*self._args)
+
+
+def test_workspace_archive_is_built_in_memory():
+    import io
+    import tarfile
+
+    archive = sandbox_pool.build_workspace_archive({"user_code.py": "x = 1\n", "t.py": "ñ"})
+
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        assert sorted(tar.getnames()) == ["t.py", "user_code.py"]
+        assert tar.extractfile("t.py").read().decode("utf-8") == "ñ"
+
+
+def test_reclaim_orphans_only_removes_containers_of_dead_owners(monkeypatch):
+    calls = []
+    host = sandbox_pool.socket.gethostname()
+    listing = "\n".join([
+        "c1 " + f"{host}:999999999",     # Dead process on this host
+        "c2 " + f"{host}:{sandbox_pool.os.getpid()}",  # Live process
+        "c3 other-host:1",              # Another host sharing the daemon
+        "c4 ",                          # Legacy label without an owner
+    ])
+
+    def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        stdout = listing if cmd[:2] == ["docker", "ps"] else ""
+        return subprocess.CompletedProcess(cmd, 0, stdout=stdout, stderr="")
+
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", fake_run)
+    pool = SandboxPool("sandbox:latest", size=1)
+    pool.owner = "this-pool"
+
+    assert pool.reclaim_orphans() == 2
+    removed = [c[-1] for c in calls if c[:3] == ["docker", "rm", "-f"]]
+    assert removed == ["c1", "c4"]
+
+
+def test_recycle_kills_leftover_processes_and_empties_tmpfs(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", _fake_docker(calls))
+    pool = SandboxPool("sandbox:latest", size=1)
+    pool._dirty.append(PooledContainer("cid1"))
+
+    pool._recycle_dirty()
+
+    assert calls[0] == [
+        "docker", "exec", "-e", "KEEP_PID=", "cid1", "sh", "-c", sandbox_pool.RECYCLE_SCRIPT,
+    ]
+    assert "kill -9" in calls[0][-1] and "/dev/shm" in calls[0][-1]
+    assert pool.stats()["idle"] == 1
+
+
+class _Worker:
+    alive = True
+    pid = 42
+
+
+def test_recycle_spares_the_persistent_worker(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", _fake_docker(calls))
+    pool = SandboxPool("sandbox:latest", size=1)
+    container = PooledContainer("cid1")
+    container.worker = _Worker()
+    pool._dirty.append(container)
+
+    pool._recycle_dirty()
+
+    assert calls[0][:5] == ["docker", "exec", "-e", "KEEP_PID=42", "cid1"]
+    assert "$KEEP_PID" in calls[0][-1]
+
+
+def test_recycle_destroys_containers_that_cannot_be_cleaned(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, *args, **kwargs):
+        calls.append(cmd)
+        if cmd[:2] == ["docker", "exec"] and cmd[4] == "cid1":
+            raise subprocess.TimeoutExpired(cmd, 10)
+        if cmd[:2] == ["docker", "exec"]:
+            return subprocess.CompletedProcess(cmd, 1, stdout="", stderr="")
+        return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", fake_run)
+    pool = SandboxPool("sandbox:latest", size=2)
+    pool._dirty.extend([PooledContainer("cid1"), PooledContainer("cid2")])
+
+    pool._recycle_dirty()
+
+    assert ["docker", "rm", "-f", "cid1"] in calls
+    assert ["docker", "rm", "-f", "cid2"] in calls
+    assert pool.stats()["idle"] == 0
+
+
+def test_pool_containers_run_a_zombie_reaper_as_pid_1(monkeypatch):
+    calls = []
+    monkeypatch.setattr(sandbox_pool.subprocess, "run", _fake_docker(calls))
+    pool = SandboxPool("sandbox:latest", size=1)
+
+    pool._spawn()
+
+    assert calls[0][-3:] == ["python", "-c", sandbox_pool.REAPER_SCRIPT]
+    assert "infinity" not in calls[0]
+
+
+def test_shared_pool_refuses_a_different_image(monkeypatch):
+    monkeypatch.setattr(sandbox_pool, "_pool", None)
+
+    pool = sandbox_pool.get_sandbox_pool("sandbox:latest")
+
+    assert sandbox_pool.get_sandbox_pool() is pool
+    assert sandbox_pool.get_sandbox_pool("sandbox:latest") is pool
+    with pytest.raises(ValueError, match="other:latest"):
+        sandbox_pool.get_sandbox_pool("other:latest")
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from app.services.pytest_report import parse_junit_report
+from app.services.sandbox_worker import SandboxWorker, WorkerUnavailable
+
+WORKER_SCRIPT = os.path.join(
+    os.path.dirname(__file__), os.pardir, "scripts", "pytest_worker.py"
+)
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="the worker forks per run")
+
+CODE = "counter = []\n\n\ndef bump():\n    counter.append(1)\n    return len(counter)\n"
+TESTS = "from user_code import bump\n\n\ndef test_bump():\n    assert bump() == 1\n"
+
+
+def test_worker_runs_each_request_in_a_fresh_child(monkeypatch, tmp_path):
+    monkeypatch.setenv("PYTEST_WORKER_WORKSPACE", str(tmp_path))
+    files = {"user_code.py": CODE, "test_generated.py": TESTS}
+
+    async def scenario():
+        worker = await SandboxWorker.start([sys.executable, WORKER_SCRIPT])
+        lines = []
+        try:
+            first = await worker.run(files, ["test_generated.py"], 15, on_line=lines.append)
+            # Module state from the first run must not leak into the second
+            second = await worker.run(files, ["test_generated.py"], 15)
+            slow = await worker.run(
+                {**files, "test_generated.py": "import time\n\n\ndef test_slow():\n"
+                                               "    time.sleep(30)\n"},
+                ["test_generated.py"],
+                1,
+            )
+            after_timeout = await worker.run(files, ["test_generated.py"], 15)
+        finally:
+            await worker.close()
+        return first, second, slow, after_timeout, lines
+
+    first, second, slow, after_timeout, lines = asyncio.run(scenario())
+
+    assert first["returncode"] == 0 and second["returncode"] == 0
+    assert any("test_bump PASSED" in line for line in lines)
+    assert parse_junit_report(first["report"])["passed"] == 1
+    assert slow["timed_out"] is True
+    assert after_timeout["returncode"] == 0
+    assert os.listdir(tmp_path) == []
+
+
+def _alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="checks process state in /proc")
+def test_worker_ends_run_when_pytest_exits_and_kills_leftovers(monkeypatch, tmp_path):
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    pid_file = tmp_path / "background.pid"
+    monkeypatch.setenv("PYTEST_WORKER_WORKSPACE", str(workspace))
+    # The background process inherits the output pipe and would keep it open
+    tests = (
+        "import multiprocessing, time\n\n\n"
+        "def test_spawns():\n"
+        "    child = multiprocessing.Process(target=time.sleep, args=(60,))\n"
+        "    child.start()\n"
+        f"    open({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+    )
+
+    async def scenario():
+        worker = await SandboxWorker.start([sys.executable, WORKER_SCRIPT])
+        try:
+            started = asyncio.get_running_loop().time()
+            result = await worker.run({"test_generated.py": tests}, ["test_generated.py"], 10)
+            return result, asyncio.get_running_loop().time() - started
+        finally:
+            await worker.close()
+
+    result, elapsed = asyncio.run(scenario())
+
+    assert result["timed_out"] is False
+    assert result["returncode"] == 0
+    assert elapsed < 5
+    assert not _alive(int(pid_file.read_text()))
+
+
+def test_worker_start_fails_cleanly_without_the_script():
+    async def scenario():
+        await SandboxWorker.start([sys.executable, "/nonexistent/pytest_worker.py"])
+
+    with pytest.raises(WorkerUnavailable):
+        asyncio.run(scenario())
+
+
+def test_pool_execution_uses_the_worker(monkeypatch, tmp_path):
+    from app.services import test_execution_service as tes
+    from app.services.sandbox_pool import PooledContainer
+
+    class FakePool:
+        released = []
+
+        def release(self, container, healthy=True):
+            self.released.append(healthy)
+
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    files = {"user_code.py": CODE, "test_generated.py": TESTS}
+    monkeypatch.setenv("PYTEST_WORKER_WORKSPACE", str(workspace))
+    monkeypatch.setattr(tes, "WORKER_MODE", True)
+    monkeypatch.setattr(tes, "_worker_unavailable", False)
+    monkeypatch.setattr(tes, "worker_command", lambda cid: [sys.executable, WORKER_SCRIPT])
+    pool, pooled = FakePool(), PooledContainer("abc123")
+
+    async def scenario():
+        try:
+            return await tes._execute_in_pool(pool, pooled, files, "test_generated.py")
+        finally:
+            await pooled.worker.close()
+
+    result = asyncio.run(scenario())
+
+    assert result["passed"] is True
+    assert result["test_results"]["total"] == 1
+    assert pool.released == [True]
@@ -1,4 +1,4 @@
-from app.services.code_validator import validate_code_safety
+from app.services.code_validator import analyze_code, validate_code_safety
 
 
 def test_validate_code_safety_blocks_dangerous_imports():
@@ -17,3 +17,33 @@ def test_validate_code_safety_allows_safe_code():
     assert is_safe is True
     assert message == ""
     assert items == []
+
+
+def test_analyze_code_collects_everything_in_one_pass():
+    code = (
+        "import math\n"
+        "class Shape:\n"
+        "    def area(self):\n"
+        "        return math.pi\n"
+        "def helper(x):\n"
+        "    return getattr(x, '__class__')\n"
+    )
+    analysis = analyze_code(code)
+
+    assert analysis.imports == ["math"]
+    assert analysis.classes == ["Shape"]
+    assert analysis.functions == ["area", "helper"]
+    assert analysis.dangerous_items == ["__class__"]
+    assert analysis.is_safe is False
+
+
+def test_analyze_code_ignores_comments_and_flags_indirect_eval():
+    assert analyze_code("# never call eval(x)\ny = 1").is_safe is True
+    assert "eval(" in analyze_code("f = eval\nf('1')").dangerous_items
+
+
+def test_analysis_hash_ignores_formatting():
+    first = analyze_code("def add(a, b):\n    return a + b")
+    second = analyze_code("def add(a,b):  # sum\n    return a+b")
+
+    assert first.normalized_hash == second.normalized_hash
@@ -0,0 +1,33 @@
+import os
+import time
+
+from app.services import workspace
+from app.services.workspace import local_workspace, reclaim_orphaned_workspaces
+
+
+def test_local_workspace_writes_files_and_cleans_up(monkeypatch, tmp_path):
+    monkeypatch.setenv("SANDBOX_WORKSPACE_ROOT", str(tmp_path))
+
+    with local_workspace({"user_code.py": "x = 1\n"}) as folder:
+        assert os.path.dirname(folder) == str(tmp_path)
+        with open(os.path.join(folder, "user_code.py")) as f:
+            assert f.read() == "x = 1\n"
+
+    assert not os.path.exists(folder)
+
+
+def test_reclaim_removes_only_old_workspaces(monkeypatch, tmp_path):
+    root, legacy = tmp_path / "root", tmp_path / "tmp"
+    root.mkdir()
+    legacy.mkdir()
+    monkeypatch.setenv("SANDBOX_WORKSPACE_ROOT", str(root))
+    monkeypatch.setattr(workspace.tempfile, "gettempdir", lambda: str(legacy))
+    old = time.time() - 3600
+    for path in (root / "run_old", legacy / "test_run_old", legacy / "unrelated"):
+        path.mkdir()
+        os.utime(path, (old, old))
+    (root / "run_active").mkdir()
+
+    assert reclaim_orphaned_workspaces() == 2
+    assert sorted(os.listdir(root)) == ["run_active"]
+    assert os.listdir(legacy) == ["unrelated"]